@@ -0,0 +1,30 @@
+"""catalog version
+
+Revision ID: 5f2a9c1d7e34
+Revises: ceb5fedfe73b
+Create Date: 2026-10-18 10:12:03.511204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5f2a9c1d7e34'
+down_revision = 'ceb5fedfe73b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('catalogversion',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True),
+              server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('catalogversion')
@@ -0,0 +1,31 @@
+"""content hash
+
+Revision ID: 8d41b7e2a95c
+Revises: 5f2a9c1d7e34
+Create Date: 2026-10-18 14:37:52.108731
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d41b7e2a95c'
+down_revision = '5f2a9c1d7e34'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('name', sa.Column('content_hash', sa.String(length=64),
+                                    nullable=True))
+    op.add_column('item', sa.Column('content_hash', sa.String(length=64),
+                                    nullable=True))
+    op.add_column('feature', sa.Column('content_hash', sa.String(length=64),
+                                       nullable=True))
+
+
+def downgrade():
+    op.drop_column('feature', 'content_hash')
+    op.drop_column('item', 'content_hash')
+    op.drop_column('name', 'content_hash')
@@ -0,0 +1,44 @@
+"""selection indexes
+
+Revision ID: b3c7e91f4d20
+Revises: 8d41b7e2a95c
+Create Date: 2026-10-18 16:05:21.907412
+
+Indexes are built with CREATE INDEX CONCURRENTLY, outside of the migration
+transaction, so the catalog stays writable while they build.
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3c7e91f4d20'
+down_revision = '8d41b7e2a95c'
+branch_labels = None
+depends_on = None
+
+INDEXES = (
+    ('ix_linkitemtheme_theme_item', 'linkitemtheme', ['id_theme', 'id_item'],
+     None),
+    ('ix_linknametheme_theme_name', 'linknametheme', ['id_theme', 'id_name'],
+     None),
+    ('ix_linkfeaturetheme_theme_feature', 'linkfeaturetheme',
+     ['id_theme', 'id_feature'], None),
+    ('ix_feature_id_good', 'feature', ['id'], 'is_good'),
+    ('ix_feature_id_bad', 'feature', ['id'], 'NOT is_good'),
+    ('ix_name_gender_id', 'name', ['gender', 'id'], None),
+)
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            condition = f' WHERE {where}' if where else ''
+            op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} '
+                       f'ON {table} ({", ".join(columns)}){condition}')
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, _, _, _ in reversed(INDEXES):
+            op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
@@ -0,0 +1,37 @@
+"""candidate view
+
+Revision ID: e6a0d4c2b718
+Revises: b3c7e91f4d20
+Create Date: 2026-10-18 17:48:09.330652
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6a0d4c2b718'
+down_revision = 'b3c7e91f4d20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('''CREATE MATERIALIZED VIEW catalogcandidate AS
+        SELECT 'name'::varchar AS entity_type, l.id_name AS entity_id,
+               l.id_theme AS theme_id, NULL::boolean AS is_good, n.gender
+        FROM linknametheme l JOIN name n ON n.id = l.id_name
+        UNION ALL
+        SELECT 'item', l.id_item, l.id_theme, NULL, NULL
+        FROM linkitemtheme l
+        UNION ALL
+        SELECT 'feature', l.id_feature, l.id_theme, f.is_good, NULL
+        FROM linkfeaturetheme l JOIN feature f ON f.id = l.id_feature''')
+    op.execute('''CREATE UNIQUE INDEX ix_catalogcandidate_key
+        ON catalogcandidate (entity_type, entity_id, theme_id)''')
+    op.execute('''CREATE INDEX ix_catalogcandidate_selection
+        ON catalogcandidate (entity_type, theme_id, is_good, gender,
+                             entity_id)''')
+
+
+def downgrade():
+    op.execute('DROP MATERIALIZED VIEW catalogcandidate')
@@ -0,0 +1,117 @@
+'''Import throughput, row by row, bulk and parallel, at several sizes
+
+Imports synthetic names, items and features in a `bench-` theme of the
+database in DB_URL (or TEST_DB_URL with TEST_MODE set), through the
+`populate_*` functions, the `bulk_populate_*` ones and `parallel_populate`,
+and prints rows/second of each and the parallel speedup over the serial
+bulk import. Synthetic rows are deleted after every run. The row by row
+import is skipped above ROW_BY_ROW_MAX_SIZE rows.
+
+Usage: python -m benchmarks.bench_import [size ...]
+'''
+import json
+import sys
+import time
+from typing import Callable, List
+
+from records import Database
+
+from src.database.database_utils import get_db
+from src.database.models import (FeatureInput, ItemInput,
+                                 LoadedDbItemsJson, NameInput)
+from src.database.populate import (bulk_populate_features,
+                                   bulk_populate_items, bulk_populate_names,
+                                   parallel_populate, populate_features,
+                                   populate_items, populate_names,
+                                   populate_themes)
+
+PREFIX = 'bench-'
+THEME = PREFIX + 'theme'
+ROW_BY_ROW_MAX_SIZE = 10000
+
+
+def names(size: int) -> List[NameInput]:
+    '''Synthetic names'''
+    return [NameInput(firstname=f'{PREFIX}{i}', lastname=PREFIX,
+                      gender='M' if i % 2 else 'F', themes=[THEME])
+            for i in range(size)]
+
+
+def items(size: int) -> List[ItemInput]:
+    '''Synthetic items'''
+    return [ItemInput(name=f'{PREFIX}{i}', description='Synthetic item',
+                      themes=[THEME])
+            for i in range(size)]
+
+
+def features(size: int) -> List[FeatureInput]:
+    '''Synthetic features'''
+    return [FeatureInput(text_masc=f'{PREFIX}{i}', text_fem=f'{PREFIX}f{i}',
+                         description='Synthetic feature', is_good=i % 2 == 0,
+                         themes=[THEME])
+            for i in range(size)]
+
+
+def clean(database: Database) -> None:
+    '''Delete the synthetic rows and their links'''
+    with database.transaction() as conn:
+        for table, column in (('name', 'firstname'), ('item', 'name'),
+                              ('feature', 'text_masc')):
+            conn.query(f'''DELETE FROM link{table}theme WHERE id_{table} IN (
+                SELECT id FROM {table} WHERE {column} LIKE :pattern)''',
+                       pattern=PREFIX + '%')
+            conn.query(f'DELETE FROM {table} WHERE {column} LIKE :pattern',
+                       pattern=PREFIX + '%')
+
+
+def measure(database: Database, size: int, mode: str,
+            import_all: Callable[[], None]) -> float:
+    '''Run one import, print its throughput, clean and return seconds'''
+    start = time.perf_counter()
+    try:
+        import_all()
+        seconds = time.perf_counter() - start
+    finally:
+        clean(database)
+
+    print(json.dumps({'mode': mode, 'size': size, 'seconds': seconds,
+                      'rows_per_second': 3 * size / seconds}))
+
+    return seconds
+
+
+def main() -> None:
+    '''Measure each import mode at each size'''
+    sizes = [int(size) for size in sys.argv[1:]] or [1000, 10000, 100000]
+    database = get_db()
+
+    populate_themes([THEME], database)
+    try:
+        for size in sizes:
+            data = (names(size), items(size), features(size))
+
+            if size <= ROW_BY_ROW_MAX_SIZE:
+                measure(database, size, 'row_by_row', lambda: (
+                    populate_names(data[0], database),
+                    populate_items(data[1], database),
+                    populate_features(data[2], database)))
+
+            serial = measure(database, size, 'bulk', lambda: (
+                bulk_populate_names(data[0], database),
+                bulk_populate_items(data[1], database),
+                bulk_populate_features(data[2], database)))
+
+            catalog = LoadedDbItemsJson(themes=[THEME], names=data[0],
+                                        items=data[1], features=data[2])
+            parallel = measure(database, size, 'parallel',
+                               lambda: parallel_populate(catalog, database))
+
+            print(json.dumps({'size': size,
+                              'parallel_speedup': serial / parallel}))
+    finally:
+        with database.transaction() as conn:
+            conn.query('DELETE FROM theme WHERE name = :name', name=THEME)
+
+
+if __name__ == '__main__':
+    main()
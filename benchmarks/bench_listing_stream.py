@@ -0,0 +1,78 @@
+'''Peak memory of full feature listings, buffered versus streamed
+
+Fills the `feature` table of the database in DB_URL (or TEST_DB_URL with
+TEST_MODE set) with synthetic rows, then serializes the whole table once
+through `FeatureDAO.list_all` and once through `FeatureDAO.iter_rows`, each
+in a fresh process, and reports their peak RSS. Synthetic rows are deleted
+at the end.
+
+Usage: python -m benchmarks.bench_listing_stream [n_rows]
+'''
+import json
+import resource
+import subprocess  # nosec
+import sys
+import time
+
+from src.config import settings
+from src.database.dao import FeatureDAO, FeatureListingSetup
+from src.database.database_utils import get_db
+
+PREFIX = 'bench-'
+
+
+def fill(n_rows: int) -> None:
+    '''Insert `n_rows` synthetic features'''
+    sql = '''INSERT INTO feature (text_masc, text_fem, description, is_good)
+        SELECT :prefix || g, :prefix || 'f' || g, 'Synthetic feature', g % 2 = 0
+        FROM generate_series(1, :n_rows) g
+        ON CONFLICT DO NOTHING'''
+
+    with get_db().transaction() as conn:
+        conn.query(sql, prefix=PREFIX, n_rows=n_rows)
+
+
+def clean() -> None:
+    '''Delete the synthetic features'''
+    with get_db().transaction() as conn:
+        conn.query('DELETE FROM feature WHERE text_masc LIKE :pattern',
+                   pattern=PREFIX + '%')
+
+
+def run(mode: str) -> None:
+    '''Serialize every feature to /dev/null, print peak RSS and duration'''
+    start = time.perf_counter()
+    dao = FeatureDAO()
+
+    with open('/dev/null', 'w') as out:
+        if mode == 'buffered':
+            json.dump(dao.list_all(), out)
+        else:
+            for chunk in dao.iter_rows(FeatureListingSetup(),
+                                       settings.LISTING_STREAM_CHUNK):
+                out.write(''.join(json.dumps(row) + '\n' for row in chunk))
+
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({'mode': mode, 'peak_rss_mb': peak_kb / 1024,
+                      'seconds': time.perf_counter() - start}))
+
+
+def main() -> None:
+    '''Fill, measure each mode in its own process, clean'''
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+
+    fill(n_rows)
+    try:
+        for mode in ('buffered', 'streamed'):
+            subprocess.run([sys.executable, '-m',  # nosec
+                            'benchmarks.bench_listing_stream', '--run', mode],
+                           check=True)
+    finally:
+        clean()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2 and sys.argv[1] == '--run':
+        run(sys.argv[2])
+    else:
+        main()
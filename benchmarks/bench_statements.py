@@ -0,0 +1,68 @@
+'''DAO call overhead without and with the statement cache
+
+Calls a few DAO methods repeatedly on the catalog of the database in DB_URL
+(or TEST_DB_URL with TEST_MODE set), first building and parsing every
+statement, then with cached statements, then with cached statements
+prepared server side, and prints the mean time per call of each.
+
+Usage: python -m benchmarks.bench_statements [n_calls]
+'''
+import json
+import sys
+import time
+from typing import Callable, Dict
+
+from src.config import settings
+from src.database.dao import (FeatureDAO, FeatureListingSetup, NameDAO,
+                              RandFeatSelectionSetup, RandNameSelectionSetup,
+                              get_theme_registry)
+
+MODES = {
+    'uncached': {'STATEMENT_CACHE_SIZE': 0, 'PREPARED_STATEMENTS': False},
+    'cached': {'STATEMENT_CACHE_SIZE': 256, 'PREPARED_STATEMENTS': False},
+    'prepared': {'STATEMENT_CACHE_SIZE': 256, 'PREPARED_STATEMENTS': True},
+}
+
+
+def calls() -> Dict[str, Callable[[], object]]:
+    '''DAO calls to measure, filtered by the first registered theme'''
+    themes = tuple(sorted(get_theme_registry().ids))[:1]
+    feature_dao = FeatureDAO()
+    name_dao = NameDAO()
+
+    return {
+        'random_features': lambda: feature_dao.get_random_features(
+            RandFeatSelectionSetup(n_features=3, is_good=True,
+                                   filter_themes=themes)),
+        'random_name': lambda: name_dao.get_random_name(
+            RandNameSelectionSetup(gender='any', filter_themes=themes)),
+        'features_page': lambda: feature_dao.list_page(
+            FeatureListingSetup(limit=10, filter_themes=themes)),
+    }
+
+
+def main() -> None:
+    '''Measure every call in every mode'''
+    n_calls = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    settings.SAMPLING_STRATEGY = 'order_by_random'
+
+    for mode, values in MODES.items():
+        for name, value in values.items():
+            setattr(settings, name, value)
+
+        for call_name, call in calls().items():
+            # Warm up the pool, the caches and the prepared statements
+            for _ in range(10):
+                call()
+
+            start = time.perf_counter()
+            for _ in range(n_calls):
+                call()
+            seconds = time.perf_counter() - start
+
+            print(json.dumps({'mode': mode, 'call': call_name,
+                              'us_per_call': 1e6 * seconds / n_calls}))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+'''Query plans of the random selection queries on a large catalog
+
+Bulk imports a synthetic catalog of `n_rows` names, items and features,
+spread over `n_themes` themes, in the database in DB_URL (or TEST_DB_URL
+with TEST_MODE set), then prints EXPLAIN (ANALYZE, BUFFERS) of the
+selection queries the DAOs send. Synthetic rows are deleted at the end.
+
+Run it once before and once after `alembic upgrade b3c7e91f4d20` to compare
+the plans without and with the selection indexes.
+
+Usage: python -m benchmarks.explain_selection [n_rows] [n_themes]
+'''
+import sys
+from typing import List, Tuple
+
+from src.database.dao import (RandFeatSelectionSetup, RandItemSelectionSetup,
+                              RandNameSelectionSetup, feature_selection_spec,
+                              item_selection_spec, name_selection_spec)
+from src.database.dao.dao_utils import SelectionSpec, build_selection_sql
+from src.database.database_utils import get_db
+from src.database.models import FeatureInput, ItemInput, NameInput
+from src.database.populate import (bulk_populate_features,
+                                   bulk_populate_items, bulk_populate_names,
+                                   populate_themes)
+
+PREFIX = 'bench-'
+
+
+def fill(n_rows: int, themes: List[str]) -> None:
+    '''Import the synthetic catalog, each row tagged with one theme'''
+    database = get_db()
+
+    populate_themes(themes, database)
+
+    def theme(i: int) -> List[str]:
+        return [themes[i % len(themes)]]
+
+    bulk_populate_names([NameInput(firstname=f'{PREFIX}{i}', lastname=PREFIX,
+                                   gender='masculine' if i % 2 else 'feminine',
+                                   themes=theme(i))
+                         for i in range(n_rows)], database)
+    bulk_populate_items([ItemInput(name=f'{PREFIX}{i}', description='',
+                                   themes=theme(i))
+                         for i in range(n_rows)], database)
+    bulk_populate_features([FeatureInput(text_masc=f'{PREFIX}{i}',
+                                         text_fem=f'{PREFIX}f{i}',
+                                         description='', is_good=i % 2 == 0,
+                                         themes=theme(i))
+                            for i in range(n_rows)], database)
+
+    with database.transaction() as conn:
+        for table in ('name', 'item', 'feature', 'linknametheme',
+                      'linkitemtheme', 'linkfeaturetheme'):
+            conn.query(f'ANALYZE {table}')
+
+
+def clean(themes: List[str]) -> None:
+    '''Delete the synthetic catalog'''
+    with get_db().transaction() as conn:
+        for table, column in (('name', 'firstname'), ('item', 'name'),
+                              ('feature', 'text_masc')):
+            conn.query(f'''DELETE FROM link{table}theme WHERE id_{table} IN (
+                SELECT id FROM {table} WHERE {column} LIKE :pattern)''',
+                       pattern=PREFIX + '%')
+            conn.query(f'DELETE FROM {table} WHERE {column} LIKE :pattern',
+                       pattern=PREFIX + '%')
+
+        conn.query('DELETE FROM theme WHERE name = ANY(:names)', names=themes)
+
+
+def selections(themes: List[str]) -> List[Tuple[str, SelectionSpec]]:
+    '''The selections sent on character generation'''
+    filter_themes = tuple(themes[:2])
+
+    return [
+        ('positive features', feature_selection_spec(RandFeatSelectionSetup(
+            n_features=3, is_good=True, filter_themes=filter_themes))),
+        ('negative features', feature_selection_spec(RandFeatSelectionSetup(
+            n_features=3, is_good=False, filter_themes=filter_themes))),
+        ('items', item_selection_spec(RandItemSelectionSetup(
+            n_items=2, filter_themes=filter_themes))),
+        ('name', name_selection_spec(RandNameSelectionSetup(
+            gender='feminine', filter_themes=filter_themes))),
+        ('name, any theme', name_selection_spec(RandNameSelectionSetup(
+            gender='feminine'))),
+    ]
+
+
+def main() -> None:
+    '''Fill, print every plan, clean'''
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    n_themes = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    themes = [f'{PREFIX}{i}' for i in range(n_themes)]
+
+    fill(n_rows, themes)
+    try:
+        for title, spec in selections(themes):
+            sql = 'EXPLAIN (ANALYZE, BUFFERS) ' + build_selection_sql(spec)
+            plan = get_db().query(sql, **spec.params).as_dict()
+
+            print(f'-- {title}')
+            print('\n'.join(row['QUERY PLAN'] for row in plan))
+            print()
+    finally:
+        clean(themes)
+
+
+if __name__ == '__main__':
+    main()
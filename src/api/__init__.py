@@ -6,10 +6,60 @@ from starlette.middleware.cors import CORSMiddleware
 from src.config import settings
 
 from src.api.api_v1 import endpoints as endpoints_v1
+from src.database.snapshot import refresh_snapshot
+from src.database.async_database import get_async_pool, close_async_pool
+from src.database.catalog_listener import (start_catalog_listener,
+                                           stop_catalog_listener)
+from src.generator.pregeneration import (start_pregenerator,
+                                         stop_pregenerator)
 
 app = FastAPI(title=settings.PROJECT_NAME)
 
 
+@app.on_event('startup')
+def load_catalog_snapshot() -> None:
+    '''Load the catalog snapshot up front when generating from it'''
+    if settings.GENERATION_MODE == 'snapshot':  # pragma: no cover
+        refresh_snapshot()
+
+
+@app.on_event('startup')
+async def open_async_pool() -> None:
+    '''Open the async database pool before serving requests'''
+    if settings.ASYNC_DB:  # pragma: no cover
+        await get_async_pool()
+
+
+@app.on_event('startup')
+def follow_catalog_changes() -> None:
+    '''Keep caches in sync with catalog changes of other workers'''
+    start_catalog_listener()
+
+
+@app.on_event('startup')
+def pregenerate_hot_setups() -> None:
+    '''Keep characters ready for the most asked generation setups'''
+    start_pregenerator()
+
+
+@app.on_event('shutdown')
+async def shutdown_async_pool() -> None:
+    '''Close the async database pool'''
+    await close_async_pool()
+
+
+@app.on_event('shutdown')
+def stop_following_catalog_changes() -> None:
+    '''Stop the catalog listener thread'''
+    stop_catalog_listener()
+
+
+@app.on_event('shutdown')
+def stop_pregenerating() -> None:
+    '''Stop the pre-generator thread'''
+    stop_pregenerator()
+
+
 # Set all CORS enabled origins
 if settings.BACKEND_CORS_ORIGINS:
     app.add_middleware(
@@ -23,3 +73,5 @@ if settings.BACKEND_CORS_ORIGINS:
 
 app.include_router(endpoints_v1.listing_router, prefix=settings.API_V1_STR)
 app.include_router(endpoints_v1.generation_router, prefix=settings.API_V1_STR)
+app.include_router(endpoints_v1.stats_router, prefix=settings.API_V1_STR)
+app.include_router(endpoints_v1.capacity_router, prefix=settings.API_V1_STR)
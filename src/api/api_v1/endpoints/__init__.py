@@ -1,3 +1,5 @@
 '''Make all endpoints importable from package root'''
 from .listing import router as listing_router
 from .generate import router as generation_router
+from .stats import router as stats_router
+from .capacity import router as capacity_router
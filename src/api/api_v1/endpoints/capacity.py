@@ -0,0 +1,37 @@
+'''Endpoint for the candidates available to generations'''
+from typing import Any, List, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from starlette.concurrency import run_in_threadpool
+
+from src import schemas
+from src.config import settings
+from src.database.dao import CapacityDAO
+from src.database.dao.exceptions import UnknownTheme
+
+router = APIRouter()
+
+THEME_QUERY = Query(None, description='Count only candidates of these themes')
+
+
+@router.get('/capacity', response_model=schemas.CapacityModel)
+async def get_capacity(theme: Optional[List[str]] = THEME_QUERY) -> Any:
+    '''Return the most parts a generation can ask for the given themes'''
+    themes = tuple(theme) if theme else None
+    try:
+        capacity = await run_in_threadpool(CapacityDAO().get_capacity,
+                                           themes)
+
+    except UnknownTheme as exp:
+        raise HTTPException(status_code=422, detail=f'Unknown themes {exp}')
+
+    names = {gender: capacity.names_of(gender)
+             for gender in settings.CHARACTER_GENDER_POSSIBILITIES + ['any']}
+
+    return {
+        'themes': capacity.themes,
+        'names': names,
+        'n_positive_features': capacity.positive_features,
+        'n_negative_features': capacity.negative_features,
+        'n_items': capacity.items
+    }
@@ -1,29 +1,160 @@
 '''Character generation endpoint'''
-from typing import Any
+import itertools
+import json
+from typing import (Any, Dict, Iterable, Iterator, AsyncIterator, Tuple,
+                    cast)
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request
+from loguru import logger
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import StreamingResponse
 
 from src import schemas
-from src.generator.generation import generate_character, GenerationSetup
+from src.config import settings
+from src.generator.coalescer import get_coalescer
+from src.generator.generation import (generate_character,
+                                      generate_character_async,
+                                      generate_characters,
+                                      iter_generate_characters,
+                                      GenerationOutcome,
+                                      GenerationSetup)
 from src.generator.exceptions import NoDataForGeneration
+from src.generator.pregeneration import get_pregenerator
 
 router = APIRouter()
 
+# Validated up front, errors can not be reported once streaming
+FLUSH_EVERY_QUERY = Query(0, ge=0)
 
-@router.post('/generate',
-             response_model=schemas.GeneratedCharacter,
-             responses={206: {'model': schemas.NoDataToGen}})
-def gen_character(gen_request: schemas.GenerationRequest) -> Any:
-    '''Generate the character'''
 
-    setup = GenerationSetup(
+def setup_from_request(gen_request: schemas.GenerationRequest
+                       ) -> GenerationSetup:
+    '''Translate a generation request to a generation setup'''
+    return GenerationSetup(
         themes=gen_request.themes,
         gender=gen_request.gender,
         items=gen_request.n_items,
         n_positive_features=gen_request.n_positive_features,
         n_negative_features=gen_request.n_negative_features)
+
+
+def setups_from_batch(batch: schemas.BatchGenerationRequest,
+                      max_size: int) -> Iterable[GenerationSetup]:
+    '''Lazily expand a batch request into one setup per character'''
+    if batch.count < 0:
+        raise HTTPException(status_code=422,
+                            detail='count must be non-negative')
+
+    if batch.count + len(batch.requests) > max_size:
+        raise HTTPException(
+            status_code=422,
+            detail=f'At most {max_size} characters per batch')
+
+    return itertools.chain(
+        itertools.repeat(setup_from_request(batch.request), batch.count),
+        (setup_from_request(request) for request in batch.requests))
+
+
+def ndjson_chunk(outcomes: Iterator[Tuple[int, GenerationOutcome]],
+                 size: int) -> bytes:
+    '''Generate up to `size` characters, one JSON document per line'''
+    lines = []
+    for index, outcome in itertools.islice(outcomes, size):
+        line: Dict[str, Any] = {'index': index}
+        if outcome.error:
+            line['detail'] = outcome.error
+        else:
+            line['character'] = outcome.character
+
+        lines.append(json.dumps(line) + '\n')
+
+    return ''.join(lines).encode()
+
+
+async def ndjson_stream(request: Request,
+                        outcomes: Iterator[Tuple[int, GenerationOutcome]],
+                        flush_every: int) -> AsyncIterator[bytes]:
+    '''Write characters chunk by chunk, stopping if the client leaves'''
+    while True:
+        if await request.is_disconnected():
+            logger.info('Client disconnected, stopping generation stream')
+            break
+
+        chunk = await run_in_threadpool(ndjson_chunk, outcomes, flush_every)
+        if not chunk:
+            break
+
+        yield chunk
+
+
+async def generate_single(setup: GenerationSetup) -> Dict:
+    '''Generate a character on the async DAOs or on the threadpool'''
+    if settings.ASYNC_DB:
+        return await generate_character_async(setup)
+
+    return cast(Dict, await run_in_threadpool(generate_character, setup))
+
+
+@router.post('/generate',
+             response_model=schemas.GeneratedCharacter,
+             responses={206: {'model': schemas.NoDataToGen}})
+async def gen_character(gen_request: schemas.GenerationRequest) -> Any:
+    '''Generate the character'''
+
+    setup = setup_from_request(gen_request)
+
+    pregenerator = get_pregenerator()
+    if pregenerator is not None:
+        character = pregenerator.take(setup)
+        if character is not None:
+            return character
+
     try:
-        return generate_character(setup)
+        if settings.COALESCE_WINDOW_MS > 0:
+            return await get_coalescer().generate(setup, generate_single)
+
+        return await generate_single(setup)
 
     except NoDataForGeneration as exp:
         raise HTTPException(status_code=206, detail=str(exp))
+
+
+@router.post('/generate/batch',
+             response_model=schemas.BatchGeneratedCharacters)
+def gen_character_batch(batch: schemas.BatchGenerationRequest) -> Any:
+    '''Generate many characters, reporting failures one by one'''
+    outcomes = generate_characters(
+        setups_from_batch(batch, settings.BATCH_MAX_SIZE))
+
+    results = [{'index': index,
+                'character': outcome.character,
+                'detail': outcome.error}
+               for index, outcome in enumerate(outcomes)]
+    failed = sum(1 for outcome in outcomes if outcome.error)
+
+    return {
+        'generated': len(outcomes) - failed,
+        'failed': failed,
+        'results': results
+    }
+
+
+@router.post('/generate/stream',
+             response_class=StreamingResponse,
+             responses={200: {'content': {'application/x-ndjson': {}}}})
+async def gen_character_stream(batch: schemas.BatchGenerationRequest,
+                               request: Request,
+                               flush_every: int = FLUSH_EVERY_QUERY) -> Any:
+    '''Generate many characters, streamed as newline delimited JSON
+
+    Each line holds the `index` of the character and either the
+    `character` or the `detail` of why it failed. Characters are written
+    in chunks of `flush_every`, STREAM_FLUSH_EVERY by default.
+    '''
+    setups = setups_from_batch(batch, settings.STREAM_MAX_SIZE)
+    outcomes = enumerate(iter_generate_characters(setups))
+
+    return StreamingResponse(
+        ndjson_stream(request, outcomes,
+                      flush_every or settings.STREAM_FLUSH_EVERY),
+        media_type='application/x-ndjson')
@@ -1,42 +1,340 @@
-'''Endpoints for listing items on database'''
+'''Endpoints for listing items on database
 
-from typing import Any, List
+Without `limit` nor `after`, every matching row is returned as a plain list,
+as for clients written before pagination. Otherwise a page of rows ordered
+by id is returned, along with the `next_cursor` to pass as `after`.
 
-from fastapi import APIRouter
+The `/stream` variants write every matching row as it is read from a
+server-side cursor, as a JSON array or as newline delimited JSON.
 
+Responses carry the catalog version as `ETag`, `If-None-Match` requests on
+an unchanged catalog are answered with 304 and no query. Serialized bodies
+are cached for the current catalog version, and concurrent requests for a
+body not cached yet share a single query and serialization.
+'''
+import json
+from datetime import timezone
+from email.utils import format_datetime
+from typing import (Any, AsyncIterator, List, Optional, Tuple, Union,
+                    cast)
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.encoders import jsonable_encoder
+from loguru import logger
+from pydantic import parse_obj_as
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response, StreamingResponse
+
+from src.caching import LRUCache, SingleFlight
+from src.config import settings
+from src.database.catalog_version import (CatalogVersion, get_catalog_version,
+                                          on_catalog_change)
 from src.database.dao import FeatureDAO, NameDAO, ItemDAO, ThemeDAO
+from src.database.dao import (AsyncFeatureDAO, AsyncNameDAO,
+                              AsyncItemDAO, AsyncThemeDAO)
+from src.database.dao import (ListingSetup, FeatureListingSetup,
+                              NameListingSetup)
+from src.database.dao import get_theme_registry
+from src.database.dao.exceptions import InvalidGender, UnknownTheme
 from src import schemas
 
 router = APIRouter()
 
+LIMIT_QUERY = Query(None, ge=1, le=settings.LISTING_MAX_LIMIT)
+THEME_QUERY = Query(None, description='List only rows of these themes')
+FORMAT_QUERY = Query('json', alias='format', regex='^(json|ndjson)$')
+
+MEDIA_TYPES = {'json': 'application/json', 'ndjson': 'application/x-ndjson'}
+
+BODY_CACHE = LRUCache(settings.LISTING_CACHE_SIZE)
+BODY_FLIGHTS = SingleFlight()
+
+
+def _drop_stale_bodies(_version: CatalogVersion) -> None:
+    '''Bodies of an old catalog version will never be served again'''
+    BODY_CACHE.clear()
+
+
+on_catalog_change(_drop_stale_bodies)
+
+
+def paginate(setup: ListingSetup) -> bool:
+    '''Is the listing paginated? Defaults the limit when it is'''
+    if setup.limit is None and setup.after is None:
+        return False
+
+    if setup.limit is None:
+        setup.limit = settings.LISTING_DEFAULT_LIMIT
+
+    return True
+
+
+def version_headers(version: CatalogVersion) -> dict:
+    '''Validation headers of responses built from `version`'''
+    return {
+        'ETag': f'"{version.version}"',
+        'Last-Modified': format_datetime(
+            version.updated_at.astimezone(timezone.utc), usegmt=True)
+    }
+
+
+def not_modified(request: Request, etag: str) -> bool:
+    '''Does the client already hold the response tagged `etag`?'''
+    if_none_match = request.headers.get('if-none-match')
+    if not if_none_match:
+        return False
+
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+
+    return '*' in tags or etag in tags or f'W/{etag}' in tags
+
+
+async def cached_listing(request: Request, response_type: Any,
+                         dao_class: Any, async_dao_class: Any,
+                         setup: ListingSetup) -> Response:
+    '''Answer a listing request from the client or the body caches'''
+    if settings.ASYNC_DB:
+        version = get_catalog_version()
+    else:
+        version = await run_in_threadpool(get_catalog_version)
+
+    headers = version_headers(version)
+    if not_modified(request, headers['ETag']):
+        return Response(status_code=304, headers=headers)
+
+    key = (version.version, request.url.path, str(request.query_params))
+    body = await listing_body(key, response_type, dao_class,
+                              async_dao_class, setup)
+
+    return Response(content=body, media_type='application/json',
+                    headers=headers)
+
+
+async def listing_body(key: Tuple, response_type: Any, dao_class: Any,
+                       async_dao_class: Any, setup: ListingSetup) -> bytes:
+    '''Return the serialized listing of `key`, cached or queried once'''
+    body: Optional[bytes] = BODY_CACHE.get(key)
+    if body is not None:
+        return body
+
+    async def build() -> bytes:
+        data = await list_page(dao_class, async_dao_class, setup)
+        built = json.dumps(
+            jsonable_encoder(parse_obj_as(response_type, data))).encode()
+        BODY_CACHE.set(key, built)
+
+        return built
+
+    return cast(bytes, await BODY_FLIGHTS.do(key, build))
+
+
+async def list_page(dao_class: Any, async_dao_class: Any,
+                    setup: ListingSetup) -> Any:
+    '''List a table with the async DAO, or the blocking one on a thread'''
+    paginated = paginate(setup)
+
+    try:
+        if settings.ASYNC_DB:
+            page = await async_dao_class().list_page(setup)
+        else:
+            page = await run_in_threadpool(dao_class().list_page, setup)
+
+    except InvalidGender as exp:
+        raise HTTPException(status_code=422, detail=f'Invalid gender {exp}')
+
+    except UnknownTheme as exp:
+        raise HTTPException(status_code=422, detail=f'Unknown themes {exp}')
+
+    if not paginated:
+        return page.rows
+
+    return {'results': page.rows, 'next_cursor': page.next_cursor}
+
 
-@router.get('/listing/items', response_model=List[schemas.ItemModel])
-def list_all_items() -> Any:
+async def iter_chunks(dao_class: Any, async_dao_class: Any,
+                      setup: ListingSetup) -> AsyncIterator[List]:
+    '''Read the listing in chunks with the async or the blocking DAO'''
+    chunk_size = settings.LISTING_STREAM_CHUNK
+
+    if settings.ASYNC_DB:
+        async for chunk in async_dao_class().iter_rows(setup, chunk_size):
+            yield chunk
+
+        return
+
+    chunks = dao_class().iter_rows(setup, chunk_size)
+    try:
+        while True:
+            chunk = await run_in_threadpool(next, chunks, None)
+            if chunk is None:
+                break
+
+            yield chunk
+    finally:
+        # Give the connection back even when the client left early
+        await run_in_threadpool(chunks.close)
+
+
+async def encode_stream(request: Request, chunks: AsyncIterator[List],
+                        fmt: str) -> AsyncIterator[bytes]:
+    '''Encode chunks of rows as a JSON array or as NDJSON'''
+    first = True
+    if fmt == 'json':
+        yield b'['
+
+    async for chunk in chunks:
+        if await request.is_disconnected():
+            logger.info('Client disconnected, stopping listing stream')
+            return
+
+        if fmt == 'json':
+            body = ','.join(json.dumps(row) for row in chunk)
+            yield (body if first else ',' + body).encode()
+        else:
+            yield ''.join(json.dumps(row) + '\n' for row in chunk).encode()
+
+        first = False
+
+    if fmt == 'json':
+        yield b']'
+
+
+async def stream_listing(request: Request, dao_class: Any,
+                         async_dao_class: Any, setup: ListingSetup,
+                         fmt: str) -> StreamingResponse:
+    '''Respond with every row of a listing, streamed
+
+    Themes are checked first, errors can not be reported once streaming.
+    '''
+    registry = await run_in_threadpool(get_theme_registry)
+    try:
+        registry.resolve(setup.filter_themes or ())
+
+    except UnknownTheme as exp:
+        raise HTTPException(status_code=422, detail=f'Unknown themes {exp}')
+
+    chunks = iter_chunks(dao_class, async_dao_class, setup)
+
+    return StreamingResponse(encode_stream(request, chunks, fmt),
+                             media_type=MEDIA_TYPES[fmt])
+
+
+ITEMS_RESPONSE = Union[schemas.ItemPage, List[schemas.ItemModel]]
+FEATURES_RESPONSE = Union[schemas.FeaturePage, List[schemas.FeatureModel]]
+THEMES_RESPONSE = Union[schemas.ThemePage, List[schemas.ThemeModel]]
+NAMES_RESPONSE = Union[schemas.NamePage, List[schemas.NameModel]]
+
+
+def documented(response_type: Any) -> dict:
+    '''Document `response_type` as the body of successful listings
+
+    Bodies are serialized by `cached_listing`, so the union is only used by
+    the OpenAPI schema, not as the route `response_model`.
+    '''
+    return {200: {'model': response_type}}
+
+
+@router.get('/listing/items', response_model=None,
+            responses=documented(ITEMS_RESPONSE))
+async def list_all_items(request: Request,
+                         limit: Optional[int] = LIMIT_QUERY,
+                         after: Optional[int] = None,
+                         theme: Optional[List[str]] = THEME_QUERY) -> Any:
     '''Return all items on database'''
-    dao = ItemDAO()
+    setup = ListingSetup(limit=limit, after=after,
+                         filter_themes=tuple(theme) if theme else None)
 
-    return dao.list_all()
+    return await cached_listing(request, ITEMS_RESPONSE,
+                                ItemDAO, AsyncItemDAO, setup)
 
 
-@router.get('/listing/features', response_model=List[schemas.FeatureModel])
-def list_all_features() -> Any:
+@router.get('/listing/features', response_model=None,
+            responses=documented(FEATURES_RESPONSE))
+async def list_all_features(request: Request,
+                            limit: Optional[int] = LIMIT_QUERY,
+                            after: Optional[int] = None,
+                            theme: Optional[List[str]] = THEME_QUERY,
+                            is_good: Optional[bool] = None) -> Any:
     '''Return all features on database'''
-    dao = FeatureDAO()
+    setup = FeatureListingSetup(limit=limit, after=after,
+                                filter_themes=tuple(theme) if theme else None,
+                                is_good=is_good)
 
-    return dao.list_all()
+    return await cached_listing(request, FEATURES_RESPONSE,
+                                FeatureDAO, AsyncFeatureDAO, setup)
 
 
-@router.get('/listing/themes', response_model=List[schemas.ThemeModel])
-def list_all_themes() -> Any:
+@router.get('/listing/themes', response_model=None,
+            responses=documented(THEMES_RESPONSE))
+async def list_all_themes(request: Request,
+                          limit: Optional[int] = LIMIT_QUERY,
+                          after: Optional[int] = None) -> Any:
     '''Return all themes on database'''
-    dao = ThemeDAO()
+    setup = ListingSetup(limit=limit, after=after)
 
-    return dao.list_all()
+    return await cached_listing(request, THEMES_RESPONSE,
+                                ThemeDAO, AsyncThemeDAO, setup)
 
 
-@router.get('/listing/names', response_model=List[schemas.NameModel])
-def list_all_names() -> Any:
+@router.get('/listing/names', response_model=None,
+            responses=documented(NAMES_RESPONSE))
+async def list_all_names(request: Request,
+                         limit: Optional[int] = LIMIT_QUERY,
+                         after: Optional[int] = None,
+                         theme: Optional[List[str]] = THEME_QUERY,
+                         gender: Optional[str] = None) -> Any:
     '''Return all Names on database'''
-    dao = NameDAO()
+    setup = NameListingSetup(limit=limit, after=after,
+                             filter_themes=tuple(theme) if theme else None,
+                             gender=gender)
+
+    return await cached_listing(request, NAMES_RESPONSE,
+                                NameDAO, AsyncNameDAO, setup)
+
+
+@router.get('/listing/items/stream', response_class=StreamingResponse)
+async def stream_all_items(request: Request,
+                           theme: Optional[List[str]] = THEME_QUERY,
+                           fmt: str = FORMAT_QUERY) -> Any:
+    '''Stream all items on database'''
+    setup = ListingSetup(filter_themes=tuple(theme) if theme else None)
+
+    return await stream_listing(request, ItemDAO, AsyncItemDAO, setup, fmt)
+
+
+@router.get('/listing/features/stream', response_class=StreamingResponse)
+async def stream_all_features(request: Request,
+                              theme: Optional[List[str]] = THEME_QUERY,
+                              is_good: Optional[bool] = None,
+                              fmt: str = FORMAT_QUERY) -> Any:
+    '''Stream all features on database'''
+    setup = FeatureListingSetup(filter_themes=tuple(theme) if theme else None,
+                                is_good=is_good)
+
+    return await stream_listing(request, FeatureDAO, AsyncFeatureDAO,
+                                setup, fmt)
+
+
+@router.get('/listing/themes/stream', response_class=StreamingResponse)
+async def stream_all_themes(request: Request,
+                            fmt: str = FORMAT_QUERY) -> Any:
+    '''Stream all themes on database'''
+    return await stream_listing(request, ThemeDAO, AsyncThemeDAO,
+                                ListingSetup(), fmt)
+
+
+@router.get('/listing/names/stream', response_class=StreamingResponse)
+async def stream_all_names(request: Request,
+                           theme: Optional[List[str]] = THEME_QUERY,
+                           gender: Optional[str] = None,
+                           fmt: str = FORMAT_QUERY) -> Any:
+    '''Stream all Names on database'''
+    if gender is not None \
+            and gender not in settings.CHARACTER_GENDER_POSSIBILITIES:
+        raise HTTPException(status_code=422,
+                            detail=f'Invalid gender {gender}')
+
+    setup = NameListingSetup(filter_themes=tuple(theme) if theme else None,
+                             gender=gender)
 
-    return dao.list_all()
+    return await stream_listing(request, NameDAO, AsyncNameDAO, setup, fmt)
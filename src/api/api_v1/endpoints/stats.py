@@ -0,0 +1,80 @@
+'''Endpoints for runtime statistics'''
+from typing import Any, List
+
+from fastapi import APIRouter
+
+from src import schemas
+from src.database.dao.sampling import get_candidate_id_stats
+from src.database.database_utils import get_pool_stats
+from src.generator.coalescer import get_coalescer
+from src.generator.pregeneration import get_pregenerator
+
+router = APIRouter()
+
+
+@router.get('/stats/pool', response_model=schemas.PoolStatsModel)
+def pool_stats() -> Any:
+    '''Return the usage of the database connection pool'''
+    stats = get_pool_stats()
+
+    return {
+        'size': stats.size,
+        'checked_out': stats.checked_out,
+        'overflow': stats.overflow,
+        'checkouts': stats.checkouts,
+        'wait_total': stats.wait_total,
+        'wait_max': stats.wait_max,
+        'wait_avg': stats.wait_avg
+    }
+
+
+@router.get('/stats/candidate-ids', response_model=schemas.CacheStatsModel)
+def candidate_id_stats() -> Any:
+    '''Return the usage of the candidate id cache'''
+    stats = get_candidate_id_stats()
+
+    return {
+        'size': stats.size,
+        'maxsize': stats.maxsize,
+        'hits': stats.hits,
+        'misses': stats.misses
+    }
+
+
+@router.get('/stats/coalescer', response_model=schemas.CoalescerStatsModel)
+def coalescer_stats() -> Any:
+    '''Return the batches made by the generation coalescer'''
+    stats = get_coalescer().stats()
+
+    return {
+        'window_ms': stats.window_ms,
+        'max_batch': stats.max_batch,
+        'requests': stats.requests,
+        'batches': stats.batches,
+        'pool_fetches': stats.pool_fetches,
+        'max_batch_size': stats.max_batch_size,
+        'avg_batch_size': stats.avg_batch_size
+    }
+
+
+@router.get('/stats/pregeneration',
+            response_model=List[schemas.PregenBufferStatsModel])
+def pregeneration_stats() -> Any:
+    '''Return the buffers of pre-generated characters, if running'''
+    pregenerator = get_pregenerator()
+    if pregenerator is None:
+        return []
+
+    return [{
+        'themes': stats.setup.themes,
+        'gender': stats.setup.gender,
+        'n_items': stats.setup.items,
+        'n_positive_features': stats.setup.n_positive_features,
+        'n_negative_features': stats.setup.n_negative_features,
+        'requests': stats.requests,
+        'size': stats.size,
+        'capacity': stats.capacity,
+        'served': stats.served,
+        'refilled': stats.refilled,
+        'refill_rate': stats.refill_rate
+    } for stats in pregenerator.stats()]
@@ -0,0 +1,107 @@
+'''In-process caches shared by the API and the DAOs'''
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+
+@dataclass
+class CacheStats:
+    '''Usage counters of a cache
+
+    Attributes:
+        size: number of entries held
+        maxsize: maximum number of entries
+        hits: lookups answered from the cache
+        misses: lookups not found, or expired
+    '''
+    size: int
+    maxsize: int
+    hits: int
+    misses: int
+
+
+class LRUCache:
+    '''Thread-safe bounded mapping, evicting the least recently used entry
+
+    When `ttl` is set, entries older than `ttl` seconds are treated as
+    missing.
+    '''
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.__entries: 'OrderedDict[Hashable, Any]' = OrderedDict()
+        self.__lock = threading.Lock()
+        self.__hits = 0
+        self.__misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        '''Return the value cached for `key`, or `default`'''
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None and self.ttl is not None \
+                    and time.monotonic() - entry[0] > self.ttl:
+                del self.__entries[key]
+                entry = None
+
+            if entry is None:
+                self.__misses += 1
+                return default
+
+            self.__entries.move_to_end(key)
+            self.__hits += 1
+
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        '''Cache `value` for `key`'''
+        with self.__lock:
+            self.__entries[key] = (time.monotonic(), value)
+            self.__entries.move_to_end(key)
+
+            while len(self.__entries) > self.maxsize:
+                self.__entries.popitem(last=False)
+
+    def clear(self) -> None:
+        '''Drop every entry, counters are kept'''
+        with self.__lock:
+            self.__entries.clear()
+
+    def stats(self) -> CacheStats:
+        '''Return the usage counters'''
+        with self.__lock:
+            return CacheStats(size=len(self.__entries), maxsize=self.maxsize,
+                              hits=self.__hits, misses=self.__misses)
+
+
+class SingleFlight:
+    '''Share one in-flight call among concurrent callers of the same key
+
+    The first caller of a key starts the call, callers arriving before it
+    ends await the same result, or error. For coroutines of one event
+    loop, blocking work awaited on the threadpool is shared the same way.
+    '''
+
+    def __init__(self) -> None:
+        self.__flights: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable,
+                 call: Callable[[], Awaitable[Any]]) -> Any:
+        '''Return the result of `call`, or of the one running for `key`'''
+        flight = self.__flights.get(key)
+        if flight is None:
+            flight = asyncio.ensure_future(call())
+            self.__flights[key] = flight
+            flight.add_done_callback(
+                lambda done: self.__land(key, done))
+
+        # A caller giving up must not cancel the call of the others
+        return await asyncio.shield(flight)
+
+    def __land(self, key: Hashable, flight: asyncio.Future) -> None:
+        '''Forget a finished call, the next caller starts a new one'''
+        if self.__flights.get(key) is flight:
+            del self.__flights[key]
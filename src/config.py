@@ -19,5 +19,135 @@ class Settings:
 
     CHARACTER_GENDER_POSSIBILITIES = ['masculine', 'feminine', 'neutral']
 
+    # How `generate_character` reaches the database: 'single_query' selects
+    # every part of the character in one statement, 'separate' runs one
+    # query per part and 'snapshot' samples an in-memory catalog snapshot
+    GENERATION_MODE: str = os.environ.get('GENERATION_MODE', 'single_query')
+
+    # Candidate pools kept by the catalog snapshot, by themes and gender
+    SNAPSHOT_POOL_CACHE_SIZE: int = int(
+        os.environ.get('SNAPSHOT_POOL_CACHE_SIZE', 256))
+
+    # Page size of listings requested with a cursor but no limit
+    LISTING_DEFAULT_LIMIT: int = int(
+        os.environ.get('LISTING_DEFAULT_LIMIT', 100))
+
+    # Rows read from the server-side cursor at a time by streamed listings
+    LISTING_STREAM_CHUNK: int = int(
+        os.environ.get('LISTING_STREAM_CHUNK', 1000))
+
+    # Serialized listing responses kept for the current catalog version
+    LISTING_CACHE_SIZE: int = int(os.environ.get('LISTING_CACHE_SIZE', 128))
+
+    LISTING_MAX_LIMIT: int = int(os.environ.get('LISTING_MAX_LIMIT', 1000))
+
+    # Most characters a single batch generation can ask for
+    BATCH_MAX_SIZE: int = int(os.environ.get('BATCH_MAX_SIZE', 1000))
+
+    # Most characters a single streamed generation can ask for
+    STREAM_MAX_SIZE: int = int(os.environ.get('STREAM_MAX_SIZE', 100000))
+
+    # Characters written to each chunk of a streamed generation
+    STREAM_FLUSH_EVERY: int = int(os.environ.get('STREAM_FLUSH_EVERY', 100))
+
+    # Random selection strategy of the DAOs: 'auto' picks one from table
+    # statistics, 'order_by_random', 'tablesample', 'id_range' or
+    # 'candidate_ids' force it. The one statement of the 'single_query'
+    # generation mode and the async DAOs always use 'order_by_random'
+    SAMPLING_STRATEGY: str = os.environ.get('SAMPLING_STRATEGY', 'auto')
+
+    # Where the DAOs find selection candidates: 'tables' joins the link
+    # tables, 'view' scans the `catalogcandidate` materialized view
+    SELECTION_SOURCE: str = os.environ.get('SELECTION_SOURCE', 'tables')
+
+    # DAO statements kept parsed, 0 disables the cache
+    STATEMENT_CACHE_SIZE: int = int(os.environ.get('STATEMENT_CACHE_SIZE',
+                                                   256))
+
+    # Prepare cached statements server side, once per pooled connection.
+    # Disable behind poolers that do not keep sessions, as pgbouncer in
+    # transaction mode
+    PREPARED_STATEMENTS: bool = bool(int(
+        os.environ.get('PREPARED_STATEMENTS', 1)))
+
+    # Candidate id lists kept for the 'candidate_ids' strategy, 0 disables
+    # it, and seconds each list is reused before being read again
+    CANDIDATE_ID_CACHE_SIZE: int = int(
+        os.environ.get('CANDIDATE_ID_CACHE_SIZE', 256))
+
+    CANDIDATE_ID_CACHE_TTL: int = int(
+        os.environ.get('CANDIDATE_ID_CACHE_TTL', 300))
+
+    # Check generations against the cached number of candidates of their
+    # themes first, rejecting infeasible ones without sampling queries
+    CAPACITY_CHECK: bool = bool(int(os.environ.get('CAPACITY_CHECK', 1)))
+
+    # Theme combinations whose number of candidates is kept
+    CAPACITY_CACHE_SIZE: int = int(os.environ.get('CAPACITY_CACHE_SIZE',
+                                                  1024))
+
+    # Tables up to this many rows are sampled with ORDER BY random()
+    SAMPLING_SMALL_TABLE_ROWS: int = int(
+        os.environ.get('SAMPLING_SMALL_TABLE_ROWS', 10000))
+
+    # Rows drawn by sample for each requested row, before filtering
+    SAMPLING_OVERSAMPLE: int = int(os.environ.get('SAMPLING_OVERSAMPLE', 4))
+
+    SAMPLING_MAX_RETRIES: int = int(
+        os.environ.get('SAMPLING_MAX_RETRIES', 3))
+
+    # Seconds table statistics are reused before being read again
+    SAMPLING_STATS_TTL: int = int(os.environ.get('SAMPLING_STATS_TTL', 300))
+
+    # Serve endpoints through the asyncpg based DAOs instead of running the
+    # blocking ones on the threadpool, needs the optional `asyncpg` package
+    ASYNC_DB: bool = bool(int(os.environ.get('ASYNC_DB', 0)))
+
+    # Concurrent single generations with the same themes and gender
+    # arriving within this many milliseconds share one candidate pool
+    # fetch, up to COALESCE_MAX_BATCH of them, 0 disables coalescing
+    COALESCE_WINDOW_MS: float = float(
+        os.environ.get('COALESCE_WINDOW_MS', 0))
+
+    COALESCE_MAX_BATCH: int = int(os.environ.get('COALESCE_MAX_BATCH', 64))
+
+    # Ready characters kept for the PREGEN_HOT_KEYS most asked generation
+    # setups, 0 disables pre-generation. A setup is hot after
+    # PREGEN_MIN_REQUESTS recent requests, buffers hold PREGEN_BUFFER_SIZE
+    # characters and are refilled every PREGEN_INTERVAL seconds
+    PREGEN_HOT_KEYS: int = int(os.environ.get('PREGEN_HOT_KEYS', 0))
+    PREGEN_BUFFER_SIZE: int = int(os.environ.get('PREGEN_BUFFER_SIZE', 32))
+    PREGEN_MIN_REQUESTS: int = int(os.environ.get('PREGEN_MIN_REQUESTS', 5))
+    PREGEN_INTERVAL: float = float(os.environ.get('PREGEN_INTERVAL', 1))
+
+    # Entities sent per statement by the bulk populate functions
+    IMPORT_BATCH_SIZE: int = int(os.environ.get('IMPORT_BATCH_SIZE', 5000))
+
+    # Parallel imports: concurrent transactions, and hash partitions per
+    # entity type. Workers hold a pooled connection each, keep them under
+    # DB_POOL_SIZE + DB_MAX_OVERFLOW
+    IMPORT_WORKERS: int = int(os.environ.get('IMPORT_WORKERS', 4))
+    IMPORT_PARTITIONS: int = int(os.environ.get('IMPORT_PARTITIONS', 4))
+
+    # How workers learn of catalog changes made by other processes:
+    # 'notify' listens on a Postgres channel, falling back to 'poll' if
+    # LISTEN fails, 'poll' reads the catalog version table, 'off' disables
+    CATALOG_SYNC: str = os.environ.get('CATALOG_SYNC', 'notify')
+
+    # Seconds between catalog version polls, and between checks for stop
+    CATALOG_POLL_INTERVAL: float = float(
+        os.environ.get('CATALOG_POLL_INTERVAL', 5))
+
+    # Shared connection pool, see `src.database.database_utils.get_db`
+    DB_POOL_SIZE: int = int(os.environ.get('DB_POOL_SIZE', 5))
+
+    DB_MAX_OVERFLOW: int = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+
+    DB_POOL_RECYCLE: int = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+
+    DB_POOL_PRE_PING: bool = bool(int(os.environ.get('DB_POOL_PRE_PING', 1)))
+
+    DB_POOL_TIMEOUT: int = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+
 
 settings = Settings()
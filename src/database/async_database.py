@@ -0,0 +1,104 @@
+'''Asyncio access to the database, through an asyncpg connection pool
+
+asyncpg is an optional dependency, only needed when settings.ASYNC_DB is
+set. Queries keep the `:name` parameters used with records.
+'''
+import re
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from src.config import settings
+from src.database.database_utils import get_db_url
+
+try:
+    import asyncpg
+except ImportError:  # pragma: no cover
+    asyncpg = None
+
+
+__POOL: Optional[Any] = None
+
+__PARAM_REGEX = re.compile(r'(?<![:\w]):([A-Za-z_]\w*)')
+
+
+def number_params(sql: str) -> Tuple[str, List[str]]:
+    '''Translate `:name` parameters to `$n` ones, returning names by n'''
+    positions: Dict[str, int] = {}
+
+    def replace(match: Any) -> str:
+        name = match.group(1)
+        if name not in positions:
+            positions[name] = len(positions) + 1
+
+        return f'${positions[name]}'
+
+    sql = __PARAM_REGEX.sub(replace, sql)
+
+    # Names are numbered in order of first use
+    return sql, list(positions)
+
+
+def to_positional(sql: str, params: Dict[str, Any]) -> Tuple[str, List]:
+    '''Translate `:name` parameters to asyncpg `$n` ones'''
+    sql, names = number_params(sql)
+
+    return sql, [params[name] for name in names]
+
+
+async def get_async_pool() -> Any:
+    '''Return the process-wide asyncpg pool, created on first use'''
+    global __POOL  # pylint: disable=global-statement,invalid-name
+
+    if asyncpg is None:  # pragma: no cover
+        raise RuntimeError('asyncpg is required for async database access')
+
+    if __POOL is None:
+        # asyncpg does not understand SQLAlchemy driver suffixes
+        dsn = re.sub(r'^postgresql\+\w+://', 'postgresql://',
+                     get_db_url() or '')
+        __POOL = await asyncpg.create_pool(
+            dsn,
+            min_size=1,
+            max_size=settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW,
+            max_inactive_connection_lifetime=settings.DB_POOL_RECYCLE)
+        logger.info('Async database pool created')
+
+    return __POOL
+
+
+async def close_async_pool() -> None:
+    '''Close the asyncpg pool, if open'''
+    global __POOL  # pylint: disable=global-statement,invalid-name
+
+    if __POOL is not None:
+        await __POOL.close()
+        __POOL = None
+
+
+async def fetch(sql: str, **params: Any) -> List[Dict]:
+    '''Run a query on a pooled connection, returning rows as dicts'''
+    sql, args = to_positional(sql, params)
+    pool = await get_async_pool()
+
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(sql, *args, timeout=settings.DB_POOL_TIMEOUT)
+
+    return [dict(row) for row in rows]
+
+
+async def stream(sql: str, chunk_size: int,
+                 **params: Any) -> AsyncIterator[List[Dict]]:
+    '''Run a query on a server-side cursor, yielding chunks of rows'''
+    sql, args = to_positional(sql, params)
+    pool = await get_async_pool()
+
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            cursor = await conn.cursor(sql, *args)
+            while True:
+                rows = await cursor.fetch(chunk_size)
+                if not rows:
+                    break
+
+                yield [dict(row) for row in rows]
@@ -0,0 +1,48 @@
+'''Materialized view of selection candidates
+
+`catalogcandidate` flattens the three link tables into one relation of
+`(entity_type, entity_id, theme_id, is_good, gender)` rows, one per entity
+and theme. With SELECTION_SOURCE set to 'view', the DAOs find their
+candidates with a single index scan on it instead of joining the link and
+entity tables. It is refreshed at the end of every populate run.
+'''
+from records import Database
+from loguru import logger
+
+CANDIDATE_VIEW = 'catalogcandidate'
+
+CREATE_CANDIDATE_VIEW = [
+    f'''CREATE MATERIALIZED VIEW IF NOT EXISTS {CANDIDATE_VIEW} AS
+        SELECT 'name'::varchar AS entity_type, l.id_name AS entity_id,
+               l.id_theme AS theme_id, NULL::boolean AS is_good, n.gender
+        FROM linknametheme l JOIN name n ON n.id = l.id_name
+        UNION ALL
+        SELECT 'item', l.id_item, l.id_theme, NULL, NULL
+        FROM linkitemtheme l
+        UNION ALL
+        SELECT 'feature', l.id_feature, l.id_theme, f.is_good, NULL
+        FROM linkfeaturetheme l JOIN feature f ON f.id = l.id_feature''',
+    # Unique index, needed to refresh concurrently
+    f'''CREATE UNIQUE INDEX IF NOT EXISTS ix_{CANDIDATE_VIEW}_key
+        ON {CANDIDATE_VIEW} (entity_type, entity_id, theme_id)''',
+    f'''CREATE INDEX IF NOT EXISTS ix_{CANDIDATE_VIEW}_selection
+        ON {CANDIDATE_VIEW} (entity_type, theme_id, is_good, gender,
+                             entity_id)''',
+]
+
+
+def refresh_candidate_view(database: Database) -> bool:
+    '''Refresh the candidate view without blocking its readers
+
+    Returns False if the view does not exist, as before its migration.
+    '''
+    with database.transaction() as conn:
+        exists = conn.query('SELECT to_regclass(:name) IS NOT NULL AS found',
+                            name=CANDIDATE_VIEW).as_dict()[0]['found']
+        if not exists:  # pragma: no cover
+            logger.debug(f'No {CANDIDATE_VIEW} view to refresh')
+            return False
+
+        conn.query(f'REFRESH MATERIALIZED VIEW CONCURRENTLY {CANDIDATE_VIEW}')
+
+    return True
@@ -0,0 +1,149 @@
+'''Background follower of catalog changes made by other processes
+
+Each worker runs one listener thread. In 'notify' mode it holds a
+dedicated connection LISTENing on the catalog channel. When LISTEN is
+unavailable, or in 'poll' mode, it reads the catalog version table every
+CATALOG_POLL_INTERVAL seconds instead. Either way, new versions go through
+`set_catalog_version`, which runs the invalidation listeners.
+'''
+import re
+import select
+import threading
+from typing import Optional
+
+import psycopg2
+from loguru import logger
+
+from src.config import settings
+from src.database.database_utils import get_db, get_db_url
+from src.database.catalog_version import (CATALOG_CHANNEL,
+                                          read_catalog_version,
+                                          set_catalog_version)
+
+
+# Most seconds waited before listening again after a failure
+MAX_BACKOFF = 60.0
+# Failures in a row after which the listener polls instead
+MAX_LISTEN_FAILURES = 5
+
+
+class CatalogListener(threading.Thread):
+    '''Thread keeping the process catalog version up to date'''
+
+    def __init__(self, mode: str, interval: float) -> None:
+        super().__init__(name='catalog-listener', daemon=True)
+        self.mode = mode
+        self.interval = interval
+        self.__stop = threading.Event()
+        self.__failures = 0
+
+    def stop(self) -> None:
+        '''Ask the thread to finish, within `interval` seconds'''
+        self.__stop.set()
+
+    def run(self) -> None:
+        '''Follow notifications, or poll if they are unavailable
+
+        A listening connection that is lost, or fails, is opened again,
+        waiting twice as long after each failure, up to MAX_BACKOFF seconds.
+        The thread polls instead if LISTEN is refused, or after
+        MAX_LISTEN_FAILURES failures in a row.
+        '''
+        while self.mode == 'notify' and not self.__stop.is_set():
+            try:
+                self.__listen()
+                return
+
+            except (psycopg2.OperationalError,
+                    psycopg2.InterfaceError) as exp:
+                error = f'Catalog LISTEN connection lost: {exp}'
+
+            except psycopg2.Error as exp:
+                logger.warning(f'Catalog LISTEN unavailable, polling: {exp}')
+                break
+
+            except Exception as exp:  # pylint: disable=broad-except
+                error = f'Catalog listener failed: {exp}'
+
+            self.__failures += 1
+            if self.__failures >= MAX_LISTEN_FAILURES:
+                logger.warning(f'{error}, polling instead')
+                break
+
+            backoff = min(self.interval * 2 ** (self.__failures - 1),
+                          MAX_BACKOFF)
+            logger.error(f'{error}, retrying in {backoff:.1f}s')
+            self.__stop.wait(backoff)
+
+        self.__poll()
+
+    def __refresh(self) -> None:
+        '''Read the stored version, notifying listeners when it moved'''
+        set_catalog_version(read_catalog_version(get_db()))
+
+    def __listen(self) -> None:
+        '''Refresh on each notification of the catalog channel'''
+        dsn = re.sub(r'^postgresql\+\w+://', 'postgresql://',
+                     get_db_url() or '')
+        conn = psycopg2.connect(dsn)
+        try:
+            conn.set_session(autocommit=True)
+            with conn.cursor() as cursor:
+                cursor.execute(f'LISTEN {CATALOG_CHANNEL}')
+            self.__failures = 0
+
+            # Changes made before LISTEN started would be missed otherwise
+            self.__refresh()
+
+            while not self.__stop.is_set():
+                readable, _, _ = select.select([conn], [], [], self.interval)
+                if not readable:
+                    continue
+
+                conn.poll()
+                if not conn.notifies:
+                    continue
+
+                for notify in conn.notifies:
+                    logger.info(f'Catalog changed: {notify.payload}')
+
+                conn.notifies.clear()
+                self.__refresh()
+        finally:
+            conn.close()
+
+    def __poll(self) -> None:
+        '''Refresh every `interval` seconds'''
+        while not self.__stop.wait(self.interval):
+            try:
+                self.__refresh()
+
+            except Exception as exp:  # pylint: disable=broad-except
+                logger.error(f'Catalog version poll failed: {exp}')
+
+
+__LISTENER: Optional[CatalogListener] = None
+
+
+def start_catalog_listener() -> Optional[CatalogListener]:
+    '''Start the listener of this process, as set by CATALOG_SYNC'''
+    global __LISTENER  # pylint: disable=global-statement,invalid-name
+
+    if settings.CATALOG_SYNC not in ('notify', 'poll'):
+        return None
+
+    if __LISTENER is None or not __LISTENER.is_alive():
+        __LISTENER = CatalogListener(settings.CATALOG_SYNC,
+                                     settings.CATALOG_POLL_INTERVAL)
+        __LISTENER.start()
+
+    return __LISTENER
+
+
+def stop_catalog_listener() -> None:
+    '''Stop the listener of this process, if running'''
+    global __LISTENER  # pylint: disable=global-statement,invalid-name
+
+    if __LISTENER is not None:
+        __LISTENER.stop()
+        __LISTENER = None
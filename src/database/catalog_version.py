@@ -0,0 +1,118 @@
+'''Version of the catalog, bumped by every populate
+
+The version is read from the database once and then kept in the process,
+so it can be checked on every request without a query. Functions
+registered with `on_catalog_change` run when the process learns of a new
+version, to drop whatever they cached from the old catalog.
+
+Each bump is also sent on the CATALOG_CHANNEL notification channel, so
+other processes learn of it, see `src.database.catalog_listener`.
+'''
+import json
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, List, Optional, Sequence
+
+from loguru import logger
+from records import Connection, Database
+
+from src.database.database_utils import get_db
+
+
+@dataclass(frozen=True)
+class CatalogVersion:
+    '''A version of the catalog
+
+    Attributes:
+        version: increasing version number, 0 if never populated
+        updated_at: when the version was bumped
+    '''
+    version: int
+    updated_at: datetime
+
+
+CATALOG_CHANNEL = 'catalog_changed'
+
+INITIAL_VERSION = CatalogVersion(version=0,
+                                 updated_at=datetime.fromtimestamp(
+                                     0, tz=timezone.utc))
+
+__VERSION: Optional[CatalogVersion] = None
+__VERSION_LOCK = threading.Lock()
+__LISTENERS: List[Callable[[CatalogVersion], None]] = []
+
+
+def on_catalog_change(callback: Callable[[CatalogVersion], None]) -> None:
+    '''Register `callback` to run with each new catalog version'''
+    __LISTENERS.append(callback)
+
+
+def read_catalog_version(database: Database) -> CatalogVersion:
+    '''Read the catalog version stored in the database'''
+    rows = database.query(
+        'SELECT version, updated_at FROM catalogversion WHERE id=1').as_dict()
+
+    if not rows:
+        return INITIAL_VERSION
+
+    return CatalogVersion(version=rows[0]['version'],
+                          updated_at=rows[0]['updated_at'])
+
+
+def bump_catalog_version(conn: Connection,
+                         entities: Sequence[str]) -> CatalogVersion:
+    '''Increase the stored version, inside the caller transaction
+
+    Other processes are notified of the `entities` types changed when the
+    transaction commits. Call `set_catalog_version` with the result once
+    the transaction is committed.
+    '''
+    sql = '''INSERT INTO catalogversion (id, version, updated_at)
+        VALUES (1, 1, now())
+        ON CONFLICT (id) DO UPDATE
+        SET version=catalogversion.version + 1, updated_at=now()
+        RETURNING version, updated_at'''
+
+    row = conn.query(sql).as_dict()[0]
+
+    payload = json.dumps({'version': row['version'],
+                          'entities': list(entities)})
+    conn.query('SELECT pg_notify(:channel, :payload)',
+               channel=CATALOG_CHANNEL, payload=payload)
+
+    return CatalogVersion(version=row['version'],
+                          updated_at=row['updated_at'])
+
+
+def _store_version(version: CatalogVersion, notify: bool) -> None:
+    '''Keep `version` if newer than the known one'''
+    global __VERSION  # pylint: disable=global-statement,invalid-name
+
+    with __VERSION_LOCK:
+        if __VERSION is not None and __VERSION.version >= version.version:
+            return
+
+        __VERSION = version
+
+    if notify:
+        logger.info(f'Catalog version changed to `{version.version}`')
+        for callback in __LISTENERS:
+            callback(version)
+
+
+def set_catalog_version(version: CatalogVersion) -> None:
+    '''Record a newer catalog version and notify the listeners'''
+    _store_version(version, notify=True)
+
+
+def get_catalog_version(database: Optional[Database] = None
+                        ) -> CatalogVersion:
+    '''Return the catalog version known by the process'''
+    version = __VERSION
+    if version is None:
+        _store_version(read_catalog_version(database or get_db()),
+                       notify=False)
+        version = __VERSION or INITIAL_VERSION
+
+    return version
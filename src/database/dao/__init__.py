@@ -3,3 +3,7 @@ from .features import *  # noqa
 from .items import *  # noqa
 from .names import *  # noqa
 from .themes import *  # noqa
+from .theme_registry import *  # noqa
+from .characters import *  # noqa
+from .capacity import *  # noqa
+from .async_dao import *  # noqa
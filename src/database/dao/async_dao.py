@@ -0,0 +1,157 @@
+'''Asyncio versions of the DAOs, backed by asyncpg
+
+They build the same queries of the blocking DAOs. Random selections run
+the single statement ORDER BY random() form, the multi-query sampling
+strategies are left to the blocking DAOs. Theme names are resolved by the
+theme registry, loaded on the executor before any spec is built.
+'''
+import asyncio
+from typing import Any, AsyncIterator, Optional, List, Dict
+
+from src.database.async_database import fetch, stream
+from src.database.dao.dao_utils import (SelectionSpec, ListingSetup,
+                                        ListingPage, build_selection_sql,
+                                        build_listing_sql, to_page)
+from src.database.dao.features import (RandFeatSelectionSetup,
+                                       FeatureListingSetup,
+                                       feature_selection_spec,
+                                       feature_listing_spec)
+from src.database.dao.items import (RandItemSelectionSetup,
+                                    item_selection_spec, item_listing_spec)
+from src.database.dao.names import (RandNameSelectionSetup,
+                                    NameListingSetup,
+                                    name_selection_spec, name_listing_spec)
+from src.database.dao.themes import theme_listing_spec
+from src.database.dao.theme_registry import (get_theme_registry,
+                                             theme_registry_loaded)
+
+
+async def ensure_theme_registry() -> None:
+    '''Load the theme registry on the executor, if not loaded yet
+
+    Its first load is a blocking query, which must not run on the loop.
+    '''
+    if not theme_registry_loaded():
+        await asyncio.get_event_loop().run_in_executor(None,
+                                                       get_theme_registry)
+
+
+async def select_random_async(spec: SelectionSpec) -> List[Dict]:
+    '''Run the random selection described by `spec`'''
+    return await fetch(build_selection_sql(spec), **spec.params)
+
+
+async def list_page_async(spec: SelectionSpec,
+                          setup: ListingSetup) -> ListingPage:
+    '''Run the listing described by `spec`'''
+    rows = await fetch(build_listing_sql(spec), **spec.params)
+
+    return to_page(rows, setup)
+
+
+class AsyncFeatureDAO:
+    '''Class to manipulate features in database, asynchronously'''
+
+    async def list_all(self) -> Any:
+        '''Return a list with all features'''
+        return await fetch('SELECT * FROM feature')
+
+    async def list_page(self, setup: FeatureListingSetup) -> ListingPage:
+        '''Return a page of features, filtered and ordered by id'''
+        await ensure_theme_registry()
+
+        return await list_page_async(feature_listing_spec(setup), setup)
+
+    def iter_rows(self, setup: FeatureListingSetup,
+                  chunk_size: int) -> AsyncIterator[List[Dict]]:
+        '''Stream every feature of the listing, `chunk_size` rows at a time'''
+        spec = feature_listing_spec(setup)
+
+        return stream(build_listing_sql(spec), chunk_size, **spec.params)
+
+    async def get_random_features(self, setup: RandFeatSelectionSetup
+                                  ) -> List[Dict]:
+        '''Get n random features as filtered (is_good and theme)'''
+        await ensure_theme_registry()
+
+        return await select_random_async(feature_selection_spec(setup))
+
+
+class AsyncItemDAO:
+    '''Class to manipulate items in database, asynchronously'''
+
+    async def list_all(self) -> Any:
+        '''Return a list with all items'''
+        return await fetch('SELECT * FROM item')
+
+    async def list_page(self, setup: ListingSetup) -> ListingPage:
+        '''Return a page of items, filtered and ordered by id'''
+        await ensure_theme_registry()
+
+        return await list_page_async(item_listing_spec(setup), setup)
+
+    def iter_rows(self, setup: ListingSetup,
+                  chunk_size: int) -> AsyncIterator[List[Dict]]:
+        '''Stream every item of the listing, `chunk_size` rows at a time'''
+        spec = item_listing_spec(setup)
+
+        return stream(build_listing_sql(spec), chunk_size, **spec.params)
+
+    async def get_random_items(self, setup: RandItemSelectionSetup
+                               ) -> List[Dict]:
+        '''Get random items, optinally filtered by a theme names'''
+        await ensure_theme_registry()
+
+        return await select_random_async(item_selection_spec(setup))
+
+
+class AsyncNameDAO:
+    '''Class to manipulate names in database, asynchronously'''
+
+    async def list_all(self) -> Any:
+        '''Return a list with all names'''
+        return await fetch('SELECT * FROM name')
+
+    async def list_page(self, setup: NameListingSetup) -> ListingPage:
+        '''Return a page of names, filtered and ordered by id'''
+        await ensure_theme_registry()
+
+        return await list_page_async(name_listing_spec(setup), setup)
+
+    def iter_rows(self, setup: NameListingSetup,
+                  chunk_size: int) -> AsyncIterator[List[Dict]]:
+        '''Stream every name of the listing, `chunk_size` rows at a time'''
+        spec = name_listing_spec(setup)
+
+        return stream(build_listing_sql(spec), chunk_size, **spec.params)
+
+    async def get_random_name(self, setup: RandNameSelectionSetup
+                              ) -> Optional[Dict]:
+        '''Get random names, optionally filtered by themes'''
+        await ensure_theme_registry()
+
+        ret = await select_random_async(name_selection_spec(setup))
+
+        if len(ret) == 0:
+            return None
+
+        return ret[0]
+
+
+class AsyncThemeDAO:
+    '''Class to manipulate themes in database, asynchronously'''
+
+    async def list_all(self) -> Any:
+        '''Return a list with all themes'''
+        return await fetch('SELECT * FROM theme')
+
+    async def list_page(self, setup: ListingSetup) -> ListingPage:
+        '''Return a page of themes, filtered and ordered by id'''
+        return await list_page_async(theme_listing_spec(setup), setup)
+
+    def iter_rows(self, setup: ListingSetup,
+                  chunk_size: int) -> AsyncIterator[List[Dict]]:
+        '''Stream every theme of the listing, `chunk_size` rows at a time'''
+        spec = theme_listing_spec(setup)
+
+        return stream(build_listing_sql(spec), chunk_size, **spec.params)
@@ -0,0 +1,132 @@
+'''DAO for the number of candidates of each theme combination
+
+Capacities are counted with the same semi-joins as the random selections,
+so they tell exactly how many rows a selection can find. They are cached
+per theme combination until the catalog version changes, empty ones
+included, so infeasible generations are rejected without any query.
+'''
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from src.caching import CacheStats, LRUCache
+from src.config import settings
+from src.database.catalog_version import CatalogVersion, on_catalog_change
+from src.database.database_utils import get_db, PooledDatabase
+from src.database.dao.dao_utils import link_condition
+from src.database.dao.features import (RandFeatSelectionSetup,
+                                       feature_selection_spec)
+from src.database.dao.items import RandItemSelectionSetup, item_selection_spec
+from src.database.dao.names import RandNameSelectionSetup, name_selection_spec
+from src.database.dao.statements import run_statement
+from src.database.dao.theme_registry import get_theme_registry
+
+
+@dataclass(frozen=True)
+class Capacity:
+    '''Candidates available for a theme combination
+
+    Attributes:
+        themes: theme names, None for every theme
+        names: candidate names by gender
+        positive_features: candidate positive features
+        negative_features: candidate negative features
+        items: candidate items
+    '''
+    themes: Optional[Tuple[str, ...]]
+    names: Dict[str, int]
+    positive_features: int
+    negative_features: int
+    items: int
+
+    def names_of(self, gender: str) -> int:
+        '''Candidate names of `gender`, 'any' counts every gender'''
+        if gender == 'any':
+            return sum(self.names.values())
+
+        return self.names.get(gender, 0)
+
+
+CAPACITY_CACHE = LRUCache(settings.CAPACITY_CACHE_SIZE)
+
+
+def get_capacity_stats() -> CacheStats:
+    '''Return the usage of the capacity cache'''
+    return CAPACITY_CACHE.stats()
+
+
+def clear_capacities(_version: Optional[CatalogVersion] = None) -> None:
+    '''Forget cached capacities, e.g. after importing rows'''
+    CAPACITY_CACHE.clear()
+
+
+on_catalog_change(clear_capacities)
+
+
+def build_capacity_sql(themes: Optional[Tuple[str, ...]]) -> str:
+    '''Build the count of candidates of every part, by gender or kind'''
+    name_spec = name_selection_spec(RandNameSelectionSetup(
+        gender='any', filter_themes=themes))
+    feature_spec = feature_selection_spec(RandFeatSelectionSetup(
+        n_features=0, is_good=True, filter_themes=themes))
+    item_spec = item_selection_spec(RandItemSelectionSetup(
+        n_items=0, filter_themes=themes))
+    # Features of both kinds are counted, grouped by kind
+    feature_spec.candidate_filters.clear()
+
+    return f'''
+        SELECT 'name' AS part, n.gender AS bucket, count(*) AS total
+        FROM name n WHERE {link_condition(name_spec)}
+        GROUP BY n.gender
+        UNION ALL
+        SELECT 'feature', CAST(f.is_good AS varchar), count(*)
+        FROM feature f WHERE {link_condition(feature_spec)}
+        GROUP BY f.is_good
+        UNION ALL
+        SELECT 'item', NULL, count(*)
+        FROM item i WHERE {link_condition(item_spec)}
+    '''
+
+
+class CapacityDAO:
+    '''Class to count candidates in database'''
+
+    def __init__(self):
+        self.__db: PooledDatabase = get_db()
+
+    def get_capacity(self, themes: Optional[Tuple[str, ...]]) -> Capacity:
+        '''Return the candidates available for `themes`, any if None
+
+        Raises UnknownTheme, before any query, if a theme is not registered.
+        '''
+        themes = tuple(sorted(set(themes))) if themes else None
+        theme_ids = get_theme_registry().resolve(themes or ())
+
+        key = tuple(sorted(theme_ids))
+        cached: Optional[Capacity] = CAPACITY_CACHE.get(key)
+        if cached is not None:
+            return cached
+
+        # Every part is filtered by the same `themes` parameter
+        params = {'themes': theme_ids} if themes else {}
+        rows = run_statement(
+            self.__db, ('capacity', bool(themes), settings.SELECTION_SOURCE),
+            lambda: build_capacity_sql(themes), **params)
+
+        names: Dict[str, int] = {}
+        features = {'true': 0, 'false': 0}
+        items = 0
+        for row in rows:
+            if row['part'] == 'name':
+                names[row['bucket']] = row['total']
+            elif row['part'] == 'feature':
+                features[row['bucket']] = row['total']
+            else:
+                items = row['total']
+
+        capacity = Capacity(themes=themes, names=names,
+                            positive_features=features['true'],
+                            negative_features=features['false'],
+                            items=items)
+        CAPACITY_CACHE.set(key, capacity)
+
+        return capacity
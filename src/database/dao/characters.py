@@ -0,0 +1,146 @@
+'''DAO for whole characters, selected in a single statement'''
+
+from typing import Any, Callable, Optional, Tuple, Dict, List
+from dataclasses import dataclass
+
+from src.config import settings
+from src.database.database_utils import get_db, PooledDatabase
+from src.database.dao.dao_utils import SelectionSpec, build_selection_sql
+from src.database.dao.statements import run_statement
+from src.database.dao.features import (RandFeatSelectionSetup,
+                                       feature_selection_spec)
+from src.database.dao.items import RandItemSelectionSetup, item_selection_spec
+from src.database.dao.names import RandNameSelectionSetup, name_selection_spec
+
+
+@dataclass
+class RandCharacterSelectionSetup:
+    '''Class to setup the selection of every part of a character
+
+    Attributes:
+        gender: 'masculine', 'feminine', 'neutral' or 'any'
+        n_positive_features: number of positive features to get
+        n_negative_features: number of negative features to get
+        n_items: number of items to get
+        filter_themes: optional list of theme names
+    '''
+    gender: str
+    n_positive_features: int
+    n_negative_features: int
+    n_items: int
+    filter_themes: Optional[Tuple[str, ...]] = None
+
+
+@dataclass
+class CandidatePool:
+    '''Rows each character part can be drawn from, for one filter
+
+    Attributes:
+        names: candidate names
+        positive_features: candidate positive features
+        negative_features: candidate negative features
+        items: candidate items
+    '''
+    names: List[Dict]
+    positive_features: List[Dict]
+    negative_features: List[Dict]
+    items: List[Dict]
+
+
+def character_selection_specs(setup: RandCharacterSelectionSetup
+                              ) -> Dict[str, SelectionSpec]:
+    '''Describe the selection of each character part, keyed by role'''
+    themes = setup.filter_themes
+
+    return {
+        'name': name_selection_spec(
+            RandNameSelectionSetup(gender=setup.gender,
+                                   filter_themes=themes),
+            prefix='name_'),
+        'positive_features': feature_selection_spec(
+            RandFeatSelectionSetup(n_features=setup.n_positive_features,
+                                   is_good=True,
+                                   filter_themes=themes),
+            prefix='pos_'),
+        'negative_features': feature_selection_spec(
+            RandFeatSelectionSetup(n_features=setup.n_negative_features,
+                                   is_good=False,
+                                   filter_themes=themes),
+            prefix='neg_'),
+        'items': item_selection_spec(
+            RandItemSelectionSetup(n_items=setup.n_items,
+                                   filter_themes=themes),
+            prefix='item_')
+    }
+
+
+def build_character_sql(specs: Dict[str, SelectionSpec],
+                        **selection: Any) -> str:
+    '''Join every selection into one statement, rows tagged by role
+
+    `selection` is passed to `build_selection_sql` for every part.
+    '''
+    ctes = ',\n'.join(
+        f'pick_{role} AS ({build_selection_sql(spec, **selection)})'
+        for role, spec in specs.items())
+
+    unions = '\nUNION ALL\n'.join(
+        f"SELECT '{role}' AS role, row_to_json(p.*) AS data "
+        f'FROM pick_{role} p'
+        for role in specs)
+
+    return f'WITH {ctes}\n{unions}'
+
+
+class CharacterDAO:
+    '''Class to select characters in database'''
+
+    def __init__(self):
+        self.__db: PooledDatabase = get_db()
+
+    def get_random_character(self, setup: RandCharacterSelectionSetup
+                             ) -> Dict[str, List[Dict]]:
+        '''Get the rows of every character part in one round trip
+
+        Returns a dict mapping each role (`name`, `positive_features`,
+        `negative_features` and `items`) to the selected rows.
+        '''
+        specs = character_selection_specs(setup)
+
+        return self.__query_parts('character', specs,
+                                  lambda: build_character_sql(specs))
+
+    def get_candidate_pool(self, filter_themes: Optional[Tuple[str, ...]],
+                           gender: str) -> CandidatePool:
+        '''Get every candidate row of each part in one round trip'''
+        specs = character_selection_specs(RandCharacterSelectionSetup(
+            gender=gender,
+            n_positive_features=0,
+            n_negative_features=0,
+            n_items=0,
+            filter_themes=filter_themes))
+
+        parts = self.__query_parts(
+            'candidate_pool', specs,
+            lambda: build_character_sql(specs, order_by='1', limit='ALL'))
+
+        return CandidatePool(names=parts['name'],
+                             positive_features=parts['positive_features'],
+                             negative_features=parts['negative_features'],
+                             items=parts['items'])
+
+    def __query_parts(self, kind: str, specs: Dict[str, SelectionSpec],
+                      build: Callable[[], str]) -> Dict[str, List[Dict]]:
+        '''Run a character statement, grouping rows by role'''
+        params: Dict = {}
+        for spec in specs.values():
+            params.update(spec.params)
+
+        key = (kind, tuple(sorted(params)), settings.SELECTION_SOURCE)
+        rows = run_statement(self.__db, key, build, **params)
+
+        ret: Dict[str, List[Dict]] = {role: [] for role in specs}
+        for row in rows:
+            ret[row['role']].append(row['data'])
+
+        return ret
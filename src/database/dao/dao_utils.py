@@ -1,6 +1,194 @@
 '''Module for avoid code repetition'''
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
+from src.config import settings
+from src.database.candidate_view import CANDIDATE_VIEW
+from src.database.dao.theme_registry import get_theme_registry
 
-SQL_THEME_FILTER_CONDITION = '''AND t.id IN (
-                SELECT id FROM theme WHERE name IN :filter_themes
+
+@dataclass
+class SelectionSpec:
+    '''Pieces of a random selection over one entity table
+
+    Attributes:
+        table: entity table name
+        alias: alias used for the entity table
+        link_table: table linking the entity to themes
+        link_column: column of `link_table` holding the entity id
+        limit_param: name of the parameter holding the number of rows
+        conditions: extra SQL conditions, each one starting with AND
+        params: values for every parameter used in the selection
+        themes_param: parameter holding the filter theme ids, if any
+        candidate_filters: candidate view columns filtered by a parameter,
+            mirroring `conditions`
+    '''
+    table: str
+    alias: str
+    link_table: str
+    link_column: str
+    limit_param: str
+    conditions: List[str] = field(default_factory=list)
+    params: Dict[str, Any] = field(default_factory=dict)
+    themes_param: Optional[str] = None
+    candidate_filters: Dict[str, str] = field(default_factory=dict)
+
+    def filter_themes(self, themes: Optional[Tuple[str, ...]],
+                      param: str) -> None:
+        '''Restrict the selection to entities linked to any of `themes`
+
+        Raises UnknownTheme, before any query, if a theme is not registered.
+        '''
+        if themes:
+            self.themes_param = param
+            self.params[param] = get_theme_registry().resolve(themes)
+
+
+def theme_ids_condition(spec: SelectionSpec, column: str) -> str:
+    '''Return the condition keeping `column` among the filter theme ids'''
+    if not spec.themes_param:
+        return ''
+
+    return f'AND {column} = ANY(:{spec.themes_param})'
+
+
+def candidate_condition(spec: SelectionSpec) -> str:
+    '''Return the semi-join keeping candidates found in the candidate view'''
+    filters = ''.join(f' AND c.{column} = :{param}'
+                      for column, param in spec.candidate_filters.items())
+
+    return f'''{spec.alias}.id IN (
+                SELECT c.entity_id FROM {CANDIDATE_VIEW} c
+                WHERE c.entity_type = '{spec.table}'{filters}
+                {theme_ids_condition(spec, 'c.theme_id')}
             )'''
+
+
+def link_condition(spec: SelectionSpec) -> str:
+    '''Return the semi-join keeping entities linked to the filter themes
+
+    Each entity is kept once however many themes it has. With
+    SELECTION_SOURCE set to 'view', candidates come from the candidate view.
+    '''
+    if settings.SELECTION_SOURCE == 'view':
+        return candidate_condition(spec)
+
+    theme_condition = theme_ids_condition(spec, 'l.id_theme')
+
+    return f'''EXISTS (
+                SELECT 1 FROM {spec.link_table} l
+                WHERE l.{spec.link_column}={spec.alias}.id
+                {theme_condition}
+            )'''
+
+
+def build_selection_sql(spec: SelectionSpec,
+                        sample: str = '',
+                        conditions: Sequence[str] = (),
+                        order_by: str = 'random()',
+                        limit: Optional[str] = None,
+                        columns: Optional[str] = None) -> str:
+    '''Build the random selection query described by `spec`
+
+    Parameters
+    ----------
+    spec: SelectionSpec
+        selection description
+    sample: str
+        optional TABLESAMPLE clause for the entity table
+    conditions: Sequence[str]
+        conditions added to the ones of `spec`
+    order_by: str
+        ordering of candidate rows
+    limit: Optional[str]
+        LIMIT expression, the spec limit parameter by default
+    columns: Optional[str]
+        selected columns, every entity column by default
+    '''
+    where = '\n            '.join(list(spec.conditions) + list(conditions))
+    if limit is None:
+        limit = f':{spec.limit_param}'
+    if columns is None:
+        columns = f'{spec.alias}.*'
+
+    return f'''
+            SELECT {columns} FROM {spec.table} {spec.alias} {sample}
+            WHERE {link_condition(spec)}
+            {where}
+            ORDER BY {order_by}
+            LIMIT {limit}
+        '''
+
+
+@dataclass
+class ListingSetup:
+    '''Class to setup a listing, paginated by id when limit is set
+
+    Attributes:
+        limit: maximum number of rows, None lists every row
+        after: cursor, only rows with greater ids are listed
+        filter_themes: optional list of theme names
+    '''
+    limit: Optional[int] = None
+    after: Optional[int] = None
+    filter_themes: Optional[Tuple[str, ...]] = None
+
+
+@dataclass
+class ListingPage:
+    '''A page of listed rows
+
+    Attributes:
+        rows: listed rows, ordered by id
+        next_cursor: `after` value for the next page, None on the last one
+    '''
+    rows: List[Dict]
+    next_cursor: Optional[int] = None
+
+
+def listing_spec(table: str, alias: str, setup: ListingSetup,
+                 link_table: str = '', link_column: str = '') -> SelectionSpec:
+    '''Describe a keyset paginated listing of an entity table'''
+    spec = SelectionSpec(table=table, alias=alias,
+                         link_table=link_table, link_column=link_column,
+                         limit_param='limit')
+
+    spec.filter_themes(setup.filter_themes, 'themes')
+
+    if setup.after is not None:
+        spec.conditions.append(f'AND {alias}.id > :after')
+        spec.params['after'] = setup.after
+
+    if setup.limit is not None:
+        # One more row tells whether there is a next page
+        spec.params['limit'] = setup.limit + 1
+
+    return spec
+
+
+def build_listing_sql(spec: SelectionSpec) -> str:
+    '''Build the listing query described by `spec`'''
+    link = link_condition(spec) if spec.themes_param else 'TRUE'
+    where = '\n            '.join(spec.conditions)
+
+    limit = ''
+    if spec.limit_param in spec.params:
+        limit = f'LIMIT :{spec.limit_param}'
+
+    return f'''
+            SELECT {spec.alias}.* FROM {spec.table} {spec.alias}
+            WHERE {link}
+            {where}
+            ORDER BY {spec.alias}.id
+            {limit}
+        '''
+
+
+def to_page(rows: List[Dict], setup: ListingSetup) -> ListingPage:
+    '''Split the extra row fetched by a listing into the next cursor'''
+    if setup.limit is None or len(rows) <= setup.limit:
+        return ListingPage(rows=rows)
+
+    rows = rows[:setup.limit]
+
+    return ListingPage(rows=rows, next_cursor=rows[-1]['id'])
@@ -7,3 +7,7 @@ class NegativeSelecionTentative(Exception):
 
 class InvalidGender(Exception):
     '''Gender selected for random selection not available'''
+
+
+class UnknownTheme(Exception):
+    '''Theme filtered by is not registered'''
@@ -1,12 +1,15 @@
 '''DAO for features'''
 
-from typing import Any, Optional, List, Dict, Tuple
+from typing import Any, Iterator, Optional, List, Dict, Tuple
 from dataclasses import dataclass
 
-from records import Database
-
-from src.database.database_utils import get_db
+from src.database.database_utils import get_db, PooledDatabase
 from src.database.dao.exceptions import NegativeSelecionTentative
+from src.database.dao.dao_utils import (SelectionSpec, ListingSetup,
+                                        ListingPage, listing_spec,
+                                        build_listing_sql, to_page)
+from src.database.dao.statements import run_statement, statement_key
+from src.database.dao.sampling import select_random
 
 
 @dataclass
@@ -23,11 +26,60 @@ class RandFeatSelectionSetup:
     filter_themes: Optional[Tuple[str, ...]] = None
 
 
+def feature_selection_spec(setup: RandFeatSelectionSetup,
+                           prefix: str = '') -> SelectionSpec:
+    '''Validate setup and describe the features selection
+
+    `prefix` is prepended to every parameter name, so many selections can
+    share a single statement.
+    '''
+    if setup.n_features < 0:
+        raise NegativeSelecionTentative()
+
+    spec = SelectionSpec(table='feature', alias='f',
+                         link_table='linkfeaturetheme',
+                         link_column='id_feature',
+                         limit_param=f'{prefix}n_features')
+
+    spec.conditions.append(f'AND f.is_good=:{prefix}is_good')
+    spec.params[f'{prefix}is_good'] = setup.is_good
+    spec.candidate_filters['is_good'] = f'{prefix}is_good'
+    spec.params[f'{prefix}n_features'] = setup.n_features
+
+    spec.filter_themes(setup.filter_themes, f'{prefix}themes')
+
+    return spec
+
+
+@dataclass
+class FeatureListingSetup(ListingSetup):
+    '''Class to setup features listing
+
+    Attributes:
+        is_good: optionally list only positive or negative features
+    '''
+    is_good: Optional[bool] = None
+
+
+def feature_listing_spec(setup: FeatureListingSetup) -> SelectionSpec:
+    '''Describe the features listing'''
+    spec = listing_spec('feature', 'f', setup,
+                        link_table='linkfeaturetheme',
+                        link_column='id_feature')
+
+    if setup.is_good is not None:
+        spec.conditions.append('AND f.is_good=:is_good')
+        spec.params['is_good'] = setup.is_good
+        spec.candidate_filters['is_good'] = 'is_good'
+
+    return spec
+
+
 class FeatureDAO:
     '''Class to manipulate features in database'''
 
     def __init__(self):
-        self.__db: Database = get_db()
+        self.__db: PooledDatabase = get_db()
 
     def list_all(self) -> Any:
         '''Return a list with all features'''
@@ -35,34 +87,28 @@ class FeatureDAO:
 
         return self.__db.query(sql).as_dict()
 
+    def list_page(self, setup: FeatureListingSetup) -> ListingPage:
+        '''Return a page of features, filtered and ordered by id'''
+        spec = feature_listing_spec(setup)
+
+        rows = run_statement(self.__db, statement_key('listing', spec),
+                             lambda: build_listing_sql(spec), **spec.params)
+
+        return to_page(rows, setup)
+
+    def iter_rows(self, setup: FeatureListingSetup,
+                  chunk_size: int) -> Iterator[List[Dict]]:
+        '''Stream every feature of the listing, `chunk_size` rows at a time'''
+        spec = feature_listing_spec(setup)
+
+        return self.__db.stream(build_listing_sql(spec), chunk_size,
+                                **spec.params)
+
     def get_random_features(self, setup: RandFeatSelectionSetup
                             ) -> List[Dict]:
         '''Get n random features as filtered (is_good and theme)'''
+        spec = feature_selection_spec(setup)
 
-        # Data validation
-        if setup.n_features < 0:
-            raise NegativeSelecionTentative()
-
-        filter_theme_sql_condition = ''
-        if setup.filter_themes:
-            filter_theme_sql_condition = '''AND t.id IN (
-                SELECT id FROM theme WHERE name IN :theme_names
-            )'''
-
-        sql = f'''
-            SELECT f.* FROM feature f, linkfeaturetheme lft, theme t
-            WHERE f.id=lft.id_feature AND t.id=lft.id_theme
-            AND is_good=:is_good
-            {filter_theme_sql_condition}
-            ORDER BY random()
-            LIMIT :n_features
-        '''
-
-        result = self.__db.query(sql,
-                                 is_good=setup.is_good,
-                                 n_features=setup.n_features,
-                                 theme_names=setup.filter_themes)
-
-        ret: List[Dict] = result.as_dict()
+        ret: List[Dict] = select_random(self.__db, spec)
 
         return ret
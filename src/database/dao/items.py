@@ -1,13 +1,15 @@
 '''DAO for items'''
 
-from typing import Any, Tuple, Optional, Dict, List
+from typing import Any, Iterator, Tuple, Optional, Dict, List
 from dataclasses import dataclass
 
-from records import Database
-
-from src.database.database_utils import get_db
+from src.database.database_utils import get_db, PooledDatabase
 from src.database.dao.exceptions import NegativeSelecionTentative
-from src.database.dao.dao_utils import SQL_THEME_FILTER_CONDITION
+from src.database.dao.dao_utils import (SelectionSpec, ListingSetup,
+                                        ListingPage, listing_spec,
+                                        build_listing_sql, to_page)
+from src.database.dao.statements import run_statement, statement_key
+from src.database.dao.sampling import select_random
 
 
 @dataclass
@@ -22,11 +24,36 @@ class RandItemSelectionSetup:
     filter_themes: Optional[Tuple[str, ...]] = None
 
 
+def item_selection_spec(setup: RandItemSelectionSetup,
+                        prefix: str = '') -> SelectionSpec:
+    '''Validate setup and describe the items selection'''
+    if setup.n_items < 0:
+        raise NegativeSelecionTentative()
+
+    spec = SelectionSpec(table='item', alias='i',
+                         link_table='linkitemtheme',
+                         link_column='id_item',
+                         limit_param=f'{prefix}n_items')
+
+    spec.params[f'{prefix}n_items'] = setup.n_items
+
+    spec.filter_themes(setup.filter_themes, f'{prefix}themes')
+
+    return spec
+
+
+def item_listing_spec(setup: ListingSetup) -> SelectionSpec:
+    '''Describe the items listing'''
+    return listing_spec('item', 'i', setup,
+                        link_table='linkitemtheme',
+                        link_column='id_item')
+
+
 class ItemDAO:
     '''Class to manipulate items in database'''
 
     def __init__(self):
-        self.__db: Database = get_db()
+        self.__db: PooledDatabase = get_db()
 
     def list_all(self) -> Any:
         '''Return a list with all items'''
@@ -34,28 +61,27 @@ class ItemDAO:
 
         return self.__db.query(sql).as_dict()
 
-    def get_random_items(self, setup: RandItemSelectionSetup) -> List[Dict]:
-        '''Get random items, optinally filtered by a theme names'''
+    def list_page(self, setup: ListingSetup) -> ListingPage:
+        '''Return a page of items, filtered and ordered by id'''
+        spec = item_listing_spec(setup)
 
-        # Data validation
-        if setup.n_items < 0:
-            raise NegativeSelecionTentative()
+        rows = run_statement(self.__db, statement_key('listing', spec),
+                             lambda: build_listing_sql(spec), **spec.params)
 
-        filter_theme_sql_condition = ''
-        if setup.filter_themes:
-            filter_theme_sql_condition = SQL_THEME_FILTER_CONDITION
+        return to_page(rows, setup)
 
-        sql = f'''
-            SELECT i.* FROM item i, linkitemtheme lit, theme t
-            WHERE i.id=lit.id_item AND t.id=lit.id_theme
-            {filter_theme_sql_condition}
-            ORDER BY random()
-            LIMIT :n_items
-        '''
+    def iter_rows(self, setup: ListingSetup,
+                  chunk_size: int) -> Iterator[List[Dict]]:
+        '''Stream every item of the listing, `chunk_size` rows at a time'''
+        spec = item_listing_spec(setup)
 
-        result = self.__db.query(sql, n_items=setup.n_items,
-                                 filter_themes=setup.filter_themes)
+        return self.__db.stream(build_listing_sql(spec), chunk_size,
+                                **spec.params)
+
+    def get_random_items(self, setup: RandItemSelectionSetup) -> List[Dict]:
+        '''Get random items, optinally filtered by a theme names'''
+        spec = item_selection_spec(setup)
 
-        ret: List[Dict] = result.as_dict()
+        ret: List[Dict] = select_random(self.__db, spec)
 
         return ret
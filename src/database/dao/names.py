@@ -1,13 +1,15 @@
 '''DAO for names'''
 
-from typing import Any, Optional, Tuple, List, Dict
+from typing import Any, Iterator, Optional, Tuple, List, Dict
 from dataclasses import dataclass
 
-from records import Database
-
-from src.database.database_utils import get_db
+from src.database.database_utils import get_db, PooledDatabase
 from src.database.dao.exceptions import InvalidGender
-from src.database.dao.dao_utils import SQL_THEME_FILTER_CONDITION
+from src.database.dao.dao_utils import (SelectionSpec, ListingSetup,
+                                        ListingPage, listing_spec,
+                                        build_listing_sql, to_page)
+from src.database.dao.statements import run_statement, statement_key
+from src.database.dao.sampling import select_random
 from src.config import settings
 
 
@@ -23,11 +25,62 @@ class RandNameSelectionSetup:
     filter_themes: Optional[Tuple[str, ...]] = None
 
 
+def name_selection_spec(setup: RandNameSelectionSetup,
+                        prefix: str = '') -> SelectionSpec:
+    '''Validate setup and describe the selection of a single name'''
+    if setup.gender not in \
+            settings.CHARACTER_GENDER_POSSIBILITIES + ['any']:
+        raise InvalidGender(setup.gender)
+
+    spec = SelectionSpec(table='name', alias='n',
+                         link_table='linknametheme',
+                         link_column='id_name',
+                         limit_param=f'{prefix}n_names')
+
+    spec.params[f'{prefix}n_names'] = 1
+
+    spec.filter_themes(setup.filter_themes, f'{prefix}themes')
+
+    if setup.gender != 'any':
+        spec.conditions.append(f'AND n.gender=:{prefix}gender')
+        spec.params[f'{prefix}gender'] = setup.gender
+        spec.candidate_filters['gender'] = f'{prefix}gender'
+
+    return spec
+
+
+@dataclass
+class NameListingSetup(ListingSetup):
+    '''Class to setup names listing
+
+    Attributes:
+        gender: optionally list only names of this gender
+    '''
+    gender: Optional[str] = None
+
+
+def name_listing_spec(setup: NameListingSetup) -> SelectionSpec:
+    '''Describe the names listing'''
+    spec = listing_spec('name', 'n', setup,
+                        link_table='linknametheme',
+                        link_column='id_name')
+
+    if setup.gender is not None:
+        if setup.gender not in settings.CHARACTER_GENDER_POSSIBILITIES:
+            raise InvalidGender(setup.gender)
+
+        spec.conditions.append('AND n.gender=:gender')
+        spec.params['gender'] = setup.gender
+        spec.candidate_filters['gender'] = 'gender'
+
+    return spec
+
+
 class NameDAO:
     '''Class to manipulate names in database'''
 
     def __init__(self):
-        self.__db: Database = get_db()
+        self.__db: PooledDatabase = get_db()
 
     def list_all(self) -> Any:
         '''Return a list with all names'''
@@ -35,36 +88,29 @@ class NameDAO:
 
         return self.__db.query(sql).as_dict()
 
-    def get_random_name(self, setup: RandNameSelectionSetup
-                        ) -> Optional[Dict]:
-        '''Get random names, optionally filtered by themes'''
+    def list_page(self, setup: NameListingSetup) -> ListingPage:
+        '''Return a page of names, filtered and ordered by id'''
+        spec = name_listing_spec(setup)
 
-        # Data validation
-        if setup.gender not in \
-                settings.CHARACTER_GENDER_POSSIBILITIES + ['any']:
-            raise InvalidGender(setup.gender)
+        rows = run_statement(self.__db, statement_key('listing', spec),
+                             lambda: build_listing_sql(spec), **spec.params)
 
-        filter_theme_sql_condition = ''
-        if setup.filter_themes:
-            filter_theme_sql_condition = SQL_THEME_FILTER_CONDITION
+        return to_page(rows, setup)
 
-        filter_gender_sql_condition = ''
-        if setup.gender != 'any':
-            filter_gender_sql_condition = 'AND n.gender=:gender'
+    def iter_rows(self, setup: NameListingSetup,
+                  chunk_size: int) -> Iterator[List[Dict]]:
+        '''Stream every name of the listing, `chunk_size` rows at a time'''
+        spec = name_listing_spec(setup)
 
-        sql = f'''
-            SELECT n.* FROM name n, linknametheme lnt, theme t
-            WHERE n.id=lnt.id_name AND t.id=lnt.id_theme
-            {filter_theme_sql_condition}
-            {filter_gender_sql_condition}
-            ORDER BY random()
-            LIMIT 1
-        '''
+        return self.__db.stream(build_listing_sql(spec), chunk_size,
+                                **spec.params)
 
-        result = self.__db.query(sql, gender=setup.gender,
-                                 filter_themes=setup.filter_themes)
+    def get_random_name(self, setup: RandNameSelectionSetup
+                        ) -> Optional[Dict]:
+        '''Get random names, optionally filtered by themes'''
+        spec = name_selection_spec(setup)
 
-        ret: List[Dict] = result.as_dict()
+        ret: List[Dict] = select_random(self.__db, spec)
 
         if len(ret) == 0:
             return None
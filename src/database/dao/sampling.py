@@ -0,0 +1,288 @@
+'''Random selection strategies for the DAOs
+
+`ORDER BY random()` sorts every candidate to keep a few of them, which gets
+slower as the catalog grows. For big tables the selection instead:
+
+- `tablesample`: reads a Bernoulli sample of the entity table sized to hold
+  the requested rows and orders only the sample;
+- `id_range`: probes the primary key index at random ids between the
+  smallest and the biggest one, keeping the first candidate at or after
+  each probe (entities after gaps of ids are drawn a bit more often).
+
+Both may find fewer rows than requested, so they are retried with bigger
+samples and fall back to `ORDER BY random()`, which is always exact.
+
+`candidate_ids` is exact too: the ids of every candidate of a filter set
+are read once and kept in a bounded cache, then each selection samples
+ids in Python and fetches only the chosen rows by primary key.
+
+Strategies apply to the selections of one part. The character statement
+of the 'single_query' generation mode and the async DAOs still select with
+`ORDER BY random()`.
+'''
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from src.caching import CacheStats, LRUCache
+from src.config import settings
+from src.database.catalog_version import CatalogVersion, on_catalog_change
+from src.database.dao.dao_utils import SelectionSpec, build_selection_sql
+from src.database.dao.statements import run_statement, statement_key
+from src.database.database_utils import PooledDatabase
+
+
+ORDER_BY_RANDOM = 'order_by_random'
+TABLESAMPLE = 'tablesample'
+ID_RANGE = 'id_range'
+CANDIDATE_IDS = 'candidate_ids'
+
+STRATEGIES = (ORDER_BY_RANDOM, TABLESAMPLE, ID_RANGE, CANDIDATE_IDS)
+
+
+@dataclass
+class TableStats:
+    '''Cardinality statistics of an entity table
+
+    Attributes:
+        estimated_rows: planner estimate of the number of rows
+        min_id: smallest id in the table
+        max_id: biggest id in the table
+    '''
+    estimated_rows: int
+    min_id: int
+    max_id: int
+
+    @property
+    def id_span(self) -> int:
+        '''Number of ids between the smallest and the biggest one'''
+        return self.max_id - self.min_id + 1
+
+
+__STATS: Dict[str, Tuple[float, TableStats]] = {}
+__STATS_LOCK = threading.Lock()
+
+
+def table_stats(database: PooledDatabase, table: str) -> TableStats:
+    '''Return statistics of `table`, cached for SAMPLING_STATS_TTL'''
+    now = time.monotonic()
+    with __STATS_LOCK:
+        cached = __STATS.get(table)
+
+    if cached and now - cached[0] < settings.SAMPLING_STATS_TTL:
+        return cached[1]
+
+    sql = f'''
+        SELECT GREATEST(c.reltuples, 0)::bigint AS estimated_rows,
+            (SELECT min(id) FROM {table}) AS min_id,
+            (SELECT max(id) FROM {table}) AS max_id
+        FROM pg_class c WHERE c.oid=CAST(:table AS regclass)
+    '''
+    row = database.query(sql, table=table).as_dict()[0]
+
+    min_id = row['min_id'] or 0
+    max_id = row['max_id'] or 0
+    estimated_rows = row['estimated_rows']
+    if not estimated_rows and max_id:
+        # Never analyzed, the id span is the best guess
+        estimated_rows = max_id - min_id + 1
+
+    stats = TableStats(estimated_rows=estimated_rows,
+                       min_id=min_id, max_id=max_id)
+    with __STATS_LOCK:
+        __STATS[table] = (now, stats)
+
+    return stats
+
+
+def clear_table_stats(_version: Optional[CatalogVersion] = None) -> None:
+    '''Forget cached statistics, e.g. after importing rows'''
+    with __STATS_LOCK:
+        __STATS.clear()
+
+
+on_catalog_change(clear_table_stats)
+
+
+def choose_strategy(spec: SelectionSpec, stats: TableStats) -> str:
+    '''Pick the selection strategy for `spec`
+
+    SAMPLING_STRATEGY forces a strategy when it is not 'auto'.
+    '''
+    if settings.SAMPLING_STRATEGY in STRATEGIES:
+        return settings.SAMPLING_STRATEGY
+
+    if stats.estimated_rows <= settings.SAMPLING_SMALL_TABLE_ROWS:
+        return ORDER_BY_RANDOM
+
+    if spec.conditions or spec.themes_param:
+        # Filters discard most of a sample, cached candidates skip them,
+        # and so does probing
+        if settings.CANDIDATE_ID_CACHE_SIZE:
+            return CANDIDATE_IDS
+        return ID_RANGE
+
+    return TABLESAMPLE
+
+
+def _tablesample(database: PooledDatabase, spec: SelectionSpec,
+                 stats: TableStats, n_rows: int) -> List[Dict]:
+    '''Select rows ordering only a Bernoulli sample of the table'''
+    key = statement_key(TABLESAMPLE, spec, 'percent')
+
+    def build() -> str:
+        return build_selection_sql(spec,
+                                   sample='TABLESAMPLE BERNOULLI (:percent)')
+
+    percent = 100.0
+    for attempt in range(settings.SAMPLING_MAX_RETRIES):
+        wanted = n_rows * settings.SAMPLING_OVERSAMPLE * 2 ** attempt
+        percent = min(100.0, 100.0 * wanted / max(stats.estimated_rows, 1))
+
+        rows = run_statement(database, key, build, percent=percent,
+                             **spec.params)
+        if len(rows) >= n_rows or percent >= 100.0:
+            return rows
+
+    return []
+
+
+def _id_range(database: PooledDatabase, spec: SelectionSpec,
+              stats: TableStats, n_rows: int) -> List[Dict]:
+    '''Select rows probing the primary key at random ids'''
+    key = statement_key(ID_RANGE, spec, 'probes', 'min_id', 'id_span')
+
+    def build() -> str:
+        # Probes are drawn apart, random() in the lateral filter would be
+        # evaluated again for every row scanned
+        probe = f'AND {spec.alias}.id >= p.probe'
+        picked = build_selection_sql(spec, conditions=[probe],
+                                     order_by=f'{spec.alias}.id', limit='1')
+        return f'''
+            SELECT * FROM (
+                SELECT DISTINCT ON (picked.id) picked.*
+                FROM (
+                    SELECT :min_id + floor(random() * :id_span)::int
+                        AS probe
+                    FROM generate_series(1, :probes)
+                ) p,
+                LATERAL ({picked}) picked
+            ) candidates
+            ORDER BY random()
+            LIMIT :{spec.limit_param}
+        '''
+
+    for attempt in range(settings.SAMPLING_MAX_RETRIES):
+        probes = n_rows * settings.SAMPLING_OVERSAMPLE * 2 ** attempt
+        rows = run_statement(database, key, build, probes=probes,
+                             min_id=stats.min_id, id_span=stats.id_span,
+                             **spec.params)
+        if len(rows) >= n_rows:
+            return rows
+
+    return []
+
+
+CANDIDATE_ID_CACHE = LRUCache(settings.CANDIDATE_ID_CACHE_SIZE,
+                              ttl=settings.CANDIDATE_ID_CACHE_TTL)
+
+
+def candidate_key(spec: SelectionSpec) -> Tuple:
+    '''Key of the candidates of `spec`, whatever the number of rows
+
+    Every DAO filter is bound through a parameter, so the table and the
+    filter values tell the candidates apart.
+    '''
+    params = tuple(sorted(
+        (name, tuple(sorted(value)) if isinstance(value, list) else value)
+        for name, value in spec.params.items()
+        if name != spec.limit_param))
+
+    return (spec.table, params)
+
+
+def candidate_ids(database: PooledDatabase,
+                  spec: SelectionSpec) -> Tuple[int, ...]:
+    '''Return the ids of every candidate of `spec`, cached by filters'''
+    key = candidate_key(spec)
+    ids: Optional[Tuple[int, ...]] = CANDIDATE_ID_CACHE.get(key)
+
+    if ids is None:
+        params = {name: value for name, value in spec.params.items()
+                  if name != spec.limit_param}
+        rows = run_statement(
+            database, statement_key(CANDIDATE_IDS, spec),
+            lambda: build_selection_sql(spec, order_by=f'{spec.alias}.id',
+                                        limit='ALL',
+                                        columns=f'{spec.alias}.id'),
+            **params)
+
+        ids = tuple(row['id'] for row in rows)
+        CANDIDATE_ID_CACHE.set(key, ids)
+
+    return ids
+
+
+def get_candidate_id_stats() -> CacheStats:
+    '''Return the usage of the candidate id cache'''
+    return CANDIDATE_ID_CACHE.stats()
+
+
+def clear_candidate_ids(_version: Optional[CatalogVersion] = None) -> None:
+    '''Forget cached candidate ids, e.g. after importing rows'''
+    CANDIDATE_ID_CACHE.clear()
+
+
+on_catalog_change(clear_candidate_ids)
+
+
+def _candidate_ids(database: PooledDatabase, spec: SelectionSpec,
+                   n_rows: int) -> Optional[List[Dict]]:
+    '''Select rows sampling cached candidate ids
+
+    Returns None if a chosen row is gone, as when the cached ids are
+    older than the catalog.
+    '''
+    ids = candidate_ids(database, spec)
+    chosen = random.sample(ids, min(n_rows, len(ids)))
+    if not chosen:
+        return []
+
+    rows = run_statement(
+        database, ('by_ids', spec.table),
+        lambda: f'SELECT * FROM {spec.table} WHERE id = ANY(:ids)',
+        ids=chosen)
+    by_id = {row['id']: row for row in rows}
+    if len(by_id) < len(chosen):  # pragma: no cover
+        return None
+
+    return [by_id[entity_id] for entity_id in chosen]
+
+
+def select_random(database: PooledDatabase,
+                  spec: SelectionSpec) -> List[Dict]:
+    '''Run the random selection described by `spec`'''
+    n_rows = spec.params[spec.limit_param]
+
+    if n_rows > 0:
+        stats = table_stats(database, spec.table)
+        strategy = choose_strategy(spec, stats)
+
+        if strategy == CANDIDATE_IDS:
+            sampled = _candidate_ids(database, spec, n_rows)
+            if sampled is not None:
+                return sampled
+
+        rows: List[Dict] = []
+        if strategy == TABLESAMPLE:
+            rows = _tablesample(database, spec, stats, n_rows)
+        elif strategy == ID_RANGE:
+            rows = _id_range(database, spec, stats, n_rows)
+
+        if len(rows) >= n_rows:
+            return rows
+
+    return run_statement(database, statement_key(ORDER_BY_RANDOM, spec),
+                         lambda: build_selection_sql(spec), **spec.params)
@@ -0,0 +1,131 @@
+'''Cache of the statements sent by the DAOs
+
+DAO statements only differ by the optional filters present, so their SQL
+is built once per (kind, filters) key and kept with its parsed `text()`
+construct. With PREPARED_STATEMENTS set, each pooled connection also
+prepares the statement server side on first use, and later calls only send
+an EXECUTE, skipping parsing and planning on Postgres.
+
+Prepared statements are named after a hash of their SQL, so a statement
+built again after being evicted or cleared reuses the one already prepared
+on each connection, which hold at most one per distinct SQL.
+'''
+import hashlib
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple, cast
+
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.sql.elements import TextClause
+
+from src.caching import CacheStats, LRUCache
+from src.config import settings
+from src.database.async_database import number_params
+from src.database.dao.dao_utils import SelectionSpec
+from src.database.database_utils import PooledDatabase
+
+# connection.info key of the statements prepared on a connection
+PREPARED_KEY = 'prepared_statements'
+
+
+@dataclass
+class CachedStatement:
+    '''A DAO statement, parsed once
+
+    Attributes:
+        name: server side prepared statement name, derived from `sql`
+        sql: statement SQL, with `:name` parameters
+        clause: parsed statement
+        prepare_sql: PREPARE of the statement, with `$n` parameters
+        execute_clause: parsed EXECUTE of the prepared statement
+    '''
+    name: str
+    sql: str
+    clause: TextClause
+    prepare_sql: str
+    execute_clause: TextClause
+
+    def prepare(self, conn: Any) -> bool:
+        '''Prepare the statement on `conn` once, False if it failed'''
+        prepared: Dict[str, bool] = conn.info.setdefault(PREPARED_KEY, {})
+
+        if self.name not in prepared:
+            try:
+                with conn.begin():
+                    conn.execute(self.prepare_sql)
+                prepared[self.name] = True
+
+            except DBAPIError as exp:  # pragma: no cover
+                logger.warning(f'Could not prepare {self.name}: {exp}')
+                prepared[self.name] = False
+
+        return prepared[self.name]
+
+
+class StatementCache:
+    '''Bounded cache of DAO statements by key'''
+
+    def __init__(self, maxsize: int) -> None:
+        self.__cache = LRUCache(maxsize)
+
+    def get(self, key: Hashable, build: Callable[[], str]) -> CachedStatement:
+        '''Return the statement of `key`, built by `build` on a miss'''
+        statement: Optional[CachedStatement] = self.__cache.get(key)
+        if statement is not None:
+            return statement
+
+        sql = build()
+        name = 'dao_' + hashlib.sha256(sql.encode('utf-8')).hexdigest()[:32]
+        positional, names = number_params(sql)
+        arguments = ', '.join(f':{param}' for param in names)
+
+        statement = CachedStatement(
+            name=name, sql=sql, clause=text(sql),
+            prepare_sql=f'PREPARE {name} AS {positional}',
+            execute_clause=text(f'EXECUTE {name}({arguments})'
+                                if arguments else f'EXECUTE {name}'))
+        self.__cache.set(key, statement)
+
+        return statement
+
+    def clear(self) -> None:
+        '''Drop every statement, prepared ones are reused when rebuilt'''
+        self.__cache.clear()
+
+    def stats(self) -> CacheStats:
+        '''Return the cache usage'''
+        return self.__cache.stats()
+
+
+STATEMENTS = StatementCache(settings.STATEMENT_CACHE_SIZE)
+
+
+def statement_key(kind: str, spec: SelectionSpec,
+                  *params: str) -> Tuple:
+    '''Key of a statement built from `spec`
+
+    The parameters in use tell which optional filters are present,
+    `params` names the ones added on top of the spec ones.
+    '''
+    return (kind, spec.table, tuple(sorted(spec.params)), params,
+            settings.SELECTION_SOURCE)
+
+
+def run_statement(database: PooledDatabase, key: Hashable,
+                  build: Callable[[], str], **params: Any) -> List[Dict]:
+    '''Run the statement of `key`, built by `build` when not cached'''
+    if not settings.STATEMENT_CACHE_SIZE:
+        return cast(List[Dict], database.query(build(), **params).as_dict())
+
+    statement = STATEMENTS.get(key, build)
+
+    with database.connect() as conn:
+        clause = statement.clause
+        if settings.PREPARED_STATEMENTS and statement.prepare(conn):
+            clause = statement.execute_clause
+
+        result = conn.execute(clause, **params)
+        keys = result.keys()
+
+        return [dict(zip(keys, row)) for row in result.fetchall()]
@@ -0,0 +1,78 @@
+'''Process-local registry of theme names and ids
+
+Themes rarely change, so their ids are loaded once and kept until the
+catalog version changes. Filtered queries bind theme ids directly, and
+unknown theme names are rejected without touching the database.
+'''
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+from records import Database
+
+from src.database.catalog_version import CatalogVersion, on_catalog_change
+from src.database.dao.exceptions import UnknownTheme
+from src.database.database_utils import get_db
+
+
+@dataclass(frozen=True)
+class ThemeRegistry:
+    '''Every registered theme, both ways
+
+    Attributes:
+        ids: theme id by name
+        names: theme name by id
+    '''
+    ids: Dict[str, int]
+    names: Dict[int, str]
+
+    def resolve(self, themes: Iterable[str]) -> List[int]:
+        '''Return the ids of `themes`, raising UnknownTheme for any unknown'''
+        themes = list(themes)
+        unknown = [theme for theme in themes if theme not in self.ids]
+        if unknown:
+            raise UnknownTheme(', '.join(unknown))
+
+        return [self.ids[theme] for theme in themes]
+
+
+def load_theme_registry(database: Database) -> ThemeRegistry:
+    '''Read every theme from the database'''
+    rows = database.query('SELECT id, name FROM theme').as_dict()
+
+    return ThemeRegistry(ids={row['name']: row['id'] for row in rows},
+                         names={row['id']: row['name'] for row in rows})
+
+
+__REGISTRY: Optional[ThemeRegistry] = None
+__REGISTRY_LOCK = threading.Lock()
+
+
+def get_theme_registry(database: Optional[Database] = None) -> ThemeRegistry:
+    '''Return the theme registry, loading it on first use'''
+    global __REGISTRY  # pylint: disable=global-statement,invalid-name
+
+    registry = __REGISTRY
+    if registry is None:
+        with __REGISTRY_LOCK:
+            if __REGISTRY is None:
+                __REGISTRY = load_theme_registry(database or get_db())
+            registry = __REGISTRY
+
+    return registry
+
+
+def theme_registry_loaded() -> bool:
+    '''Was the registry loaded since the last catalog change?'''
+    return __REGISTRY is not None
+
+
+def clear_theme_registry(_version: Optional[CatalogVersion] = None) -> None:
+    '''Drop the registry, the next use loads the themes again'''
+    global __REGISTRY  # pylint: disable=global-statement,invalid-name
+
+    with __REGISTRY_LOCK:
+        __REGISTRY = None
+
+
+on_catalog_change(clear_theme_registry)
@@ -1,20 +1,45 @@
 '''DAO for themes'''
 
-from typing import Any
+from typing import Any, Dict, Iterator, List
 
-from records import Database
+from src.database.database_utils import get_db, PooledDatabase
+from src.database.dao.dao_utils import (SelectionSpec, ListingSetup,
+                                        ListingPage, listing_spec,
+                                        build_listing_sql, to_page)
+from src.database.dao.statements import run_statement, statement_key
 
-from src.database.database_utils import get_db
+
+def theme_listing_spec(setup: ListingSetup) -> SelectionSpec:
+    '''Describe the themes listing, themes are not filtered by theme'''
+    return listing_spec('theme', 't', ListingSetup(limit=setup.limit,
+                                                   after=setup.after))
 
 
 class ThemeDAO:
     '''Class to manipulate themes in database'''
 
     def __init__(self):
-        self.__db: Database = get_db()
+        self.__db: PooledDatabase = get_db()
 
     def list_all(self) -> Any:
         '''Return a list with all themes'''
         sql = 'SELECT * FROM theme'
 
         return self.__db.query(sql).as_dict()
+
+    def list_page(self, setup: ListingSetup) -> ListingPage:
+        '''Return a page of themes, ordered by id'''
+        spec = theme_listing_spec(setup)
+
+        rows = run_statement(self.__db, statement_key('listing', spec),
+                             lambda: build_listing_sql(spec), **spec.params)
+
+        return to_page(rows, setup)
+
+    def iter_rows(self, setup: ListingSetup,
+                  chunk_size: int) -> Iterator[List[Dict]]:
+        '''Stream every theme of the listing, `chunk_size` rows at a time'''
+        spec = theme_listing_spec(setup)
+
+        return self.__db.stream(build_listing_sql(spec), chunk_size,
+                                **spec.params)
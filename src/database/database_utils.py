@@ -1,31 +1,170 @@
 '''Centralize utility functions to access database'''
 import json
 import sys
-from typing import List
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set
 
-from records import Database
+from records import Database, Connection
 from loguru import logger
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import ResourceClosedError
 from sqlalchemy.orm import sessionmaker
 
 from src.config import settings
+from src.database.candidate_view import CREATE_CANDIDATE_VIEW
+from src.database.json_stream import JsonStream
 from src.database.models import Base
 from src.database.models import (NameInput, ItemInput,
                                  LoadedDbItemsJson, FeatureInput)
 
 
-def get_db() -> Database:
-    '''Return database object for queries'''
+@dataclass
+class PoolStats:
+    '''Snapshot of the shared connection pool usage
+
+    Attributes:
+        size: configured number of persistent connections
+        checked_out: connections currently in use
+        overflow: connections opened beyond `size`
+        checkouts: total connections handed out so far
+        wait_total: seconds spent waiting for connections, summed
+        wait_max: longest single wait for a connection, in seconds
+    '''
+    size: int
+    checked_out: int
+    overflow: int
+    checkouts: int
+    wait_total: float
+    wait_max: float
+
+    @property
+    def wait_avg(self) -> float:
+        '''Mean seconds spent waiting per checkout'''
+        if not self.checkouts:
+            return 0.0
+
+        return self.wait_total / self.checkouts
+
+
+class PooledDatabase(Database):
+    '''Records database that measures the time spent on pool checkouts'''
+
+    def __init__(self, db_url: str, **kwargs) -> None:
+        super().__init__(db_url, **kwargs)
+        self.__lock = threading.Lock()
+        self.__checkouts = 0
+        self.__wait_total = 0.0
+        self.__wait_max = 0.0
+
+    def connect(self) -> Any:
+        '''Check a SQLAlchemy connection out of the pool, timing the wait'''
+        start = time.perf_counter()
+        connection = self._engine.connect()
+        waited = time.perf_counter() - start
+
+        with self.__lock:
+            self.__checkouts += 1
+            self.__wait_total += waited
+            self.__wait_max = max(self.__wait_max, waited)
+
+        return connection
+
+    def get_connection(self) -> Connection:
+        '''Check a records connection out of the pool'''
+        if not self.open:  # pragma: no cover
+            raise ResourceClosedError('Database closed.')
+
+        return Connection(self.connect())
+
+    def stream(self, sql: str, chunk_size: int,
+               **params: Any) -> Iterator[List[Dict]]:
+        '''Run a query on a server-side cursor, yielding chunks of rows
+
+        Only `chunk_size` rows are held in memory at a time. The connection
+        is kept until the iterator is exhausted or closed.
+        '''
+        with self.connect() as conn:
+            result = conn.execution_options(stream_results=True).execute(
+                text(sql), **params)
+            keys = result.keys()
+
+            while True:
+                rows = result.fetchmany(chunk_size)
+                if not rows:
+                    break
+
+                yield [dict(zip(keys, row)) for row in rows]
+
+    def pool_stats(self) -> PoolStats:
+        '''Return the current pool usage'''
+        pool = self._engine.pool
+        with self.__lock:
+            return PoolStats(size=pool.size(),
+                             checked_out=pool.checkedout(),
+                             overflow=max(pool.overflow(), 0),
+                             checkouts=self.__checkouts,
+                             wait_total=self.__wait_total,
+                             wait_max=self.__wait_max)
+
+
+__DATABASE: Optional[PooledDatabase] = None
+__DATABASE_LOCK = threading.Lock()
+
+
+def get_db_url() -> Optional[str]:
+    '''Return the url of the database in use'''
     if settings.TESTING:
         if settings.TEST_DB_URL is None:  # pragma: no cover
             logger.critical('Test database not set')
             sys.exit(1)
 
-        database = Database(settings.TEST_DB_URL)
-    else:  # pragma: no cover
-        database = Database(settings.DB_URL)
+        return settings.TEST_DB_URL
 
-    return database
+    return settings.DB_URL  # pragma: no cover
+
+
+def get_db() -> PooledDatabase:
+    '''Return the process-wide database object for queries
+
+    The database, and so its engine and connection pool, is created on the
+    first call and shared by every DAO afterwards.
+    '''
+    global __DATABASE  # pylint: disable=global-statement,invalid-name
+
+    if __DATABASE is None:
+        db_url = get_db_url()
+        if db_url is None:  # pragma: no cover
+            logger.critical('Database url not set')
+            sys.exit(1)
+
+        with __DATABASE_LOCK:
+            if __DATABASE is None:
+                __DATABASE = PooledDatabase(
+                    db_url,
+                    pool_size=settings.DB_POOL_SIZE,
+                    max_overflow=settings.DB_MAX_OVERFLOW,
+                    pool_recycle=settings.DB_POOL_RECYCLE,
+                    pool_pre_ping=settings.DB_POOL_PRE_PING,
+                    pool_timeout=settings.DB_POOL_TIMEOUT)
+
+    return __DATABASE
+
+
+def dispose_db() -> None:
+    '''Close the shared database, the next `get_db` creates a new one'''
+    global __DATABASE  # pylint: disable=global-statement,invalid-name
+
+    with __DATABASE_LOCK:
+        if __DATABASE is not None:
+            __DATABASE.close()
+            __DATABASE = None
+
+
+def get_pool_stats() -> PoolStats:
+    '''Return the usage of the shared connection pool'''
+    return get_db().pool_stats()
 
 
 def init_database(db_url: str) -> None:
@@ -36,107 +175,90 @@ def init_database(db_url: str) -> None:
     session.configure(bind=engine)
     Base.metadata.create_all(engine)
 
+    with engine.begin() as conn:
+        for statement in CREATE_CANDIDATE_VIEW:
+            conn.execute(text(statement))
 
-def __load_items(json_data: dict, theme_names: List[str]) -> List[ItemInput]:
-    '''Load items from json'''
-    items: List[ItemInput] = []
-    if 'items' not in json_data \
-            and not isinstance(json_data['items'], list):  # pragma: no cover
-        return items
-
-    for item in json_data['items']:
-        try:
-            themes = []
-            for theme in item['themes']:
-                if theme not in theme_names:  # pragma: no cover
-                    logger.error(f'Theme not registered: {theme}')
-                    raise KeyError(theme + ' theme')
 
-                themes.append(theme)
+def __check_themes(row: dict, theme_names: Set[str]) -> List[str]:
+    '''Return the themes of a row, that must all be registered'''
+    themes = []
+    for theme in row['themes']:
+        if theme not in theme_names:  # pragma: no cover
+            logger.error(f'Theme not registered: {theme}')
+            raise KeyError(theme + ' theme')
 
-            item_input = ItemInput(
-                name=item['name'],
-                description=item.get('description', ''),
-                themes=themes
-            )
-            items.append(item_input)
+        themes.append(theme)
 
-        except KeyError as exp:  # pragma: no cover
-            logger.error(f'Aborting load of {item}, missing {exp}')
+    return themes
 
-    return items
 
+def __parse_item(item: dict, theme_names: Set[str]) -> ItemInput:
+    '''Build an item input from json'''
+    return ItemInput(
+        name=item['name'],
+        description=item.get('description', ''),
+        themes=__check_themes(item, theme_names)
+    )
 
-def __load_names(json_data: dict, theme_names: List[str]) -> List[NameInput]:
-    '''Load names from json'''
-    names: List[NameInput] = []
-    if 'names' not in json_data \
-            or not isinstance(json_data['names'], list):  # pragma: no cover
-        return names
-
-    for name in json_data['names']:
-        try:
-            themes = []
-            for theme in name['themes']:
-                if theme not in theme_names:  # pragma: no cover
-                    logger.error(f'Theme not registered: {theme}')
-                    raise KeyError(theme + ' theme')
 
-                themes.append(theme)
+def __parse_name(name: dict, theme_names: Set[str]) -> NameInput:
+    '''Build a name input from json'''
+    name_input = NameInput(
+        firstname=name['firstname'],
+        lastname=name['lastname'],
+        gender=name['gender'].lower(),
+        themes=__check_themes(name, theme_names)
+    )
 
-            name_input = NameInput(
-                firstname=name['firstname'],
-                lastname=name['lastname'],
-                gender=name['gender'].lower(),
-                themes=themes
-            )
+    if name_input.gender not in \
+            settings.CHARACTER_GENDER_POSSIBILITIES:  # pragma: no cover
+        raise KeyError('gender not in ' +
+                       str(settings.CHARACTER_GENDER_POSSIBILITIES) +
+                       ':' + name_input.gender)
 
-            if name_input.gender not in \
-                    settings.CHARACTER_GENDER_POSSIBILITIES:  # pragma: no cover
-                raise KeyError('gender not in ' +
-                               str(settings.CHARACTER_GENDER_POSSIBILITIES) +
-                               ':' + name_input.gender)
+    return name_input
 
-            names.append(name_input)
 
-        except KeyError as exp:  # pragma: no cover
-            logger.error(f'Aborting load of {name}, missing {exp}')
+def __parse_feature(feature: dict, theme_names: Set[str]) -> FeatureInput:
+    '''Build a feature input from json'''
+    return FeatureInput(
+        text_masc=feature['text_masc'],
+        text_fem=feature['text_fem'],
+        description=feature['description'],
+        is_good=feature['is_good'],
+        themes=__check_themes(feature, theme_names)
+    )
 
-    return names
 
+ROW_PARSERS: Dict[str, Callable[[dict, Set[str]], Any]] = {
+    'items': __parse_item,
+    'names': __parse_name,
+    'features': __parse_feature,
+}
 
-def __load_features(json_data: dict,
-                    theme_names: List[str]) -> List[FeatureInput]:
-    '''Load names from json'''
-    features: List[FeatureInput] = []
-    if 'features' not in json_data \
-            or not isinstance(json_data['features'], list):  # pragma: no cover
-        return features
 
-    for feature in json_data['features']:
-        try:
-            themes = []
-            for theme in feature['themes']:
-                if theme not in theme_names:  # pragma: no cover
-                    logger.error(f'Theme not registered: {theme}')
-                    raise KeyError(theme + ' theme')
+def __parse_row(entity: str, row: dict, theme_names: Set[str]) -> Any:
+    '''Build the input of a json row, None if it is invalid'''
+    try:
+        return ROW_PARSERS[entity](row, theme_names)
 
-                themes.append(theme)
+    except KeyError as exp:  # pragma: no cover
+        logger.error(f'Aborting load of {row}, missing {exp}')
+        return None
 
-            feat_input = FeatureInput(
-                text_masc=feature['text_masc'],
-                text_fem=feature['text_fem'],
-                description=feature['description'],
-                is_good=feature['is_good'],
-                themes=themes
-            )
 
-            features.append(feat_input)
+def __load_rows(json_data: dict, entity: str,
+                theme_names: Set[str]) -> List[Any]:
+    '''Load the valid rows of an entity from json'''
+    if entity not in json_data \
+            or not isinstance(json_data[entity], list):  # pragma: no cover
+        return []
 
-        except KeyError as exp:  # pragma: no cover
-            logger.error(f'Aborting load of {feature}, missing {exp}')
+    rows = (__parse_row(entity, row, theme_names)
+            for row in json_data[entity])
 
-    return features
+    return [row for row in rows if row is not None]
 
 
 def load_rows_from_json(filename: str) -> LoadedDbItemsJson:
@@ -150,15 +272,17 @@ def load_rows_from_json(filename: str) -> LoadedDbItemsJson:
 
     logger.info(f'Loaded `{len(theme_names)}` theme names')
 
-    items = __load_items(data, theme_names)
+    registered = set(theme_names)
+
+    items = __load_rows(data, 'items', registered)
 
     logger.info(f'Loaded `{len(items)}` items')
 
-    names = __load_names(data, theme_names)
+    names = __load_rows(data, 'names', registered)
 
     logger.info(f'Loaded `{len(names)}` names')
 
-    features = __load_features(data, theme_names)
+    features = __load_rows(data, 'features', registered)
 
     logger.info(f'Loaded `{len(features)}` features')
 
@@ -168,3 +292,62 @@ def load_rows_from_json(filename: str) -> LoadedDbItemsJson:
         names=names,
         features=features
     )
+
+
+@dataclass
+class JsonBatch:
+    '''A batch of catalog rows read from JSON
+
+    Attributes:
+        entity: 'themes', 'items', 'names' or 'features'
+        rows: theme names, or item, name or feature inputs
+    '''
+    entity: str
+    rows: List[Any]
+
+
+def iter_json_batches(filename: str,
+                      batch_size: Optional[int] = None) -> Iterator[JsonBatch]:
+    '''Load database items from JSON, in batches of `batch_size` rows
+
+    The file is parsed incrementally, only one batch of rows is in memory at
+    a time. Themes are yielded whole, in the first batch, so they must come
+    before items, names and features in the file.
+    '''
+    batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+    themes: List[str] = []
+    theme_names: Set[str] = set()
+    entity: Optional[str] = None
+    rows: List[Any] = []
+
+    with open(filename) as file:
+        for key, value in JsonStream(file).items():
+            if key == 'themes':
+                if entity is not None:
+                    raise ValueError('Themes must come before items, names '
+                                     'and features in ' + filename)
+                themes.append(value)
+                theme_names.add(value)
+                continue
+
+            if key not in ROW_PARSERS:  # pragma: no cover
+                continue
+
+            if entity is None:
+                logger.info(f'Loaded `{len(themes)}` theme names')
+                yield JsonBatch(entity='themes', rows=themes)
+
+            if key != entity or len(rows) >= batch_size:
+                if entity is not None and rows:
+                    yield JsonBatch(entity=entity, rows=rows)
+                entity, rows = key, []
+
+            row = __parse_row(key, value, theme_names)
+            if row is not None:
+                rows.append(row)
+
+    if entity is None:  # pragma: no cover
+        yield JsonBatch(entity='themes', rows=themes)
+
+    elif rows:
+        yield JsonBatch(entity=entity, rows=rows)
@@ -0,0 +1,191 @@
+'''Incremental catalog re-import
+
+Every imported name, item and feature stores a hash of its content and
+themes, see `populate.content_hash`. `diff_import` compares a whole catalog
+against the stored hashes and only inserts new entities, updates changed
+ones and deletes the ones gone from the catalog, links included, all in a
+single transaction.
+'''
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from loguru import logger
+from records import Connection, Database
+from sqlalchemy.exc import IntegrityError
+
+from src.config import settings
+from src.database.candidate_view import refresh_candidate_view
+from src.database.catalog_version import (bump_catalog_version,
+                                          set_catalog_version)
+from src.database.models import LoadedDbItemsJson
+from src.database.populate import (BulkEntity, FEATURE_ENTITY, ITEM_ENTITY,
+                                   NAME_ENTITY, bulk_insert, column_params,
+                                   feature_row, insert_links, item_row,
+                                   load_theme_ids, name_row)
+
+
+@dataclass
+class DiffReport:
+    '''Changes made by a diff import to one entity type
+
+    Attributes:
+        entity: entity type
+        inserted: entities new to the catalog
+        updated: entities whose content or themes changed
+        deleted: entities gone from the catalog
+        unchanged: entities left untouched
+        seconds: time spent on the entity type
+    '''
+    entity: str
+    inserted: int = 0
+    updated: int = 0
+    deleted: int = 0
+    unchanged: int = 0
+    seconds: float = 0.0
+
+    @property
+    def changed(self) -> bool:
+        '''Whether the entity type was modified'''
+        return bool(self.inserted or self.updated or self.deleted)
+
+
+def batches(values: Sequence, batch_size: int) -> List[Sequence]:
+    '''Split `values` in slices of `batch_size`'''
+    return [values[begin:begin + batch_size]
+            for begin in range(0, len(values), batch_size)]
+
+
+def diff_themes(conn: Connection, themes: List[str]) -> DiffReport:
+    '''Insert the themes missing from the database
+
+    Themes are never deleted, entities of other catalogs may use them.
+    '''
+    start = time.perf_counter()
+    report = DiffReport(entity='theme')
+
+    stored = set(load_theme_ids(conn))
+    new = sorted(set(themes) - stored)
+
+    if new:
+        conn.query('''INSERT INTO theme (name)
+            SELECT unnest(CAST(:names AS varchar[]))
+            ON CONFLICT (name) DO NOTHING''', names=new)
+
+    report.inserted = len(new)
+    report.unchanged = len(set(themes)) - len(new)
+    report.seconds = time.perf_counter() - start
+
+    return report
+
+
+def diff_entity(conn: Connection, entity: BulkEntity, rows: List[Tuple],
+                themes: List[List[str]], theme_ids: Dict[str, int],
+                batch_size: int) -> DiffReport:
+    '''Apply the differences between `rows` and the stored entities
+
+    `rows` hold the values of `entity.columns`, content hash last.
+    '''
+    start = time.perf_counter()
+    report = DiffReport(entity=entity.table)
+
+    stored = {tuple(row[column] for column in entity.key_columns):
+              (row['id'], row['content_hash'])
+              for row in conn.query(entity.stored_sql()).as_dict()}
+
+    incoming = {entity.key_of(row): (row, row_themes)
+                for row, row_themes in zip(rows, themes)}
+
+    deleted = [entity_id for key, (entity_id, _) in stored.items()
+               if key not in incoming]
+
+    new: List[Tuple[Tuple, List[str]]] = []
+    changed: List[Tuple[int, Tuple, List[str]]] = []
+    for key, (row, row_themes) in incoming.items():
+        if key not in stored:
+            new.append((row, row_themes))
+
+        elif stored[key][1] != row[-1]:
+            changed.append((stored[key][0], row, row_themes))
+
+        else:
+            report.unchanged += 1
+
+    # Deletes first, a changed key may reuse a unique value of a gone row
+    for ids in batches(deleted, batch_size):
+        conn.query(entity.delete_links_sql(), ids=list(ids))
+        conn.query(entity.delete_sql(), ids=list(ids))
+
+    for batch in batches(changed, batch_size):
+        ids = [entity_id for entity_id, _, _ in batch]
+        batch_rows = [row for _, row, _ in batch]
+
+        conn.query(entity.update_sql(), ids=ids,
+                   **column_params(entity, batch_rows))
+        conn.query(entity.delete_links_sql(), ids=ids)
+        insert_links(conn, entity, batch_rows, ids,
+                     [row_themes for _, _, row_themes in batch], theme_ids)
+
+    for batch in batches(new, batch_size):
+        bulk_insert(conn, entity, [row for row, _ in batch],
+                    [row_themes for _, row_themes in batch], theme_ids)
+
+    report.inserted = len(new)
+    report.updated = len(changed)
+    report.deleted = len(deleted)
+    report.seconds = time.perf_counter() - start
+
+    logger.info(f'Diff import of {entity.table}: `{report.inserted}` '
+                f'inserted, `{report.updated}` updated, `{report.deleted}` '
+                f'deleted, `{report.unchanged}` unchanged')
+
+    return report
+
+
+DIFF_ENTITIES: Sequence[Tuple[str, BulkEntity, Callable[..., Tuple]]] = (
+    ('names', NAME_ENTITY, name_row),
+    ('items', ITEM_ENTITY, item_row),
+    ('features', FEATURE_ENTITY, feature_row),
+)
+
+
+def diff_import(data: LoadedDbItemsJson, database: Database,
+                batch_size: Optional[int] = None) -> List[DiffReport]:
+    '''Make the database catalog match `data`, touching only differences
+
+    `data` must be the whole catalog, entities missing from it are deleted.
+    Everything runs in a single transaction, and the catalog version is
+    only bumped if something changed. Returns one report per entity type.
+    '''
+    batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+    version = None
+
+    conn = database.get_connection()
+    transaction = conn.transaction()
+    try:
+        reports = [diff_themes(conn, data.themes)]
+        theme_ids = load_theme_ids(conn)
+
+        for attribute, entity, to_row in DIFF_ENTITIES:
+            inputs = getattr(data, attribute)
+            reports.append(diff_entity(
+                conn, entity, [to_row(value) for value in inputs],
+                [value.themes for value in inputs], theme_ids, batch_size))
+
+        changed = [report.entity for report in reports if report.changed]
+        if changed:
+            version = bump_catalog_version(conn, changed)
+        transaction.commit()
+
+    except IntegrityError as ierror:  # pragma: no cover
+        logger.error(ierror)
+        transaction.rollback()
+        raise
+    finally:
+        conn.close()
+
+    if version is not None:
+        refresh_candidate_view(database)
+        set_catalog_version(version)
+
+    return reports
@@ -0,0 +1,114 @@
+'''Incremental parsing of big JSON catalogs
+
+Catalog files are one object of arrays, as `{"themes": [...], "names":
+[...]}`. `JsonStream` reads them in fixed-size chunks and decodes one array
+member at a time, so memory use does not depend on the file size.
+'''
+import json
+from typing import Any, IO, Iterator, Tuple
+
+WHITESPACE = ' \t\n\r'
+NUMBER_CHARS = '0123456789+-.eE'
+READ_SIZE = 1 << 16
+
+
+class JsonStream:
+    '''Reads the members of the top-level arrays of a JSON object'''
+
+    def __init__(self, file: IO[str], read_size: int = READ_SIZE) -> None:
+        self.__file = file
+        self.__read_size = read_size
+        self.__decoder = json.JSONDecoder()
+        self.__buffer = ''
+        self.__pos = 0
+        self.__eof = False
+
+    def __fill(self) -> bool:
+        '''Read one more chunk, dropping the consumed part of the buffer'''
+        if self.__eof:
+            return False
+
+        chunk = self.__file.read(self.__read_size)
+        if not chunk:
+            self.__eof = True
+            return False
+
+        self.__buffer = self.__buffer[self.__pos:] + chunk
+        self.__pos = 0
+        return True
+
+    def __peek(self) -> str:
+        '''Return the next non blank character, without consuming it'''
+        while True:
+            while self.__pos < len(self.__buffer) \
+                    and self.__buffer[self.__pos] in WHITESPACE:
+                self.__pos += 1
+
+            if self.__pos < len(self.__buffer):
+                return self.__buffer[self.__pos]
+
+            if not self.__fill():
+                raise ValueError('Unexpected end of JSON document')
+
+    def __expect(self, chars: str) -> str:
+        '''Consume the next character, that must be one of `chars`'''
+        char = self.__peek()
+        if char not in chars:
+            raise ValueError(f'Expected one of {chars!r}, found {char!r}')
+
+        self.__pos += 1
+        return char
+
+    def __value(self) -> Any:
+        '''Decode the next complete JSON value'''
+        self.__peek()
+        while True:
+            try:
+                value, end = self.__decoder.raw_decode(self.__buffer,
+                                                       self.__pos)
+            except json.JSONDecodeError:
+                if self.__fill():
+                    continue
+                raise
+
+            # A number cut by the end of the buffer goes on in the next chunk
+            if isinstance(value, (int, float)) \
+                    and not self.__buffer[end:].strip(NUMBER_CHARS) \
+                    and self.__fill():
+                continue
+
+            self.__pos = end
+            return value
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        '''Yield `(key, member)` for each member of each top-level array
+
+        Keys holding something other than an array are skipped.
+        '''
+        self.__expect('{')
+        if self.__peek() == '}':
+            return
+
+        while True:
+            key = self.__value()
+            if not isinstance(key, str):
+                raise ValueError(f'Expected an object key, found {key!r}')
+
+            self.__expect(':')
+            if self.__peek() != '[':
+                self.__value()
+
+            else:
+                self.__pos += 1
+                if self.__peek() == ']':
+                    self.__pos += 1
+
+                else:
+                    while True:
+                        yield key, self.__value()
+
+                        if self.__expect(',]') == ']':
+                            break
+
+            if self.__expect(',}') == '}':
+                return
@@ -4,8 +4,9 @@ from dataclasses import dataclass
 from typing import List, Any
 
 from sqlalchemy import create_engine
-from sqlalchemy import ForeignKey, CheckConstraint, UniqueConstraint
-from sqlalchemy import Column, Integer, String, Boolean
+from sqlalchemy import ForeignKey, CheckConstraint, UniqueConstraint, Index
+from sqlalchemy import text
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, func
 from sqlalchemy.ext.declarative import declarative_base
 
 from src.config import settings
@@ -42,13 +43,15 @@ class Name(Base):  # pragma: no cover
     gender_values = tuple(settings.CHARACTER_GENDER_POSSIBILITIES)
     __table_args__ = (
         CheckConstraint(f'gender IN {gender_values}'),
-        UniqueConstraint('firstname', 'lastname')
+        UniqueConstraint('firstname', 'lastname'),
+        Index('ix_name_gender_id', 'gender', 'id')
     )
 
     id = Column(Integer, primary_key=True)
     firstname = Column(String(20), nullable=False)
     lastname = Column(String(20), nullable=False)
     gender = Column(String(9), nullable=False)
+    content_hash = Column(String(64), nullable=True)
 
     def __init__(self, firstname: str, lastname: str, gender: str) -> None:
         '''Init feature'''
@@ -60,12 +63,18 @@ class Name(Base):  # pragma: no cover
 class Feature(Base):  # pragma: no cover
     '''Object to hold information about characters feature'''
     __tablename__ = 'feature'
+    __table_args__ = (
+        Index('ix_feature_id_good', 'id', postgresql_where=text('is_good')),
+        Index('ix_feature_id_bad', 'id',
+              postgresql_where=text('NOT is_good'))
+    )
 
     id = Column(Integer, primary_key=True)
     text_masc = Column(String(20), nullable=False, unique=True)
     text_fem = Column(String(20), nullable=False, unique=True)
     description = Column(String(200), nullable=True)
     is_good = Column(Boolean, nullable=False)
+    content_hash = Column(String(64), nullable=True)
 
     def __init__(self, text_masc: str, text_fem: str,
                  is_good: bool, description: str) -> None:
@@ -83,6 +92,7 @@ class Item(Base):  # pragma: no cover
     id = Column(Integer, primary_key=True)
     name = Column(String(20), nullable=False, unique=True)
     description = Column(String(200), nullable=False)
+    content_hash = Column(String(64), nullable=True)
 
     def __init__(self, name: str) -> None:
         '''Init item'''
@@ -94,6 +104,7 @@ class LinkItemTheme(Base):  # pragma: no cover
     __tablename__ = 'linkitemtheme'
     __table_args__ = (
         UniqueConstraint('id_item', 'id_theme'),
+        Index('ix_linkitemtheme_theme_item', 'id_theme', 'id_item')
     )
 
     id = Column(Integer, primary_key=True)
@@ -111,6 +122,7 @@ class LinkNameTheme(Base):  # pragma: no cover
     __tablename__ = 'linknametheme'
     __table_args__ = (
         UniqueConstraint('id_name', 'id_theme'),
+        Index('ix_linknametheme_theme_name', 'id_theme', 'id_name')
     )
 
     id = Column(Integer, primary_key=True)
@@ -128,6 +140,7 @@ class LinkFeatureTheme(Base):  # pragma: no cover
     __tablename__ = 'linkfeaturetheme'
     __table_args__ = (
         UniqueConstraint('id_feature', 'id_theme'),
+        Index('ix_linkfeaturetheme_theme_feature', 'id_theme', 'id_feature')
     )
 
     id = Column(Integer, primary_key=True)
@@ -140,6 +153,16 @@ class LinkFeatureTheme(Base):  # pragma: no cover
         self.id_feature = id_feature
 
 
+class CatalogVersion(Base):  # pragma: no cover
+    '''Single row holding the version of the catalog, bumped on populate'''
+    __tablename__ = 'catalogversion'
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), nullable=False,
+                        server_default=func.now())
+
+
 # Dataclasses to orient insertin functions
 
 
@@ -1,12 +1,32 @@
-'''Functions to insert rows into database'''
-from typing import List
+'''Functions to insert rows into database
+
+The `bulk_populate_*` functions import big catalogs: entities are sent in
+batches of multi-row inserts, their ids read back in one query per batch,
+and theme links inserted from an in-memory name to id map, all in one
+transaction per entity type.
+'''
+import hashlib
+import json
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
 
 from loguru import logger
 from sqlalchemy.exc import IntegrityError
-from records import Database
+from records import Connection, Database
+
+from src.config import settings
+from src.database.candidate_view import refresh_candidate_view
+from src.database.dao.theme_registry import get_theme_registry
+from src.database.database_utils import iter_json_batches
 
 from src.database.models import (NameInput, ItemInput,
                                  LoadedDbItemsJson, FeatureInput)
+from src.database.catalog_version import (bump_catalog_version,
+                                          read_catalog_version,
+                                          set_catalog_version)
 
 
 def populate_themes(themes: List[str], database: Database) -> None:
@@ -30,6 +50,7 @@ def populate_themes(themes: List[str], database: Database) -> None:
     try:
         for name in themes:
             conn.query(sql, name=name)
+        version = bump_catalog_version(conn, ['theme'])
         transaction.commit()
 
     except IntegrityError as ierror:  # pragma: no cover
@@ -39,6 +60,8 @@ def populate_themes(themes: List[str], database: Database) -> None:
     finally:
         conn.close()
 
+    set_catalog_version(version)
+
 
 def populate_names(names: List[NameInput], database: Database) -> None:
     '''Populate names
@@ -78,24 +101,25 @@ def populate_names(names: List[NameInput], database: Database) -> None:
 
     sql = '''INSERT INTO linknametheme (id_theme, id_name)
         VALUES (
-            (SELECT id FROM theme t
-                WHERE t.name=:theme_name),
+            :theme_id,
             (SELECT id FROM name n
                 WHERE n.firstname=:fname
                 AND n.lastname=:lname)
             )
         ON CONFLICT DO NOTHING;
     '''
+    registry = get_theme_registry(database)
     conn = database.get_connection()
     transaction = conn.transaction()
     try:
         for name in names:
-            for theme in name.themes:
+            for theme_id in registry.resolve(name.themes):
                 conn.query(sql,
-                           theme_name=theme,
+                           theme_id=theme_id,
                            fname=name.firstname,
                            lname=name.lastname)
 
+        version = bump_catalog_version(conn, ['name'])
         transaction.commit()
 
     except IntegrityError as ierror:  # pragma: no cover
@@ -105,6 +129,10 @@ def populate_names(names: List[NameInput], database: Database) -> None:
     finally:
         conn.close()
 
+    # Caches refilled on the new version must read the refreshed view
+    refresh_candidate_view(database)
+    set_catalog_version(version)
+
 
 def populate_items(items: List[ItemInput], database: Database) -> None:
     '''Populate names
@@ -141,22 +169,23 @@ def populate_items(items: List[ItemInput], database: Database) -> None:
 
     sql = '''INSERT INTO linkitemtheme (id_theme, id_item)
         VALUES (
-            (SELECT id FROM theme t
-                WHERE t.name=:theme_name),
+            :theme_id,
             (SELECT id FROM item i
                 WHERE i.name=:item_name)
             )
         ON CONFLICT DO NOTHING;
     '''
+    registry = get_theme_registry(database)
     conn = database.get_connection()
     transaction = conn.transaction()
     try:
         for item in items:
-            for theme in item.themes:
+            for theme_id in registry.resolve(item.themes):
                 conn.query(sql,
-                           theme_name=theme,
+                           theme_id=theme_id,
                            item_name=item.name)
 
+        version = bump_catalog_version(conn, ['item'])
         transaction.commit()
 
     except IntegrityError as ierror:  # pragma: no cover
@@ -166,6 +195,9 @@ def populate_items(items: List[ItemInput], database: Database) -> None:
     finally:
         conn.close()
 
+    refresh_candidate_view(database)
+    set_catalog_version(version)
+
 
 def populate_features(features: List[FeatureInput], database: Database) -> None:
     '''Populate names
@@ -205,24 +237,299 @@ def populate_features(features: List[FeatureInput], database: Database) -> None:
 
     sql = '''INSERT INTO linkfeaturetheme (id_theme, id_feature)
         VALUES (
-            (SELECT id FROM theme t
-                WHERE t.name=:theme_name),
+            :theme_id,
             (SELECT id FROM feature f
                 WHERE f.text_masc=:tmasc
                 AND f.text_fem=:tfem)
             )
         ON CONFLICT DO NOTHING;
     '''
+    registry = get_theme_registry(database)
     conn = database.get_connection()
     transaction = conn.transaction()
     try:
         for feature in features:
-            for theme in feature.themes:
+            for theme_id in registry.resolve(feature.themes):
                 conn.query(sql,
-                           theme_name=theme,
+                           theme_id=theme_id,
                            tmasc=feature.text_masc,
                            tfem=feature.text_fem)
 
+        version = bump_catalog_version(conn, ['feature'])
+        transaction.commit()
+
+    except IntegrityError as ierror:  # pragma: no cover
+        logger.error(ierror)
+        transaction.rollback()
+        raise
+    finally:
+        conn.close()
+
+    refresh_candidate_view(database)
+    set_catalog_version(version)
+
+
+@dataclass
+class ImportReport:
+    '''Summary of a bulk import of one entity type
+
+    Attributes:
+        entity: imported entity type
+        rows: entities sent, existing ones included
+        links: theme links sent, existing ones included
+        seconds: time spent importing
+    '''
+    entity: str
+    rows: int
+    links: int
+    seconds: float
+
+    @property
+    def rows_per_second(self) -> float:
+        '''Import throughput'''
+        if not self.seconds:
+            return 0.0
+
+        return self.rows / self.seconds
+
+
+@dataclass
+class BulkEntity:
+    '''How to bulk import an entity type
+
+    Attributes:
+        table: entity table
+        link_table: table linking the entity to themes
+        link_column: column of `link_table` holding the entity id
+        columns: inserted columns and their SQL types
+        key_columns: columns identifying an entity, a unique constraint
+        conflict: ON CONFLICT clause of the insert
+        partitioned: can rows be split by key among concurrent imports?
+            Not when columns of the key are unique on their own, as rows
+            with different keys may then conflict
+    '''
+    table: str
+    link_table: str
+    link_column: str
+    columns: Sequence[Tuple[str, str]]
+    key_columns: Sequence[str]
+    conflict: str = 'ON CONFLICT DO NOTHING'
+    partitioned: bool = True
+
+    def insert_sql(self) -> str:
+        '''Insert a batch of entities, given as one array per column'''
+        columns = ', '.join(column for column, _ in self.columns)
+        arrays = ', '.join(f'CAST(:{column} AS {sql_type}[])'
+                           for column, sql_type in self.columns)
+
+        return f'''INSERT INTO {self.table} ({columns})
+            SELECT * FROM unnest({arrays})
+            {self.conflict}'''
+
+    def ids_sql(self) -> str:
+        '''Read the ids of a batch of entities, found by their keys
+
+        Keys after the first one may be null, as `name.lastname`.
+        '''
+        keys = ', '.join(self.key_columns)
+        arrays = ', '.join(f'CAST(:{column} AS {sql_type}[])'
+                           for column, sql_type in self.columns
+                           if column in self.key_columns)
+        selected = ', '.join(f'e.{column}' for column in self.key_columns)
+        first, *others = self.key_columns
+        matches = ' AND '.join(
+            [f'e.{first} = k.{first}']
+            + [f'e.{key} IS NOT DISTINCT FROM k.{key}' for key in others])
+
+        return f'''SELECT e.id, {selected} FROM {self.table} e
+            JOIN unnest({arrays}) AS k({keys}) ON {matches}'''
+
+    def key_of(self, row: Tuple) -> Tuple:
+        '''Return the key columns values of a row'''
+        return tuple(value for (column, _), value in zip(self.columns, row)
+                     if column in self.key_columns)
+
+    def stored_sql(self) -> str:
+        '''Read the id, keys and content hash of every stored entity'''
+        return f'''SELECT id, {', '.join(self.key_columns)}, content_hash
+            FROM {self.table}'''
+
+    def update_sql(self) -> str:
+        '''Update a batch of entities, found by id'''
+        columns = [column for column, _ in self.columns]
+        assignments = ', '.join(f'{column} = k.{column}' for column in columns)
+        arrays = ', '.join(f'CAST(:{column} AS {sql_type}[])'
+                           for column, sql_type in self.columns)
+
+        return f'''UPDATE {self.table} e SET {assignments}
+            FROM unnest(CAST(:ids AS integer[]), {arrays})
+                AS k(id, {', '.join(columns)})
+            WHERE e.id = k.id'''
+
+    def delete_links_sql(self) -> str:
+        '''Delete every theme link of a batch of entities'''
+        return f'''DELETE FROM {self.link_table}
+            WHERE {self.link_column} = ANY(CAST(:ids AS integer[]))'''
+
+    def delete_sql(self) -> str:
+        '''Delete a batch of entities, their links must be gone'''
+        return f'''DELETE FROM {self.table}
+            WHERE id = ANY(CAST(:ids AS integer[]))'''
+
+    def link_sql(self) -> str:
+        '''Insert a batch of theme links'''
+        return f'''INSERT INTO {self.link_table} (id_theme, {self.link_column})
+            SELECT * FROM unnest(CAST(:theme_ids AS integer[]),
+                                 CAST(:entity_ids AS integer[]))
+            ON CONFLICT DO NOTHING'''
+
+
+NAME_ENTITY = BulkEntity(
+    table='name', link_table='linknametheme', link_column='id_name',
+    columns=(('firstname', 'varchar'), ('lastname', 'varchar'),
+             ('gender', 'varchar'), ('content_hash', 'varchar')),
+    key_columns=('firstname', 'lastname'),
+    conflict='ON CONFLICT ON CONSTRAINT name_firstname_lastname_key '
+             'DO NOTHING')
+
+ITEM_ENTITY = BulkEntity(
+    table='item', link_table='linkitemtheme', link_column='id_item',
+    columns=(('name', 'varchar'), ('description', 'varchar'),
+             ('content_hash', 'varchar')),
+    key_columns=('name',),
+    conflict='ON CONFLICT (name) DO NOTHING')
+
+FEATURE_ENTITY = BulkEntity(
+    table='feature', link_table='linkfeaturetheme',
+    link_column='id_feature',
+    columns=(('text_masc', 'varchar'), ('text_fem', 'varchar'),
+             ('description', 'varchar'), ('is_good', 'boolean'),
+             ('content_hash', 'varchar')),
+    key_columns=('text_masc', 'text_fem'),
+    partitioned=False)
+
+
+def load_theme_ids(conn: Connection) -> Dict[str, int]:
+    '''Map every theme name to its id, uncommitted themes of `conn` included'''
+    rows = conn.query('SELECT id, name FROM theme').as_dict()
+
+    return {row['name']: row['id'] for row in rows}
+
+
+def content_hash(values: Sequence[Any], themes: Sequence[str]) -> str:
+    '''Hash the content of an entity, its themes included'''
+    content = json.dumps([list(values), sorted(themes)])
+
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def name_row(name: NameInput) -> Tuple:
+    '''Values of `NAME_ENTITY.columns` for a name'''
+    values = (name.firstname, name.lastname, name.gender)
+
+    return values + (content_hash(values, name.themes),)
+
+
+def item_row(item: ItemInput) -> Tuple:
+    '''Values of `ITEM_ENTITY.columns` for an item'''
+    values = (item.name, item.description)
+
+    return values + (content_hash(values, item.themes),)
+
+
+def feature_row(feature: FeatureInput) -> Tuple:
+    '''Values of `FEATURE_ENTITY.columns` for a feature'''
+    values = (feature.text_masc, feature.text_fem, feature.description,
+              feature.is_good)
+
+    return values + (content_hash(values, feature.themes),)
+
+
+def column_params(entity: BulkEntity, rows: Sequence[Tuple]) -> Dict:
+    '''One array parameter per column of `entity`'''
+    return {column: [row[index] for row in rows]
+            for index, (column, _) in enumerate(entity.columns)}
+
+
+def insert_links(conn: Connection, entity: BulkEntity,
+                 rows: Sequence[Tuple], entity_ids: Sequence[Optional[int]],
+                 themes: Sequence[Sequence[str]],
+                 theme_ids: Dict[str, int]) -> int:
+    '''Insert the theme links of a batch of entities
+
+    Returns the number of links sent.
+    '''
+    link_theme_ids: List[int] = []
+    link_entity_ids: List[int] = []
+    for row, entity_id, row_themes in zip(rows, entity_ids, themes):
+        if entity_id is None:  # pragma: no cover
+            logger.warning(f'Skipping links of {row}, conflicting entity')
+            continue
+
+        for theme in row_themes:
+            if theme not in theme_ids:  # pragma: no cover
+                logger.warning(f'Skipping link of {row}, no theme {theme}')
+                continue
+
+            link_theme_ids.append(theme_ids[theme])
+            link_entity_ids.append(entity_id)
+
+    if link_theme_ids:
+        conn.query(entity.link_sql(), theme_ids=link_theme_ids,
+                   entity_ids=link_entity_ids)
+
+    return len(link_theme_ids)
+
+
+def bulk_insert(conn: Connection, entity: BulkEntity,
+                rows: Sequence[Tuple], themes: Sequence[Sequence[str]],
+                theme_ids: Dict[str, int]) -> int:
+    '''Insert a batch of entities and their theme links
+
+    `rows` hold the values of `entity.columns`, `themes` the theme names of
+    each row. Returns the number of links sent.
+    '''
+    if not rows:
+        return 0
+
+    params = column_params(entity, rows)
+
+    conn.query(entity.insert_sql(), **params)
+
+    key_params = {column: params[column] for column in entity.key_columns}
+    ids = {tuple(row[column] for column in entity.key_columns): row['id']
+           for row in conn.query(entity.ids_sql(), **key_params).as_dict()}
+
+    entity_ids = [ids.get(entity.key_of(row)) for row in rows]
+
+    return insert_links(conn, entity, rows, entity_ids, themes, theme_ids)
+
+
+def bulk_populate(entity: BulkEntity, rows: Sequence[Tuple],
+                  themes: Sequence[Sequence[str]], database: Database,
+                  batch_size: Optional[int] = None,
+                  refresh: bool = True) -> ImportReport:
+    '''Import entities in batches, in a single transaction
+
+    Theme ids come from the theme registry, links to unknown themes are
+    skipped. The candidate view is refreshed afterwards, then the new
+    catalog version is published. Callers that import many times and refresh
+    once pass `refresh` False, and publish the version after refreshing.
+    '''
+    batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+    start = time.perf_counter()
+    links = 0
+
+    theme_ids = get_theme_registry(database).ids
+    conn = database.get_connection()
+    transaction = conn.transaction()
+    try:
+        for begin in range(0, len(rows), batch_size):
+            end = begin + batch_size
+            links += bulk_insert(conn, entity, rows[begin:end],
+                                 themes[begin:end], theme_ids)
+
+        version = bump_catalog_version(conn, [entity.table])
         transaction.commit()
 
     except IntegrityError as ierror:  # pragma: no cover
@@ -232,11 +539,212 @@ def populate_features(features: List[FeatureInput], database: Database) -> None:
     finally:
         conn.close()
 
+    if refresh:
+        refresh_candidate_view(database)
+        set_catalog_version(version)
+
+    report = ImportReport(entity=entity.table, rows=len(rows), links=links,
+                          seconds=time.perf_counter() - start)
+    logger.info(f'Imported `{report.rows}` {report.entity} rows, '
+                f'`{report.rows_per_second:.0f}` rows/s')
+
+    return report
+
+
+def bulk_populate_names(names: List[NameInput], database: Database,
+                        batch_size: Optional[int] = None,
+                        refresh: bool = True) -> ImportReport:
+    '''Bulk import names, see `bulk_populate`'''
+    rows = [name_row(name) for name in names]
+
+    return bulk_populate(NAME_ENTITY, rows, [name.themes for name in names],
+                         database, batch_size, refresh)
+
+
+def bulk_populate_items(items: List[ItemInput], database: Database,
+                        batch_size: Optional[int] = None,
+                        refresh: bool = True) -> ImportReport:
+    '''Bulk import items, see `bulk_populate`'''
+    rows = [item_row(item) for item in items]
+
+    return bulk_populate(ITEM_ENTITY, rows, [item.themes for item in items],
+                         database, batch_size, refresh)
+
+
+def bulk_populate_features(features: List[FeatureInput], database: Database,
+                           batch_size: Optional[int] = None,
+                           refresh: bool = True) -> ImportReport:
+    '''Bulk import features, see `bulk_populate`'''
+    rows = [feature_row(feature) for feature in features]
+
+    return bulk_populate(FEATURE_ENTITY, rows,
+                         [feature.themes for feature in features],
+                         database, batch_size, refresh)
+
+
+BULK_POPULATE: Dict[str, Callable[..., ImportReport]] = {
+    'names': bulk_populate_names,
+    'items': bulk_populate_items,
+    'features': bulk_populate_features,
+}
+
+
+def populate_from_json(filename: str, database: Database,
+                       batch_size: Optional[int] = None) -> List[ImportReport]:
+    '''Import a JSON catalog of any size, see `iter_json_batches`
+
+    Each batch is imported in its own transaction, the candidate view is
+    refreshed once at the end. Returns one report per entity type, summing
+    its batches.
+    '''
+    reports: Dict[str, ImportReport] = {}
+
+    for batch in iter_json_batches(filename, batch_size):
+        if batch.entity == 'themes':
+            populate_themes(batch.rows, database)
+            continue
+
+        report = BULK_POPULATE[batch.entity](batch.rows, database,
+                                             batch_size, refresh=False)
+
+        if report.entity not in reports:
+            reports[report.entity] = report
+            continue
+
+        total = reports[report.entity]
+        total.rows += report.rows
+        total.links += report.links
+        total.seconds += report.seconds
+
+    refresh_candidate_view(database)
+    set_catalog_version(read_catalog_version(database))
+
+    return list(reports.values())
+
+
+class ParallelImportError(Exception):
+    '''Some partitions of a parallel import failed
+
+    Attributes:
+        reports: reports of the committed partitions, per entity type
+        errors: error of each failed partition, by `entity[partition]`
+    '''
+
+    def __init__(self, reports: List[ImportReport],
+                 errors: Dict[str, Exception]) -> None:
+        super().__init__(f'{len(errors)} import partitions failed: '
+                         + ', '.join(sorted(errors)))
+        self.reports = reports
+        self.errors = errors
+
+
+PARALLEL_POPULATE: Sequence[Tuple[str, BulkEntity, Callable[[Any], Tuple]]] = (
+    ('names', NAME_ENTITY, name_row),
+    ('items', ITEM_ENTITY, item_row),
+    ('features', FEATURE_ENTITY, feature_row),
+)
+
+
+def partition_of(entity: BulkEntity, row: Tuple, partitions: int) -> int:
+    '''Stable hash partition of a row, by its key'''
+    return zlib.crc32(repr(entity.key_of(row)).encode('utf-8')) % partitions
+
+
+def parallel_populate(data: LoadedDbItemsJson, database: Database,
+                      workers: Optional[int] = None,
+                      partitions: Optional[int] = None) -> List[ImportReport]:
+    '''Import names, items and features concurrently
+
+    Themes are imported first. Each entity type is then split in
+    `partitions` by key hash, so rows with the same key share a partition,
+    and every partition is bulk imported by a pool of `workers` threads.
+    Entity types that are not `partitioned`, as features, are imported as
+    a single partition.
+
+    Atomicity is per partition: each one commits in its own transaction,
+    so a failure leaves the other partitions imported. As bulk imports are
+    idempotent, running the import again completes it. Failures are raised
+    together, as a `ParallelImportError`, once every partition finished.
+
+    The candidate view is refreshed once, after every partition finished.
+    Returns one report per entity type, its seconds being the slowest
+    partition.
+    '''
+    workers = workers or settings.IMPORT_WORKERS
+    partitions = partitions or settings.IMPORT_PARTITIONS
 
-def populate_mock(data: LoadedDbItemsJson, database: Database) -> None:
-    '''Create mock DB for testing purposes'''
     populate_themes(data.themes, database)
 
+    jobs: List[Tuple[BulkEntity, int, List[Tuple], List[List[str]]]] = []
+    for attribute, entity, to_row in PARALLEL_POPULATE:
+        splits = partitions if entity.partitioned else 1
+        split: List[Tuple[List[Tuple], List[List[str]]]] = [
+            ([], []) for _ in range(splits)]
+
+        for value in getattr(data, attribute):
+            row = to_row(value)
+            rows, themes = split[partition_of(entity, row, splits)]
+            rows.append(row)
+            themes.append(value.themes)
+
+        jobs.extend((entity, index, rows, themes)
+                    for index, (rows, themes) in enumerate(split) if rows)
+
+    reports: Dict[str, ImportReport] = {}
+    errors: Dict[str, Exception] = {}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [(entity, index, executor.submit(
+            bulk_populate, entity, rows, themes, database, refresh=False))
+                   for entity, index, rows, themes in jobs]
+
+        for entity, index, future in futures:
+            try:
+                report = future.result()
+
+            except Exception as exp:  # pylint: disable=broad-except
+                logger.error(f'Import of {entity.table}[{index}] failed: '
+                             f'{exp}')
+                errors[f'{entity.table}[{index}]'] = exp
+                continue
+
+            if report.entity not in reports:
+                reports[report.entity] = report
+                continue
+
+            total = reports[report.entity]
+            total.rows += report.rows
+            total.links += report.links
+            total.seconds = max(total.seconds, report.seconds)
+
+    refresh_candidate_view(database)
+    set_catalog_version(read_catalog_version(database))
+
+    if errors:
+        raise ParallelImportError(list(reports.values()), errors)
+
+    return list(reports.values())
+
+
+def populate_mock(data: LoadedDbItemsJson, database: Database,
+                  bulk: bool = False, parallel: bool = False) -> None:
+    '''Create mock DB for testing purposes
+
+    With `bulk`, entities are imported with the `bulk_populate_*`
+    functions, with `parallel` with `parallel_populate`.
+    '''
+    if parallel:
+        parallel_populate(data, database)
+        return
+
+    populate_themes(data.themes, database)
+
+    if bulk:
+        bulk_populate_names(data.names, database)
+        bulk_populate_items(data.items, database)
+        bulk_populate_features(data.features, database)
+        return
+
     populate_names(data.names, database)
 
     populate_items(data.items, database)
@@ -0,0 +1,198 @@
+'''In-memory snapshot of the catalog, to generate without round trips
+
+The catalog rows of a snapshot are read once from the database and never
+changed afterwards, a reload builds a new one and swaps the reference, so
+readers always see a consistent catalog without locking. Only the bounded
+cache of candidate pools built from those rows grows with use.
+'''
+import threading
+from typing import Dict, List, Optional, Tuple, Iterable
+
+from loguru import logger
+from records import Database
+
+from src.caching import LRUCache
+from src.config import settings
+from src.database.database_utils import get_db
+from src.database.catalog_version import CatalogVersion, on_catalog_change
+from src.database.dao.exceptions import InvalidGender
+from src.database.dao.characters import CandidatePool
+
+
+def _links_by_entity(links: Iterable[Dict]) -> Dict[int, List[str]]:
+    '''Group theme names by the linked entity id'''
+    ret: Dict[int, List[str]] = {}
+    for link in links:
+        ret.setdefault(link['id'], []).append(link['theme'])
+
+    return ret
+
+
+def _union(groups: Iterable[List[Dict]]) -> List[Dict]:
+    '''Merge lists of rows, keeping each row id once'''
+    seen = set()
+    ret = []
+    for group in groups:
+        for row in group:
+            if row['id'] not in seen:
+                seen.add(row['id'])
+                ret.append(row)
+
+    return ret
+
+
+class CatalogSnapshot:
+    '''Indexes over the catalog rows, by theme, gender and is_good
+
+    Only entities linked to at least one theme are indexed, the same rows
+    the database selections can return.
+    '''
+
+    ANY_THEME = None
+
+    def __init__(self, themes: List[Dict], names: List[Dict],
+                 features: List[Dict], items: List[Dict],
+                 links: Dict[str, List[Dict]]) -> None:
+        self.themes = [theme['name'] for theme in themes]
+
+        self.__names: Dict[Optional[str], Dict[str, List[Dict]]] = {}
+        for theme, row in self.__linked(names, links['name']):
+            by_gender = self.__names.setdefault(theme, {})
+            by_gender.setdefault(row['gender'], []).append(row)
+            by_gender.setdefault('any', []).append(row)
+
+        self.__features: Dict[Optional[str], Dict[bool, List[Dict]]] = {}
+        for theme, row in self.__linked(features, links['feature']):
+            by_good = self.__features.setdefault(theme, {})
+            by_good.setdefault(row['is_good'], []).append(row)
+
+        self.__items: Dict[Optional[str], List[Dict]] = {}
+        for theme, row in self.__linked(items, links['item']):
+            self.__items.setdefault(theme, []).append(row)
+
+        # Pools of the recent theme filters, requests pick the filters
+        self.__pools = LRUCache(settings.SNAPSHOT_POOL_CACHE_SIZE)
+
+    def __linked(self, rows: List[Dict], links: List[Dict]
+                 ) -> Iterable[Tuple[Optional[str], Dict]]:
+        '''Yield (theme, row) for each link and (ANY_THEME, row) once'''
+        themes_by_id = _links_by_entity(links)
+        for row in rows:
+            themes = themes_by_id.get(row['id'], [])
+            if not themes:
+                continue
+
+            yield self.ANY_THEME, row
+            for theme in themes:
+                yield theme, row
+
+    def __for_themes(self, index: Dict, themes: Optional[Tuple[str, ...]]
+                     ) -> List:
+        '''Return the index entries for the filter themes'''
+        if not themes:
+            return [index.get(self.ANY_THEME, {})]
+
+        return [index.get(theme, {}) for theme in themes]
+
+    def candidate_pool(self, themes: Optional[Tuple[str, ...]],
+                       gender: str) -> CandidatePool:
+        '''Return the candidates for a theme filter and name gender'''
+        if gender not in settings.CHARACTER_GENDER_POSSIBILITIES + ['any']:
+            raise InvalidGender(gender)
+
+        key = (tuple(sorted(set(themes))) if themes else None, gender)
+        pool: Optional[CandidatePool] = self.__pools.get(key)
+        if pool is None:
+            names = self.__for_themes(self.__names, key[0])
+            features = self.__for_themes(self.__features, key[0])
+            items = self.__for_themes(self.__items, key[0])
+
+            pool = CandidatePool(
+                names=_union(n.get(gender, []) for n in names),
+                positive_features=_union(f.get(True, []) for f in features),
+                negative_features=_union(f.get(False, []) for f in features),
+                items=_union(i or [] for i in items))
+            self.__pools.set(key, pool)
+
+        return pool
+
+
+def load_snapshot(database: Database) -> CatalogSnapshot:
+    '''Read the whole catalog into a new snapshot'''
+    link_sql = '''SELECT l.{column} AS id, t.name AS theme
+        FROM {table} l JOIN theme t ON t.id=l.id_theme'''
+
+    with database.get_connection() as conn:
+        themes = conn.query('SELECT * FROM theme').as_dict()
+        names = conn.query('SELECT * FROM name').as_dict()
+        features = conn.query('SELECT * FROM feature').as_dict()
+        items = conn.query('SELECT * FROM item').as_dict()
+
+        links = {
+            'name': conn.query(link_sql.format(
+                column='id_name', table='linknametheme')).as_dict(),
+            'feature': conn.query(link_sql.format(
+                column='id_feature', table='linkfeaturetheme')).as_dict(),
+            'item': conn.query(link_sql.format(
+                column='id_item', table='linkitemtheme')).as_dict()
+        }
+
+    logger.info(f'Catalog snapshot with `{len(names)}` names, '
+                f'`{len(features)}` features and `{len(items)}` items')
+
+    return CatalogSnapshot(themes, names, features, items, links)
+
+
+__SNAPSHOT: Optional[CatalogSnapshot] = None
+__SNAPSHOT_LOCK = threading.Lock()
+
+
+def refresh_snapshot(database: Optional[Database] = None
+                     ) -> CatalogSnapshot:
+    '''Build a new snapshot and atomically replace the current one'''
+    global __SNAPSHOT  # pylint: disable=global-statement,invalid-name
+
+    snapshot = load_snapshot(database or get_db())
+    with __SNAPSHOT_LOCK:
+        __SNAPSHOT = snapshot
+
+    return snapshot
+
+
+def get_snapshot() -> CatalogSnapshot:
+    '''Return the current snapshot, loading it on first use
+
+    The first use loads it with the lock held, so concurrent first uses
+    wait for that load instead of each loading the catalog.
+    '''
+    global __SNAPSHOT  # pylint: disable=global-statement,invalid-name
+
+    snapshot = __SNAPSHOT
+    if snapshot is None:
+        with __SNAPSHOT_LOCK:
+            snapshot = __SNAPSHOT
+            if snapshot is None:
+                snapshot = __SNAPSHOT = load_snapshot(get_db())
+
+    return snapshot
+
+
+def snapshot_loaded() -> bool:
+    '''Was a snapshot loaded in this process?'''
+    return __SNAPSHOT is not None
+
+
+def clear_snapshot() -> None:
+    '''Drop the current snapshot, the next use will reload it'''
+    global __SNAPSHOT  # pylint: disable=global-statement,invalid-name
+
+    with __SNAPSHOT_LOCK:
+        __SNAPSHOT = None
+
+
+def _drop_stale_snapshot(_version: CatalogVersion) -> None:
+    '''Drop the snapshot of an old catalog, reloaded on next use'''
+    clear_snapshot()
+
+
+on_catalog_change(_drop_stale_snapshot)
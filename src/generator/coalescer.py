@@ -0,0 +1,162 @@
+'''Coalescing of concurrent character generations
+
+Generations arriving within COALESCE_WINDOW_MS of each other, with the same
+themes and gender, are answered together: the first one opens a batch, and
+when the window ends, or COALESCE_MAX_BATCH generations joined it, the
+candidate pool of the batch is fetched once and every waiter samples its
+own character from it. A batch holding a single generation runs it as
+usual.
+'''
+import asyncio
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from src.config import settings
+from src.generator.generation import (GenerationSetup, get_candidate_pool,
+                                      pool_key, sample_character)
+
+Generate = Callable[[GenerationSetup], Awaitable[Dict]]
+
+
+@dataclass
+class CoalescerStats:
+    '''Usage counters of the generation coalescer
+
+    Attributes:
+        window_ms: milliseconds a batch waits for more generations
+        max_batch: most generations answered by a batch
+        requests: generations submitted
+        batches: batches run
+        pool_fetches: candidate pools fetched for batches of many
+        max_batch_size: biggest batch run
+    '''
+    window_ms: float
+    max_batch: int
+    requests: int = 0
+    batches: int = 0
+    pool_fetches: int = 0
+    max_batch_size: int = 0
+
+    @property
+    def avg_batch_size(self) -> float:
+        '''Mean number of generations per batch'''
+        return self.requests / self.batches if self.batches else 0.0
+
+
+def _settle(future: asyncio.Future, result: Optional[Dict] = None,
+            exp: Optional[Exception] = None) -> None:
+    '''Answer a waiter, unless it gave up waiting'''
+    if future.done():  # pragma: no cover
+        return
+
+    if exp is not None:
+        future.set_exception(exp)
+    else:
+        future.set_result(result)
+
+
+@dataclass
+class _Batch:
+    '''Generations waiting for the same candidate pool'''
+    waiters: List[Tuple[GenerationSetup, asyncio.Future]] = \
+        field(default_factory=list)
+    full: asyncio.Event = field(default_factory=asyncio.Event)
+
+
+class GenerationCoalescer:
+    '''Group concurrent generations sharing a candidate pool
+
+    Must be used from a single event loop.
+    '''
+
+    def __init__(self, window_ms: float, max_batch: int) -> None:
+        self.__stats = CoalescerStats(window_ms=window_ms,
+                                      max_batch=max_batch)
+        self.__open: Dict[Tuple, _Batch] = {}
+
+    async def generate(self, setup: GenerationSetup,
+                       single: Generate) -> Dict:
+        '''Generate a character for `setup`, batched with its peers
+
+        `single` runs a generation alone, for batches of one.
+        '''
+        key = pool_key(setup)
+        future: asyncio.Future[Dict] = \
+            asyncio.get_event_loop().create_future()
+        self.__stats.requests += 1
+
+        batch = self.__open.get(key)
+        if batch is None:
+            batch = self.__open[key] = _Batch()
+            asyncio.ensure_future(self.__flush(key, batch, single))
+
+        batch.waiters.append((setup, future))
+        if len(batch.waiters) >= self.__stats.max_batch:
+            self.__close(key, batch)
+
+        return await future
+
+    def stats(self) -> CoalescerStats:
+        '''Return a copy of the usage counters'''
+        return CoalescerStats(**vars(self.__stats))
+
+    def __close(self, key: Tuple, batch: _Batch) -> None:
+        '''Stop `batch` from taking more generations'''
+        if self.__open.get(key) is batch:
+            del self.__open[key]
+        batch.full.set()
+
+    async def __flush(self, key: Tuple, batch: _Batch,
+                      single: Generate) -> None:
+        '''Wait for the window to end, then answer every waiter'''
+        try:
+            await asyncio.wait_for(batch.full.wait(),
+                                   self.__stats.window_ms / 1000)
+        except asyncio.TimeoutError:
+            pass
+        self.__close(key, batch)
+
+        self.__stats.batches += 1
+        self.__stats.max_batch_size = max(self.__stats.max_batch_size,
+                                          len(batch.waiters))
+
+        if len(batch.waiters) == 1:
+            setup, future = batch.waiters[0]
+            try:
+                result = await single(setup)
+            except Exception as exp:  # pylint: disable=broad-except
+                _settle(future, exp=exp)
+            else:
+                _settle(future, result=result)
+            return
+
+        self.__stats.pool_fetches += 1
+        try:
+            pool = await asyncio.get_event_loop().run_in_executor(
+                None, get_candidate_pool, batch.waiters[0][0])
+        except Exception as exp:  # pylint: disable=broad-except
+            for _, future in batch.waiters:
+                _settle(future, exp=exp)
+            return
+
+        for setup, future in batch.waiters:
+            try:
+                result = sample_character(setup, pool)
+            except Exception as exp:  # pylint: disable=broad-except
+                _settle(future, exp=exp)
+            else:
+                _settle(future, result=result)
+
+
+__COALESCER: Optional[GenerationCoalescer] = None
+
+
+def get_coalescer() -> GenerationCoalescer:
+    '''Return the process coalescer, sized from the settings'''
+    global __COALESCER  # pylint: disable=global-statement,invalid-name
+
+    if __COALESCER is None:
+        __COALESCER = GenerationCoalescer(settings.COALESCE_WINDOW_MS,
+                                          settings.COALESCE_MAX_BATCH)
+
+    return __COALESCER
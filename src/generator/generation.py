@@ -1,15 +1,26 @@
 '''Character generting functions'''
 
+import asyncio
+import random
 from dataclasses import dataclass
-from typing import Dict, Optional, List, Tuple
+from typing import Dict, Optional, List, Tuple, Iterable, Iterator
 
 from loguru import logger
 
+from src.config import settings
 from src.generator.exceptions import NoDataForGeneration
-from src.database.dao import FeatureDAO, NameDAO, ItemDAO
+from src.database.snapshot import get_snapshot
+from src.database.dao.exceptions import (NegativeSelecionTentative,
+                                         InvalidGender, UnknownTheme)
+from src.database.dao.theme_registry import get_theme_registry
+from src.database.dao import (FeatureDAO, NameDAO, ItemDAO, CharacterDAO,
+                              CandidatePool, CapacityDAO)
+from src.database.dao import (AsyncFeatureDAO, AsyncNameDAO, AsyncItemDAO,
+                              ensure_theme_registry)
 from src.database.dao import (RandFeatSelectionSetup,
                               RandItemSelectionSetup,
-                              RandNameSelectionSetup)
+                              RandNameSelectionSetup,
+                              RandCharacterSelectionSetup)
 
 
 @dataclass
@@ -31,12 +42,134 @@ class GenerationSetup:
     themes: Optional[Tuple[str, ...]] = None
 
 
+@dataclass
+class GenerationOutcome:
+    '''Result of one generation in a batch
+
+    Attributes:
+        character: generated character, None when the generation failed
+        error: why the generation failed, None on success
+    '''
+    character: Optional[Dict] = None
+    error: Optional[str] = None
+
+
 def treat_no_data_for_generation(log: str) -> None:
     '''Log input and  raise exception'''
     logger.warning(log)
     raise NoDataForGeneration(log)
 
 
+def check_themes(themes: Optional[Tuple[str, ...]]) -> None:
+    '''Reject unknown themes before any selection'''
+    try:
+        get_theme_registry().resolve(themes or ())
+
+    except UnknownTheme as exp:
+        treat_no_data_for_generation(f'Unknown themes `{exp}`')
+
+
+def features_shortage(found: int, n_features: int,
+                      themes: Optional[Tuple[str, ...]],
+                      kind: str) -> Optional[str]:
+    '''Why `found` features can not fill a character, None if they can'''
+    log = None
+    if not found:
+        log = f'No {kind} features for themes `{themes}`'
+
+    elif found < n_features:
+        log = f'Not enough {kind} feats for themes `{themes}``.' + \
+            f'Expected `{n_features}`, found ' + \
+            f'`{found}`'
+
+    return log
+
+
+def name_shortage(found: int, gender: str,
+                  themes: Optional[Tuple[str, ...]]) -> Optional[str]:
+    '''Why `found` names can not fill a character, None if they can'''
+    if not found:
+        return f'No name with gender `{gender}` and themes `{themes}`'
+
+    return None
+
+
+def items_shortage(found: int, n_items: int,
+                   themes: Optional[Tuple[str, ...]]) -> Optional[str]:
+    '''Why `found` items can not fill a character, None if they can'''
+    log = None
+    if not found:
+        log = f'No items for themes `{themes}`'
+
+    elif found < n_items:
+        log = f'Not enough items for themes `{themes}`. ' + \
+              f'Expected {n_items}, found {found}'
+
+    return log
+
+
+def check_features(features: List[Dict], n_features: int,
+                   themes: Optional[Tuple[str, ...]], kind: str) -> List[Dict]:
+    '''Validate selected features, `kind` is positive or negative'''
+    log = features_shortage(len(features), n_features, themes, kind)
+    if log:
+        treat_no_data_for_generation(log)
+
+    return features
+
+
+def check_name(name: Optional[Dict], gender: str,
+               themes: Optional[Tuple[str, ...]]) -> Optional[Dict]:
+    '''Validate the selected name'''
+    log = name_shortage(1 if name else 0, gender, themes)
+    if log:
+        treat_no_data_for_generation(log)
+
+    return name
+
+
+def check_items(items: List[Dict], n_items: int,
+                themes: Optional[Tuple[str, ...]]) -> List[Dict]:
+    '''Validate selected items'''
+    log = items_shortage(len(items), n_items, themes)
+    if log:
+        treat_no_data_for_generation(log)
+
+    return items
+
+
+def check_capacity(setup: GenerationSetup) -> None:
+    '''Reject setups the catalog can not fill, before any selection
+
+    Selections find at most the requested rows, so the shortage is
+    reported as they would, from the cached candidate counts. Negative
+    counts and invalid genders are left to the selections to report.
+    '''
+    counts = (setup.items, setup.n_positive_features,
+              setup.n_negative_features)
+    genders = settings.CHARACTER_GENDER_POSSIBILITIES + ['any']
+    if not settings.CAPACITY_CHECK or min(counts) < 0 \
+            or setup.gender not in genders:
+        return
+
+    capacity = CapacityDAO().get_capacity(setup.themes)
+
+    log = name_shortage(
+        min(capacity.names_of(setup.gender), 1),
+        setup.gender, setup.themes) \
+        or features_shortage(
+            min(capacity.positive_features, setup.n_positive_features),
+            setup.n_positive_features, setup.themes, 'positive') \
+        or features_shortage(
+            min(capacity.negative_features, setup.n_negative_features),
+            setup.n_negative_features, setup.themes, 'negative') \
+        or items_shortage(min(capacity.items, setup.items),
+                          setup.items, setup.themes)
+
+    if log:
+        treat_no_data_for_generation(log)
+
+
 def get_positive_features(n_features: int,
                           themes: Optional[Tuple[str, ...]]) -> List[Dict]:
     '''Select random positive features'''
@@ -49,18 +182,7 @@ def get_positive_features(n_features: int,
 
     positive_features = dao.get_random_features(setup)
 
-    log = None
-    if not positive_features:
-        log = f'No positive features for themes `{themes}`'
-
-    elif len(positive_features) < n_features:
-        log = f'Not enough positive feats for themes `{themes}``.' + \
-            f'Expected `{n_features}`, found ' + \
-            f'`{len(positive_features)}`'
-    if log:
-        treat_no_data_for_generation(log)
-
-    return positive_features
+    return check_features(positive_features, n_features, themes, 'positive')
 
 
 def get_negative_features(n_features: int,
@@ -75,19 +197,7 @@ def get_negative_features(n_features: int,
 
     negative_features = dao.get_random_features(setup)
 
-    log = None
-    if not negative_features:
-        log = f'No negative features for themes `{themes}`'
-
-    elif len(negative_features) < n_features:
-        log = f'Not enough negative feats for themes `{themes}``.' + \
-              f'Expected `{n_features}`, found ' + \
-              f'`{len(negative_features)}`'
-
-    if log:
-        treat_no_data_for_generation(log)
-
-    return negative_features
+    return check_features(negative_features, n_features, themes, 'negative')
 
 
 def get_name(gender: str, themes: Optional[Tuple[str, ...]] = None) -> Optional[Dict]:
@@ -97,11 +207,7 @@ def get_name(gender: str, themes: Optional[Tuple[str, ...]] = None) -> Optional[
 
     name = dao.get_random_name(setup)
 
-    if not name:
-        treat_no_data_for_generation(
-            f'No name with gender `{gender}` and themes `{themes}`')
-
-    return name
+    return check_name(name, gender, themes)
 
 
 def get_items(n_items: int, themes: Optional[Tuple[str, ...]] = None) -> List[Dict]:
@@ -111,22 +217,11 @@ def get_items(n_items: int, themes: Optional[Tuple[str, ...]] = None) -> List[Di
 
     items = dao.get_random_items(setup)
 
-    log = None
-    if not items:
-        log = f'No items for themes `{themes}`'
+    return check_items(items, n_items, themes)
 
-    elif len(items) < n_items:
-        log = f'Not enough items for themes `{themes}`. ' + \
-              f'Expected {n_items}, found {len(items)}'
 
-    if log:
-        treat_no_data_for_generation(log)
-
-    return items
-
-
-def generate_character(setup: GenerationSetup) -> Dict:
-    '''Run the generation parametrized'''
+def generate_character_separately(setup: GenerationSetup) -> Dict:
+    '''Run the generation with one query per character part'''
     name = get_name(gender=setup.gender, themes=setup.themes)
 
     positive_features = get_positive_features(
@@ -145,3 +240,165 @@ def generate_character(setup: GenerationSetup) -> Dict:
         'negative_features': negative_features,
         'items': items
     }
+
+
+def build_character(setup: GenerationSetup,
+                    parts: Dict[str, List[Dict]]) -> Dict:
+    '''Validate the selected parts, in the same order of the queries'''
+    names = parts['name']
+    name = check_name(names[0] if names else None,
+                      setup.gender, setup.themes)
+
+    positive_features = check_features(parts['positive_features'],
+                                       setup.n_positive_features,
+                                       setup.themes, 'positive')
+
+    negative_features = check_features(parts['negative_features'],
+                                       setup.n_negative_features,
+                                       setup.themes, 'negative')
+
+    items = check_items(parts['items'], setup.items, setup.themes)
+
+    return {
+        'name': name,
+        'positive_features': positive_features,
+        'negative_features': negative_features,
+        'items': items
+    }
+
+
+def sample_rows(rows: List[Dict], n_rows: int) -> List[Dict]:
+    '''Draw up to `n_rows` distinct random rows'''
+    if n_rows < 0:
+        raise NegativeSelecionTentative()
+
+    n_rows = min(n_rows, len(rows))
+
+    return [dict(row) for row in random.sample(rows, n_rows)]
+
+
+def sample_character(setup: GenerationSetup, pool: CandidatePool) -> Dict:
+    '''Generate a character drawing its parts from candidate rows'''
+    parts = {
+        'name': sample_rows(pool.names, 1),
+        'positive_features': sample_rows(pool.positive_features,
+                                         setup.n_positive_features),
+        'negative_features': sample_rows(pool.negative_features,
+                                         setup.n_negative_features),
+        'items': sample_rows(pool.items, setup.items)
+    }
+
+    return build_character(setup, parts)
+
+
+def pool_key(setup: GenerationSetup) -> Tuple:
+    '''Key of the candidate pool a setup draws from'''
+    themes = tuple(sorted(set(setup.themes))) if setup.themes else None
+
+    return themes, setup.gender
+
+
+def get_candidate_pool(setup: GenerationSetup) -> CandidatePool:
+    '''Return every candidate row for the filters of `setup`'''
+    themes, gender = pool_key(setup)
+    check_themes(themes)
+
+    if settings.GENERATION_MODE == 'snapshot':
+        return get_snapshot().candidate_pool(themes, gender)
+
+    return CharacterDAO().get_candidate_pool(themes, gender)
+
+
+def iter_generate_characters(setups: Iterable[GenerationSetup]
+                             ) -> Iterator[GenerationOutcome]:
+    '''Lazily generate many characters, fetching each candidate pool once
+
+    Setups sharing themes and gender draw from the same pool. A failed
+    generation is reported in its outcome, not raised.
+    '''
+    pools: Dict[Tuple, CandidatePool] = {}
+
+    for setup in setups:
+        try:
+            key = pool_key(setup)
+            if key not in pools:
+                pools[key] = get_candidate_pool(setup)
+
+            yield GenerationOutcome(
+                character=sample_character(setup, pools[key]))
+
+        except NoDataForGeneration as exp:
+            yield GenerationOutcome(error=str(exp))
+
+        except InvalidGender as exp:
+            yield GenerationOutcome(error=f'Invalid gender {exp}')
+
+        except NegativeSelecionTentative:
+            yield GenerationOutcome(
+                error='Number of items and features must be non-negative')
+
+
+def generate_characters(setups: Iterable[GenerationSetup]
+                        ) -> List[GenerationOutcome]:
+    '''Generate many characters, see `iter_generate_characters`'''
+    return list(iter_generate_characters(setups))
+
+
+def generate_character(setup: GenerationSetup) -> Dict:
+    '''Run the generation parametrized'''
+    check_themes(setup.themes)
+
+    if settings.GENERATION_MODE == 'snapshot':
+        return sample_character(setup, get_candidate_pool(setup))
+
+    check_capacity(setup)
+
+    if settings.GENERATION_MODE == 'separate':
+        return generate_character_separately(setup)
+
+    dao = CharacterDAO()
+    parts = dao.get_random_character(RandCharacterSelectionSetup(
+        gender=setup.gender,
+        n_positive_features=setup.n_positive_features,
+        n_negative_features=setup.n_negative_features,
+        n_items=setup.items,
+        filter_themes=setup.themes))
+
+    return build_character(setup, parts)
+
+
+async def generate_character_async(setup: GenerationSetup) -> Dict:
+    '''Run the generation on the async DAOs, selecting parts concurrently'''
+    await ensure_theme_registry()
+    check_themes(setup.themes)
+
+    if settings.GENERATION_MODE == 'snapshot':
+        return sample_character(setup, get_candidate_pool(setup))
+
+    # Capacities not cached yet are read with the blocking DAO
+    await asyncio.get_event_loop().run_in_executor(None, check_capacity,
+                                                   setup)
+
+    feature_dao = AsyncFeatureDAO()
+    name, positive_features, negative_features, items = await asyncio.gather(
+        AsyncNameDAO().get_random_name(RandNameSelectionSetup(
+            gender=setup.gender,
+            filter_themes=setup.themes)),
+        feature_dao.get_random_features(RandFeatSelectionSetup(
+            n_features=setup.n_positive_features,
+            is_good=True,
+            filter_themes=setup.themes)),
+        feature_dao.get_random_features(RandFeatSelectionSetup(
+            n_features=setup.n_negative_features,
+            is_good=False,
+            filter_themes=setup.themes)),
+        AsyncItemDAO().get_random_items(RandItemSelectionSetup(
+            n_items=setup.items,
+            filter_themes=setup.themes)))
+
+    return build_character(setup, {
+        'name': [name] if name else [],
+        'positive_features': positive_features,
+        'negative_features': negative_features,
+        'items': items
+    })
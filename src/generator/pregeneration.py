@@ -0,0 +1,272 @@
+'''Background pre-generation of characters for hot generation setups
+
+Each worker counts the generations asked for every setup (themes, gender
+and counts). A background thread keeps a ring buffer of ready characters
+for the PREGEN_HOT_KEYS most asked setups, so single generations of those
+are answered by popping a character. Counts are halved every
+PREGEN_INTERVAL seconds, so buffers follow recent traffic.
+
+Buffers are refilled every PREGEN_INTERVAL seconds, or as soon as one runs
+low, drawing every character of a refill from a single candidate pool.
+They are flushed when the catalog version changes.
+'''
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from src.config import settings
+from src.database.catalog_version import CatalogVersion, on_catalog_change
+from src.database.dao.exceptions import (InvalidGender,
+                                         NegativeSelecionTentative)
+from src.generator.exceptions import NoDataForGeneration
+from src.generator.generation import (GenerationSetup, get_candidate_pool,
+                                      pool_key, sample_character)
+
+
+def setup_key(setup: GenerationSetup) -> Tuple:
+    '''Key of the characters a setup can be answered with'''
+    themes, gender = pool_key(setup)
+
+    return (themes, gender, setup.items, setup.n_positive_features,
+            setup.n_negative_features)
+
+
+def setup_of(key: Tuple) -> GenerationSetup:
+    '''Setup of a key made by `setup_key`'''
+    themes, gender, items, n_positive_features, n_negative_features = key
+
+    return GenerationSetup(gender=gender, items=items,
+                           n_positive_features=n_positive_features,
+                           n_negative_features=n_negative_features,
+                           themes=themes)
+
+
+@dataclass
+class BufferStats:
+    '''State of the buffer of a hot setup
+
+    Attributes:
+        setup: setup the buffered characters answer
+        requests: generations asked for the setup, recently
+        size: characters ready
+        capacity: most characters held
+        served: characters popped
+        refilled: characters added
+        refill_rate: characters added per second since the buffer exists
+    '''
+    setup: GenerationSetup
+    requests: int
+    size: int
+    capacity: int
+    served: int
+    refilled: int
+    refill_rate: float
+
+
+@dataclass
+class _Buffer:
+    '''Ready characters of a hot setup'''
+    characters: Deque[Dict]
+    created: float
+    served: int = 0
+    refilled: int = 0
+    # No data for the setup, refilled on timed passes only
+    failed: bool = False
+
+
+class PreGenerator(threading.Thread):
+    '''Thread keeping characters ready for the hottest setups'''
+
+    def __init__(self, hot_keys: int, capacity: int, min_requests: int,
+                 interval: float) -> None:
+        super().__init__(name='pregenerator', daemon=True)
+        self.hot_keys = hot_keys
+        self.capacity = capacity
+        self.min_requests = min_requests
+        self.interval = interval
+        self.__counts: Counter = Counter()
+        self.__buffers: Dict[Tuple, _Buffer] = {}
+        self.__epoch = 0
+        self.__decayed_at = time.monotonic()
+        self.__lock = threading.Lock()
+        self.__wake = threading.Event()
+        self.__stop = threading.Event()
+
+    def take(self, setup: GenerationSetup) -> Optional[Dict]:
+        '''Pop a ready character for `setup`, None if there is none'''
+        key = setup_key(setup)
+
+        with self.__lock:
+            self.__counts[key] += 1
+
+            buffer = self.__buffers.get(key)
+            if buffer is None:
+                return None
+
+            if len(buffer.characters) <= self.capacity // 2 \
+                    and not buffer.failed:
+                self.__wake.set()
+
+            if not buffer.characters:
+                return None
+
+            buffer.served += 1
+
+            return buffer.characters.popleft()
+
+    def refill(self) -> int:
+        '''Fill the buffers of the hottest setups, returns characters added
+
+        Setups that are no longer hot lose their buffer.
+        '''
+        with self.__lock:
+            hot = [key for key, count
+                   in self.__counts.most_common(self.hot_keys)
+                   if count >= self.min_requests]
+            self.__decay()
+
+            for key in set(self.__buffers) - set(hot):
+                del self.__buffers[key]
+
+            for key in hot:
+                if key not in self.__buffers:
+                    self.__buffers[key] = _Buffer(
+                        characters=deque(maxlen=self.capacity),
+                        created=time.monotonic())
+
+            epoch = self.__epoch
+            missing = {
+                key: self.capacity - len(self.__buffers[key].characters)
+                for key in hot}
+
+        added = 0
+        for key, n_characters in missing.items():
+            if n_characters <= 0:
+                continue
+
+            setup = setup_of(key)
+            try:
+                pool = get_candidate_pool(setup)
+                characters = [sample_character(setup, pool)
+                              for _ in range(n_characters)]
+
+            except (NoDataForGeneration, InvalidGender,
+                    NegativeSelecionTentative) as exp:
+                logger.debug(f'Not pre-generating {key}: {exp}')
+                characters = []
+
+            with self.__lock:
+                # Characters of a catalog flushed meanwhile are dropped
+                buffer = self.__buffers.get(key)
+                if buffer is None or epoch != self.__epoch:
+                    continue
+
+                buffer.failed = not characters
+                buffer.characters.extend(characters)
+                buffer.refilled += len(characters)
+                added += len(characters)
+
+        return added
+
+    def flush(self, _version: Optional[CatalogVersion] = None) -> None:
+        '''Drop every ready character, they may come from an old catalog'''
+        with self.__lock:
+            self.__epoch += 1
+            for buffer in self.__buffers.values():
+                buffer.characters.clear()
+                buffer.failed = False
+
+        self.__wake.set()
+
+    def stats(self) -> List[BufferStats]:
+        '''Return the state of every buffer'''
+        now = time.monotonic()
+        stats = []
+        with self.__lock:
+            for key, buffer in self.__buffers.items():
+                elapsed = max(now - buffer.created, 1e-9)
+                stats.append(BufferStats(
+                    setup=setup_of(key), requests=self.__counts[key],
+                    size=len(buffer.characters), capacity=self.capacity,
+                    served=buffer.served, refilled=buffer.refilled,
+                    refill_rate=buffer.refilled / elapsed))
+
+        return stats
+
+    def stop(self) -> None:
+        '''Ask the thread to finish, within `interval` seconds'''
+        self.__stop.set()
+        self.__wake.set()
+
+    def run(self) -> None:
+        '''Refill every `interval` seconds, or when a buffer runs low'''
+        while not self.__stop.is_set():
+            self.__wake.wait(self.interval)
+            self.__wake.clear()
+            if self.__stop.is_set():
+                break
+
+            try:
+                self.refill()
+
+            except Exception as exp:  # pylint: disable=broad-except
+                logger.error(f'Character pre-generation failed: {exp}')
+
+    def __decay(self) -> None:
+        '''Halve the request counts once per interval, lock held'''
+        now = time.monotonic()
+        if now - self.__decayed_at < self.interval:
+            return
+
+        self.__decayed_at = now
+        self.__counts = Counter({key: count // 2
+                                 for key, count in self.__counts.items()
+                                 if count // 2})
+
+
+__PREGENERATOR: Optional[PreGenerator] = None
+
+
+def get_pregenerator() -> Optional[PreGenerator]:
+    '''Return the pre-generator of this process, None if not running'''
+    return __PREGENERATOR
+
+
+def start_pregenerator() -> Optional[PreGenerator]:
+    '''Start the pre-generator of this process, if PREGEN_HOT_KEYS is set'''
+    global __PREGENERATOR  # pylint: disable=global-statement,invalid-name
+
+    if settings.PREGEN_HOT_KEYS <= 0:
+        return None
+
+    if __PREGENERATOR is None or not __PREGENERATOR.is_alive():
+        __PREGENERATOR = PreGenerator(settings.PREGEN_HOT_KEYS,
+                                      settings.PREGEN_BUFFER_SIZE,
+                                      settings.PREGEN_MIN_REQUESTS,
+                                      settings.PREGEN_INTERVAL)
+        __PREGENERATOR.start()
+
+    return __PREGENERATOR
+
+
+def stop_pregenerator() -> None:
+    '''Stop the pre-generator of this process, if running'''
+    global __PREGENERATOR  # pylint: disable=global-statement,invalid-name
+
+    if __PREGENERATOR is not None:
+        __PREGENERATOR.stop()
+        __PREGENERATOR = None
+
+
+def flush_pregenerated(version: Optional[CatalogVersion] = None) -> None:
+    '''Flush the buffers of the running pre-generator'''
+    pregenerator = __PREGENERATOR
+    if pregenerator is not None:
+        pregenerator.flush(version)
+
+
+on_catalog_change(flush_pregenerated)
@@ -1,8 +1,16 @@
 '''Centralize schemas importing'''
-from .feature import FeatureModel  # noqa
-from .item import ItemModel  # noqa
-from .name import NameModel  # noqa
-from .theme import ThemeModel  # noqa
+from .feature import FeatureModel, FeaturePage  # noqa
+from .item import ItemModel, ItemPage  # noqa
+from .name import NameModel, NamePage  # noqa
+from .theme import ThemeModel, ThemePage  # noqa
 from .generation import (GeneratedCharacter,
                          GenerationRequest,
-                         NoDataToGen)  # noqa
+                         NoDataToGen,
+                         BatchGenerationRequest,
+                         BatchGenerationResult,
+                         BatchGeneratedCharacters)  # noqa
+from .capacity import CapacityModel  # noqa
+from .stats import (CacheStatsModel,
+                    CoalescerStatsModel,
+                    PoolStatsModel,
+                    PregenBufferStatsModel)  # noqa
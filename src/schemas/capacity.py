@@ -0,0 +1,17 @@
+'''Schemas for candidate capacity responses'''
+
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+
+
+class CapacityModel(BaseModel):
+    '''Most parts a generation can ask for a theme combination
+
+    `names` counts candidate names by gender, 'any' included.
+    '''
+    themes: Optional[List[str]]
+    names: Dict[str, int]
+    n_positive_features: int
+    n_negative_features: int
+    n_items: int
@@ -1,5 +1,7 @@
 '''Schemas for API responses'''
 
+from typing import List, Optional
+
 from pydantic import BaseModel
 
 
@@ -10,3 +12,9 @@ class FeatureModel(BaseModel):
     text_fem: str
     description: str
     is_good: bool
+
+
+class FeaturePage(BaseModel):
+    '''Page of features, `next_cursor` is None on the last page'''
+    results: List[FeatureModel]
+    next_cursor: Optional[int] = None
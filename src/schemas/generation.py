@@ -28,3 +28,28 @@ class GenerationRequest(BaseModel):
 class NoDataToGen(BaseModel):
     '''Response to when no character was generated'''
     detail: str
+
+
+class BatchGenerationRequest(BaseModel):
+    '''Fields for generating many characters
+
+    `count` characters are generated from `request`, followed by one
+    character for each entry of `requests`.
+    '''
+    request: GenerationRequest = GenerationRequest()
+    count: int = 0
+    requests: List[GenerationRequest] = []
+
+
+class BatchGenerationResult(BaseModel):
+    '''Outcome of one character of a batch'''
+    index: int
+    character: Optional[GeneratedCharacter] = None
+    detail: Optional[str] = None
+
+
+class BatchGeneratedCharacters(BaseModel):
+    '''Batch generation response, failures listed along successes'''
+    generated: int
+    failed: int
+    results: List[BatchGenerationResult]
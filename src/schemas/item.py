@@ -1,5 +1,7 @@
 '''Schemas for API responses'''
 
+from typing import List, Optional
+
 from pydantic import BaseModel
 
 
@@ -8,3 +10,9 @@ class ItemModel(BaseModel):
     id: int
     name: str
     description: str
+
+
+class ItemPage(BaseModel):
+    '''Page of items, `next_cursor` is None on the last page'''
+    results: List[ItemModel]
+    next_cursor: Optional[int] = None
@@ -1,5 +1,7 @@
 '''Schemas for API responses'''
 
+from typing import List, Optional
+
 from pydantic import BaseModel
 
 
@@ -10,3 +12,9 @@ class NameModel(BaseModel):
     firstname: str
     lastname: str
     gender: str
+
+
+class NamePage(BaseModel):
+    '''Page of names, `next_cursor` is None on the last page'''
+    results: List[NameModel]
+    next_cursor: Optional[int] = None
@@ -0,0 +1,50 @@
+'''Schemas for API runtime statistics responses'''
+
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+
+class PoolStatsModel(BaseModel):
+    '''Database connection pool statistics schema'''
+    size: int
+    checked_out: int
+    overflow: int
+    checkouts: int
+    wait_total: float
+    wait_max: float
+    wait_avg: float
+
+
+class CacheStatsModel(BaseModel):
+    '''In-process cache statistics schema'''
+    size: int
+    maxsize: int
+    hits: int
+    misses: int
+
+
+class CoalescerStatsModel(BaseModel):
+    '''Generation coalescer statistics schema'''
+    window_ms: float
+    max_batch: int
+    requests: int
+    batches: int
+    pool_fetches: int
+    max_batch_size: int
+    avg_batch_size: float
+
+
+class PregenBufferStatsModel(BaseModel):
+    '''Pre-generation buffer statistics schema'''
+    themes: Optional[List[str]]
+    gender: str
+    n_items: int
+    n_positive_features: int
+    n_negative_features: int
+    requests: int
+    size: int
+    capacity: int
+    served: int
+    refilled: int
+    refill_rate: float
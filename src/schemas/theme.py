@@ -1,5 +1,7 @@
 '''Schemas for API responses'''
 
+from typing import List, Optional
+
 from pydantic import BaseModel
 
 
@@ -8,3 +10,9 @@ class ThemeModel(BaseModel):
 
     id: int
     name: str
+
+
+class ThemePage(BaseModel):
+    '''Page of themes, `next_cursor` is None on the last page'''
+    results: List[ThemeModel]
+    next_cursor: Optional[int] = None
@@ -44,6 +44,8 @@ def database(mock_data: LoadedDbItemsJson) -> Database:
 
     # teardown
     with test_db.transaction() as conn:
+        conn.query('DROP MATERIALIZED VIEW catalogcandidate')
+
         conn.query('DROP TABLE linkfeaturetheme')
         conn.query('DROP TABLE linknametheme')
         conn.query('DROP TABLE linkitemtheme')
@@ -52,3 +54,5 @@ def database(mock_data: LoadedDbItemsJson) -> Database:
         conn.query('DROP TABLE name')
         conn.query('DROP TABLE item')
         conn.query('DROP TABLE feature')
+
+        conn.query('DROP TABLE catalogversion')
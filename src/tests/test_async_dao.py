@@ -0,0 +1,80 @@
+'''Test the asyncio DAOs and generation'''
+import asyncio
+
+import pytest
+from records import Database
+
+from src.database.async_database import to_positional, close_async_pool
+from src.database.dao import AsyncFeatureDAO, AsyncNameDAO, AsyncItemDAO
+from src.database.dao import RandFeatSelectionSetup, RandNameSelectionSetup
+from src.database.dao import clear_theme_registry, theme_registry_loaded
+from src.database.models import LoadedDbItemsJson
+from src.generator.generation import (generate_character_async,
+                                      GenerationSetup)
+
+pytest.importorskip('asyncpg')
+
+
+def run(coroutine):
+    '''Run a coroutine to completion, closing the pool bound to its loop'''
+    async def wrapper():
+        try:
+            return await coroutine
+        finally:
+            await close_async_pool()
+
+    return asyncio.new_event_loop().run_until_complete(wrapper())
+
+
+def test_to_positional() -> None:
+    '''Named parameters become numbered, repeated ones reuse the number'''
+    sql, args = to_positional('SELECT :a, :b::int, :a', {'a': 1, 'b': 2})
+
+    assert sql == 'SELECT $1, $2::int, $1'  # nosec
+    assert args == [1, 2]  # nosec
+
+
+def test_async_selection(database: Database,
+                         mock_data: LoadedDbItemsJson) -> None:
+    '''Async DAOs select like the blocking ones'''
+    setup = RandFeatSelectionSetup(n_features=2, is_good=True,
+                                   filter_themes=('Brasil',))
+    features = run(AsyncFeatureDAO().get_random_features(setup))
+
+    feature_names_from_theme = [f.text_masc for f in mock_data.features
+                                if 'Brasil' in f.themes]
+
+    assert len(features) == 2  # nosec
+    for feature in features:
+        assert feature['is_good']  # nosec
+        assert feature['text_masc'] in feature_names_from_theme  # nosec
+
+    name = run(AsyncNameDAO().get_random_name(
+        RandNameSelectionSetup(gender='feminine')))
+    assert name['gender'] == 'feminine'  # nosec
+
+    items = run(AsyncItemDAO().list_all())
+    assert len(items) == len(mock_data.items)  # nosec
+
+
+def test_async_theme_registry(database: Database) -> None:
+    '''Async selections load the theme registry off the event loop'''
+    clear_theme_registry()
+    setup = RandFeatSelectionSetup(n_features=1, is_good=True,
+                                   filter_themes=('Brasil',))
+    features = run(AsyncFeatureDAO().get_random_features(setup))
+
+    assert theme_registry_loaded()  # nosec
+    assert len(features) == 1  # nosec
+
+
+def test_async_generation(database: Database) -> None:
+    '''Concurrent selections fill every character part'''
+    setup = GenerationSetup(gender='any', items=2,
+                            n_positive_features=2,
+                            n_negative_features=1)
+    character = run(generate_character_async(setup))
+
+    assert len(character['positive_features']) == 2  # nosec
+    assert len(character['negative_features']) == 1  # nosec
+    assert len(character['items']) == 2  # nosec
@@ -0,0 +1,119 @@
+'''Test catalog change propagation between processes'''
+import time
+from typing import List
+
+import psycopg2
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+from records import Database
+from sqlalchemy.exc import OperationalError
+
+from src.database import catalog_listener
+from src.database.catalog_listener import CatalogListener
+from src.database.catalog_version import (CatalogVersion,
+                                          bump_catalog_version,
+                                          get_catalog_version,
+                                          on_catalog_change)
+
+
+@pytest.mark.parametrize('mode', ['notify', 'poll'])
+def test_listener_follows_other_writers(database: Database,
+                                        mode: str) -> None:
+    '''Versions bumped behind the process back must reach the listeners'''
+    seen: List[CatalogVersion] = []
+    on_catalog_change(seen.append)
+
+    before = get_catalog_version(database)
+    listener = CatalogListener(mode, interval=0.1)
+    listener.start()
+    try:
+        # Bump like another process would, without telling this one
+        with database.transaction() as conn:
+            bumped = bump_catalog_version(conn, ['theme'])
+
+        deadline = time.monotonic() + 5
+        while get_catalog_version().version < bumped.version \
+                and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        listener.stop()
+        listener.join()
+
+    assert bumped.version > before.version  # nosec
+    assert get_catalog_version().version == bumped.version  # nosec
+    assert bumped.version in [version.version for version in seen]  # nosec
+
+
+def test_listener_survives_refresh_errors(database: Database,
+                                          monkeypatch: MonkeyPatch) -> None:
+    '''Failed refreshes must not end the listener, it listens again'''
+    read_catalog_version = catalog_listener.read_catalog_version
+    failures = [2]
+
+    def flaky_read(db: Database) -> CatalogVersion:
+        if failures[0]:
+            failures[0] -= 1
+            raise OperationalError('SELECT', {}, Exception('server down'))
+
+        return read_catalog_version(db)
+
+    monkeypatch.setattr(catalog_listener, 'read_catalog_version', flaky_read)
+
+    listener = CatalogListener('notify', interval=0.1)
+    listener.start()
+    try:
+        deadline = time.monotonic() + 5
+        while failures[0] and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        with database.transaction() as conn:
+            bumped = bump_catalog_version(conn, ['theme'])
+
+        while get_catalog_version().version < bumped.version \
+                and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        assert listener.is_alive()  # nosec
+    finally:
+        listener.stop()
+        listener.join()
+
+    assert get_catalog_version().version == bumped.version  # nosec
+
+
+def test_listener_reconnects(database: Database,
+                             monkeypatch: MonkeyPatch) -> None:
+    '''A lost LISTEN connection must be opened again, not polled'''
+    connect = psycopg2.connect
+    connections: List[str] = []
+
+    def flaky_connect(dsn: str) -> psycopg2.extensions.connection:
+        connections.append(dsn)
+        if len(connections) == 1:
+            raise psycopg2.OperationalError('server closed the connection')
+
+        return connect(dsn)
+
+    monkeypatch.setattr(catalog_listener.psycopg2, 'connect', flaky_connect)
+
+    listener = CatalogListener('notify', interval=0.1)
+    listener.start()
+    try:
+        deadline = time.monotonic() + 5
+        while len(connections) < 2 and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        with database.transaction() as conn:
+            bumped = bump_catalog_version(conn, ['theme'])
+
+        while get_catalog_version().version < bumped.version \
+                and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        assert listener.is_alive()  # nosec
+    finally:
+        listener.stop()
+        listener.join()
+
+    assert len(connections) == 2  # nosec
+    assert get_catalog_version().version == bumped.version  # nosec
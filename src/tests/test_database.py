@@ -1,9 +1,23 @@
 '''Testings for database shape'''
 # Disable no-self-use for nice test grouping
 # pylint: disable=no-self-use
+import io
+import json
+import os
+from dataclasses import replace
+
+import pytest
+
+from fastapi.testclient import TestClient
 from records import Database
 
-from src.database.models import LoadedDbItemsJson
+from src.database.models import LoadedDbItemsJson, NameInput
+from src.database.database_utils import get_db, iter_json_batches
+from src.database.json_stream import JsonStream
+from src.database.populate import (ParallelImportError, parallel_populate,
+                                   populate_from_json, populate_mock)
+
+MOCK_DB_JSON = os.path.join(os.path.dirname(__file__), 'mock_db.json')
 
 
 def test_db_tables(database):
@@ -20,6 +34,22 @@ def test_db_tables(database):
     assert 'linkitemtheme' in tables  # nosec
 
 
+def test_db_is_shared(database: Database) -> None:
+    '''Every caller must reuse the same pooled database'''
+    assert get_db() is database  # nosec
+    assert get_db() is get_db()  # nosec
+
+
+def test_pool_stats(test_client: TestClient, database: Database) -> None:
+    '''Pool statistics must account for the checkouts made'''
+    database.query('SELECT 1')
+
+    ret = test_client.get('/v1/stats/pool')
+
+    assert ret.status_code == 200  # nosec
+    assert ret.json()['checkouts'] > 0  # nosec
+
+
 class TestDbPopulation:
     '''Test if popupating functions are working properly'''
 
@@ -118,3 +148,99 @@ class TestDbPopulation:
             link_themes = [l['name'] for l in links]
 
             assert set(link_themes) - set(feat.themes) == set()  # nosec
+
+
+def test_bulk_populate_is_idempotent(database: Database,
+                                     mock_data: LoadedDbItemsJson) -> None:
+    '''Bulk importing the loaded catalog again must not change it'''
+    count_sql = '''SELECT
+        (SELECT count(*) FROM name) AS names,
+        (SELECT count(*) FROM item) AS items,
+        (SELECT count(*) FROM feature) AS features,
+        (SELECT count(*) FROM linknametheme) AS name_links,
+        (SELECT count(*) FROM linkitemtheme) AS item_links,
+        (SELECT count(*) FROM linkfeaturetheme) AS feature_links'''
+
+    before = database.query(count_sql).as_dict()
+
+    populate_mock(mock_data, database, bulk=True)
+
+    assert database.query(count_sql).as_dict() == before  # nosec
+
+
+def test_json_stream_small_reads() -> None:
+    '''Array members must be decoded whole across read boundaries'''
+    document = {'skipped': 1, 'numbers': [12345, 1.5e3, -2.5e-7, None],
+                'rows': [{'text': 'a ] b', 'tags': [True, False]}],
+                'empty': []}
+
+    for read_size in range(1, 20):
+        stream = JsonStream(io.StringIO(json.dumps(document)), read_size)
+
+        assert list(stream.items()) == [  # nosec
+            ('numbers', 12345), ('numbers', 1.5e3), ('numbers', -2.5e-7),
+            ('numbers', None),
+            ('rows', {'text': 'a ] b', 'tags': [True, False]})]
+
+
+def test_json_batches_match_full_load(mock_data: LoadedDbItemsJson) -> None:
+    '''Streamed batches must hold the rows of the full load'''
+    batches = list(iter_json_batches(MOCK_DB_JSON, batch_size=2))
+
+    assert batches[0].entity == 'themes'  # nosec
+    assert batches[0].rows == mock_data.themes  # nosec
+    assert all(len(batch.rows) <= 2 for batch in batches[1:])  # nosec
+
+    for entity in ('names', 'items', 'features'):
+        rows = [row for batch in batches if batch.entity == entity
+                for row in batch.rows]
+
+        assert rows == getattr(mock_data, entity)  # nosec
+
+
+def test_populate_from_json_is_idempotent(database: Database) -> None:
+    '''Streaming the loaded catalog in again must not change it'''
+    count_sql = '''SELECT
+        (SELECT count(*) FROM name) AS names,
+        (SELECT count(*) FROM linkfeaturetheme) AS feature_links'''
+
+    before = database.query(count_sql).as_dict()
+
+    reports = populate_from_json(MOCK_DB_JSON, database, batch_size=2)
+
+    assert {r.entity for r in reports} == {'name', 'item', 'feature'}  # nosec
+    assert database.query(count_sql).as_dict() == before  # nosec
+
+
+def test_parallel_populate_is_idempotent(database: Database,
+                                         mock_data: LoadedDbItemsJson) -> None:
+    '''Parallel import of the loaded catalog must not change it'''
+    count_sql = '''SELECT
+        (SELECT count(*) FROM item) AS items,
+        (SELECT count(*) FROM linknametheme) AS name_links'''
+
+    before = database.query(count_sql).as_dict()
+
+    reports = parallel_populate(mock_data, database, workers=3, partitions=2)
+
+    assert {r.entity for r in reports} == {'name', 'item', 'feature'}  # nosec
+    assert sum(r.rows for r in reports) == (  # nosec
+        len(mock_data.names) + len(mock_data.items) + len(mock_data.features))
+    assert database.query(count_sql).as_dict() == before  # nosec
+
+
+def test_parallel_populate_failure(database: Database,
+                                   mock_data: LoadedDbItemsJson) -> None:
+    '''A failed partition must be reported without importing its rows'''
+    invalid = NameInput(firstname='Invalid', lastname='Gender',
+                        gender='unknown', themes=[mock_data.themes[0]])
+    data = replace(mock_data, names=mock_data.names + [invalid])
+
+    with pytest.raises(ParallelImportError) as error:
+        parallel_populate(data, database, partitions=2)
+
+    assert len(error.value.errors) == 1  # nosec
+    assert next(iter(error.value.errors)).startswith('name[')  # nosec
+    assert not database.query(  # nosec
+        'SELECT id FROM name WHERE firstname = :name',
+        name=invalid.firstname).as_dict()
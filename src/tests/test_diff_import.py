@@ -0,0 +1,59 @@
+'''Test the hash-based catalog re-import'''
+from dataclasses import replace
+from typing import Dict, List
+
+from records import Database
+
+from src.database.diff_import import DiffReport, diff_import
+from src.database.models import ItemInput, LoadedDbItemsJson
+
+
+def by_entity(reports: List[DiffReport]) -> Dict[str, DiffReport]:
+    '''Index reports by entity type'''
+    return {report.entity: report for report in reports}
+
+
+def test_diff_import_unchanged(database: Database,
+                               mock_data: LoadedDbItemsJson) -> None:
+    '''Importing the stored catalog again must change nothing'''
+    diff_import(mock_data, database)
+
+    reports = by_entity(diff_import(mock_data, database))
+
+    assert not any(r.changed for r in reports.values())  # nosec
+    assert reports['item'].unchanged == len(mock_data.items)  # nosec
+    assert reports['name'].unchanged == len(mock_data.names)  # nosec
+
+
+def test_diff_import_changes(database: Database,
+                             mock_data: LoadedDbItemsJson) -> None:
+    '''Only new, changed and deleted entities must be touched'''
+    diff_import(mock_data, database)
+
+    first, *others = mock_data.items
+    new_item = ItemInput(name='Diff item', description='Added',
+                         themes=[mock_data.themes[0]])
+    changed = replace(mock_data, items=[
+        replace(first, description='Changed'), *others, new_item])
+
+    try:
+        reports = by_entity(diff_import(changed, database))
+
+        assert reports['item'].inserted == 1  # nosec
+        assert reports['item'].updated == 1  # nosec
+        assert reports['item'].deleted == 0  # nosec
+        assert reports['item'].unchanged == len(others)  # nosec
+        assert not reports['feature'].changed  # nosec
+
+        description = database.query(
+            'SELECT description FROM item WHERE name = :name',
+            name=first.name).as_dict()[0]['description']
+        assert description == 'Changed'  # nosec
+
+    finally:
+        reports = by_entity(diff_import(mock_data, database))
+
+    assert reports['item'].deleted == 1  # nosec
+    assert reports['item'].updated == 1  # nosec
+    assert not database.query('SELECT id FROM item WHERE name = :name',
+                              name=new_item.name).as_dict()  # nosec
@@ -0,0 +1,158 @@
+'''Test the character generation paths'''
+import asyncio
+from typing import Dict
+
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+from records import Database
+
+from src.config import settings
+from src.database.dao import clear_capacities, get_capacity_stats
+from src.generator.coalescer import GenerationCoalescer
+from src.generator.exceptions import NoDataForGeneration
+from src.generator.generation import generate_character, GenerationSetup
+from src.generator.pregeneration import PreGenerator
+
+
+@pytest.mark.parametrize('mode', ['single_query', 'separate', 'snapshot'])
+def test_generation_modes(database: Database, mode: str,
+                          monkeypatch: MonkeyPatch) -> None:
+    '''Every generation mode must fill all character parts'''
+    monkeypatch.setattr(settings, 'GENERATION_MODE', mode)
+
+    setup = GenerationSetup(gender='masculine', items=2,
+                            n_positive_features=1,
+                            n_negative_features=1,
+                            themes=('Generico', 'GOT', 'Brasil'))
+    character = generate_character(setup)
+
+    assert character['name']['gender'] == 'masculine'  # nosec
+    assert len(character['positive_features']) == 1  # nosec
+    assert len(character['negative_features']) == 1  # nosec
+    assert len(character['items']) == 2  # nosec
+
+
+def test_single_query_no_data(database: Database) -> None:
+    '''Single query mode keeps the NoDataForGeneration semantics'''
+    setup = GenerationSetup(gender='any', items=1,
+                            n_positive_features=1000,
+                            n_negative_features=1)
+
+    with pytest.raises(NoDataForGeneration, match='positive'):
+        generate_character(setup)
+
+
+@pytest.mark.parametrize('mode', ['single_query', 'separate', 'snapshot'])
+def test_unknown_theme_no_data(database: Database, mode: str,
+                               monkeypatch: MonkeyPatch) -> None:
+    '''Unknown themes are reported as missing data in every mode'''
+    monkeypatch.setattr(settings, 'GENERATION_MODE', mode)
+    setup = GenerationSetup(gender='any', items=1,
+                            n_positive_features=1,
+                            n_negative_features=1,
+                            themes=('Pizzaria',))
+
+    with pytest.raises(NoDataForGeneration, match='Pizzaria'):
+        generate_character(setup)
+
+
+def test_coalesced_generations(database: Database) -> None:
+    '''Concurrent generations must share one candidate pool fetch'''
+    coalescer = GenerationCoalescer(window_ms=50, max_batch=64)
+    setup = GenerationSetup(gender='masculine', items=2,
+                            n_positive_features=1,
+                            n_negative_features=1,
+                            themes=('Generico', 'GOT', 'Brasil'))
+    missing = GenerationSetup(gender='any', items=1,
+                              n_positive_features=1000,
+                              n_negative_features=1)
+
+    async def single(one: GenerationSetup) -> Dict:
+        return generate_character(one)
+
+    async def generate_all():
+        return await asyncio.gather(
+            *[coalescer.generate(setup, single) for _ in range(5)],
+            *[coalescer.generate(missing, single) for _ in range(2)],
+            return_exceptions=True)
+
+    results = asyncio.new_event_loop().run_until_complete(generate_all())
+    stats = coalescer.stats()
+
+    assert stats.requests == 7  # nosec
+    assert stats.batches == 2  # nosec
+    assert stats.pool_fetches == 2  # nosec
+    assert stats.avg_batch_size == 3.5  # nosec
+
+    for character in results[:5]:
+        assert character['name']['gender'] == 'masculine'  # nosec
+        assert len(character['positive_features']) == 1  # nosec
+        assert len(character['items']) == 2  # nosec
+
+    for error in results[5:]:
+        assert isinstance(error, NoDataForGeneration)  # nosec
+        assert 'positive' in str(error)  # nosec
+
+
+def test_pregenerated_characters(database: Database) -> None:
+    '''Hot setups must be answered from their buffer until flushed'''
+    pregenerator = PreGenerator(hot_keys=1, capacity=4, min_requests=2,
+                                interval=60)
+    setup = GenerationSetup(gender='feminine', items=1,
+                            n_positive_features=2,
+                            n_negative_features=1,
+                            themes=('Brasil', 'Generico'))
+    cold = GenerationSetup(gender='any', items=1,
+                           n_positive_features=1,
+                           n_negative_features=1)
+
+    assert pregenerator.take(setup) is None  # nosec
+    assert pregenerator.take(setup) is None  # nosec
+    assert pregenerator.take(cold) is None  # nosec
+
+    assert pregenerator.refill() == 4  # nosec
+
+    characters = [pregenerator.take(setup) for _ in range(5)]
+    stats, = pregenerator.stats()
+
+    assert pregenerator.take(cold) is None  # nosec
+    assert characters[-1] is None  # nosec
+    for character in characters[:4]:
+        assert character is not None  # nosec
+        assert character['name']['gender'] == 'feminine'  # nosec
+        assert len(character['positive_features']) == 2  # nosec
+        assert len(character['items']) == 1  # nosec
+
+    assert stats.setup == setup  # nosec
+    assert (stats.size, stats.served, stats.refilled) == (0, 4, 4)  # nosec
+    assert stats.refill_rate > 0  # nosec
+
+    pregenerator.refill()
+    pregenerator.flush()
+
+    assert pregenerator.take(setup) is None  # nosec
+
+
+def test_capacity_check(database: Database,
+                        monkeypatch: MonkeyPatch) -> None:
+    '''Infeasible setups must be rejected as the selections would'''
+    setup = GenerationSetup(gender='any', items=1,
+                            n_positive_features=1000,
+                            n_negative_features=1,
+                            themes=('Brasil',))
+
+    monkeypatch.setattr(settings, 'CAPACITY_CHECK', False)
+    with pytest.raises(NoDataForGeneration) as unchecked:
+        generate_character(setup)
+    monkeypatch.setattr(settings, 'CAPACITY_CHECK', True)
+
+    clear_capacities()
+    before = get_capacity_stats()
+    for _ in range(3):
+        with pytest.raises(NoDataForGeneration) as checked:
+            generate_character(setup)
+    after = get_capacity_stats()
+
+    assert str(checked.value) == str(unchecked.value)  # nosec
+    assert after.misses - before.misses == 1  # nosec
+    assert after.hits - before.hits == 2  # nosec
@@ -1,8 +1,16 @@
 '''Tests for listing endpoints, evaluating the GET requests'''
+import asyncio
+import json
 
 from fastapi.testclient import TestClient
+from records import Database
 
+from src.api.api_v1.endpoints.listing import (BODY_CACHE, FEATURES_RESPONSE,
+                                              listing_body)
+from src.database.dao import (AsyncFeatureDAO, FeatureDAO,
+                              FeatureListingSetup, ListingPage)
 from src.database.models import LoadedDbItemsJson
+from src.database.populate import populate_themes
 
 
 def test_names(test_client: TestClient, mock_data: LoadedDbItemsJson) -> None:
@@ -90,3 +98,202 @@ def test_set_features(test_client: TestClient) -> None:
 
     assert len(ret_json['positive_features']) == 1  # nosec
     assert len(ret_json['negative_features']) == 1  # nosec
+
+
+def test_batch_generation(test_client: TestClient) -> None:
+    '''Batch failures must not fail the whole batch'''
+    ret = test_client.post('/v1/generate/batch', json={
+        'request': {'n_positive_features': 1, 'n_negative_features': 1},
+        'count': 3,
+        'requests': [{'themes': ['Pizzaria']},
+                     {'gender': 'feminine', 'n_items': 1}]
+    })
+
+    assert ret.status_code == 200  # nosec
+
+    ret_json = ret.json()
+
+    assert ret_json['generated'] == 4  # nosec
+    assert ret_json['failed'] == 1  # nosec
+    assert ret_json['results'][3]['character'] is None  # nosec
+    assert ret_json['results'][3]['detail']  # nosec
+    assert ret_json['results'][4]['character']['name']['gender'] \
+        == 'feminine'  # nosec
+
+
+def test_batch_too_big(test_client: TestClient) -> None:
+    '''Batches over the size limit are rejected'''
+    ret = test_client.post('/v1/generate/batch', json={'count': 10 ** 6})
+
+    assert ret.status_code == 422  # nosec
+
+
+def test_stream_generation(test_client: TestClient) -> None:
+    '''Streamed characters come one per line, in order'''
+    ret = test_client.post('/v1/generate/stream?flush_every=2', json={
+        'request': {'n_positive_features': 1, 'n_negative_features': 1},
+        'count': 5,
+        'requests': [{'themes': ['Pizzaria']}]
+    })
+
+    assert ret.status_code == 200  # nosec
+    assert ret.headers['content-type'].startswith(
+        'application/x-ndjson')  # nosec
+
+    lines = [json.loads(line) for line in ret.text.splitlines()]
+
+    assert [line['index'] for line in lines] == list(range(6))  # nosec
+    assert all('character' in line for line in lines[:5])  # nosec
+    assert 'detail' in lines[5]  # nosec
+
+
+def test_stream_generation_negative_flush(test_client: TestClient) -> None:
+    '''Negative chunk sizes are rejected before streaming'''
+    ret = test_client.post('/v1/generate/stream?flush_every=-1',
+                           json={'count': 1})
+
+    assert ret.status_code == 422  # nosec
+
+
+def test_features_pagination(test_client: TestClient,
+                             mock_data: LoadedDbItemsJson) -> None:
+    '''Following the cursor must list every feature once, in id order'''
+    ids = []
+    after = None
+    while True:
+        params = {'limit': 5}
+        if after is not None:
+            params['after'] = after
+
+        ret = test_client.get('/v1/listing/features', params=params).json()
+        ids += [r['id'] for r in ret['results']]
+
+        after = ret['next_cursor']
+        if after is None:
+            break
+
+    assert ids == sorted(ids)  # nosec
+    assert len(ids) == len(set(ids)) == len(mock_data.features)  # nosec
+
+
+def test_listing_filters(test_client: TestClient,
+                         mock_data: LoadedDbItemsJson) -> None:
+    '''Theme, is_good and gender filters are applied'''
+    ret = test_client.get('/v1/listing/features',
+                          params={'theme': 'Brasil', 'is_good': True}).json()
+
+    mock_features = {f.text_masc for f in mock_data.features
+                     if f.is_good and 'Brasil' in f.themes}
+
+    assert {r['text_masc'] for r in ret} == mock_features  # nosec
+
+    ret = test_client.get('/v1/listing/names',
+                          params={'gender': 'feminine', 'limit': 10}).json()
+
+    assert ret['results']  # nosec
+    assert all(r['gender'] == 'feminine' for r in ret['results'])  # nosec
+    assert ret['next_cursor'] is None  # nosec
+
+    ret = test_client.get('/v1/listing/items', params={'theme': 'Pizzaria'})
+
+    assert ret.status_code == 422  # nosec
+
+    ret = test_client.get('/v1/listing/items/stream',
+                          params={'theme': 'Pizzaria'})
+
+    assert ret.status_code == 422  # nosec
+
+
+def test_streamed_listing(test_client: TestClient,
+                          mock_data: LoadedDbItemsJson) -> None:
+    '''Streamed listings hold every row, as JSON array or NDJSON'''
+    ret = test_client.get('/v1/listing/features/stream')
+
+    assert ret.status_code == 200  # nosec
+    assert len(ret.json()) == len(mock_data.features)  # nosec
+
+    ret = test_client.get('/v1/listing/names/stream',
+                          params={'format': 'ndjson', 'gender': 'feminine'})
+    names = [json.loads(line) for line in ret.text.splitlines()]
+
+    assert names  # nosec
+    assert all(n['gender'] == 'feminine' for n in names)  # nosec
+
+
+def test_conditional_listing(test_client: TestClient, database: Database,
+                             mock_data: LoadedDbItemsJson) -> None:
+    '''Unchanged catalogs answer 304, populating changes the ETag'''
+    ret = test_client.get('/v1/listing/themes')
+    etag = ret.headers['etag']
+
+    assert ret.status_code == 200  # nosec
+    assert 'last-modified' in ret.headers  # nosec
+
+    ret = test_client.get('/v1/listing/themes',
+                          headers={'If-None-Match': etag})
+
+    assert ret.status_code == 304  # nosec
+
+    populate_themes(mock_data.themes, database)
+
+    ret = test_client.get('/v1/listing/themes',
+                          headers={'If-None-Match': etag})
+
+    assert ret.status_code == 200  # nosec
+    assert ret.headers['etag'] != etag  # nosec
+    assert len(ret.json()) == len(mock_data.themes)  # nosec
+
+
+class CountingFeatureDAO(FeatureDAO):
+    '''Feature DAO counting the listings it queries'''
+    queries = 0
+
+    def list_page(self, setup: FeatureListingSetup) -> ListingPage:
+        CountingFeatureDAO.queries += 1
+        return super().list_page(setup)
+
+
+def test_single_flight_listing(database: Database,
+                               mock_data: LoadedDbItemsJson) -> None:
+    '''Concurrent identical listings must share a single query'''
+    BODY_CACHE.clear()
+    CountingFeatureDAO.queries = 0
+    key = ('single-flight', '/v1/listing/features', '')
+
+    async def list_concurrently():
+        return await asyncio.gather(*[
+            listing_body(key, FEATURES_RESPONSE, CountingFeatureDAO,
+                         AsyncFeatureDAO, FeatureListingSetup())
+            for _ in range(10)])
+
+    bodies = asyncio.new_event_loop().run_until_complete(
+        list_concurrently())
+
+    assert CountingFeatureDAO.queries == 1  # nosec
+    assert len(set(bodies)) == 1  # nosec
+    assert len(json.loads(bodies[0])) == len(mock_data.features)  # nosec
+
+
+def test_capacity(test_client: TestClient,
+                  mock_data: LoadedDbItemsJson) -> None:
+    '''Capacities must count the candidates of the asked themes'''
+    ret = test_client.get('/v1/capacity', params={'theme': ['Brasil']})
+    capacity = ret.json()
+
+    names = [n for n in mock_data.names if 'Brasil' in n.themes]
+    features = [f for f in mock_data.features if 'Brasil' in f.themes]
+
+    assert ret.status_code == 200  # nosec
+    assert capacity['themes'] == ['Brasil']  # nosec
+    assert capacity['names']['any'] == len(names)  # nosec
+    assert capacity['names']['feminine'] == len(  # nosec
+        [n for n in names if n.gender == 'feminine'])
+    assert capacity['n_positive_features'] == len(  # nosec
+        [f for f in features if f.is_good])
+    assert capacity['n_negative_features'] == len(  # nosec
+        [f for f in features if not f.is_good])
+    assert capacity['n_items'] == len(  # nosec
+        [i for i in mock_data.items if 'Brasil' in i.themes])
+
+    ret = test_client.get('/v1/capacity', params={'theme': ['Pizzaria']})
+    assert ret.status_code == 422  # nosec
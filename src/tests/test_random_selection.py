@@ -1,13 +1,20 @@
 '''Test the generation tools'''
 import pytest
+from _pytest.monkeypatch import MonkeyPatch
+from records import Database
 
 from src.database.dao import FeatureDAO, ItemDAO, NameDAO
 from src.database.dao import (RandFeatSelectionSetup,
                               RandItemSelectionSetup,
                               RandNameSelectionSetup)
+from src.database.dao import clear_theme_registry, get_theme_registry
 from src.database.dao.exceptions import (NegativeSelecionTentative,
-                                         InvalidGender)
+                                         InvalidGender, UnknownTheme)
+from src.database.dao.sampling import (CANDIDATE_ID_CACHE, STRATEGIES,
+                                       clear_candidate_ids)
+from src.database.dao.statements import STATEMENTS
 from src.database.models import LoadedDbItemsJson
+from src.config import settings
 
 
 def test_random_feature_common_use(mock_data: LoadedDbItemsJson):
@@ -51,9 +58,8 @@ def test_random_feature_unusual_uses():
                                    is_good=True,
                                    filter_themes=('',))
 
-    features = dao.get_random_features(setup)
-
-    assert len(features) == 0  # nosec
+    with pytest.raises(UnknownTheme):
+        dao.get_random_features(setup)
 
 
 def test_negative_feature_numbers():
@@ -68,16 +74,15 @@ def test_negative_feature_numbers():
 
 
 def test_feature_invalid_theme():
-    '''Pass unexistent theme to setup, shall return no results'''
+    '''Pass unexistent theme to setup, shall be rejected'''
     dao = FeatureDAO()
 
     setup = RandFeatSelectionSetup(n_features=1,
                                    is_good=False,
                                    filter_themes=('Shenanigan-like-theme',))
 
-    features = dao.get_random_features(setup)
-
-    assert len(features) == 0  # nosec
+    with pytest.raises(UnknownTheme):
+        dao.get_random_features(setup)
 
 
 def test_random_items_common_use(mock_data: LoadedDbItemsJson):
@@ -104,9 +109,9 @@ def test_item_invalid_theme():
     dao = ItemDAO()
     setup = RandItemSelectionSetup(n_items=1,
                                    filter_themes=('PizzaFritaNaLareira',))
-    items = dao.get_random_items(setup)
 
-    assert len(items) == 0  # nosec
+    with pytest.raises(UnknownTheme):
+        dao.get_random_items(setup)
 
 
 def test_item_zero():
@@ -181,6 +186,183 @@ def test_random_name_invalid_theme():
     setup = RandNameSelectionSetup(gender='masculine',
                                    filter_themes=('Pizzaria',))
 
-    name = dao.get_random_name(setup)
+    with pytest.raises(UnknownTheme):
+        dao.get_random_name(setup)
+
+
+@pytest.mark.parametrize('strategy', STRATEGIES)
+def test_forced_sampling_strategy(strategy: str,
+                                  mock_data: LoadedDbItemsJson,
+                                  monkeypatch: MonkeyPatch) -> None:
+    '''Every strategy must honor the filters and the number of rows'''
+    monkeypatch.setattr(settings, 'SAMPLING_STRATEGY', strategy)
+
+    dao = FeatureDAO()
+    setup = RandFeatSelectionSetup(n_features=2,
+                                   is_good=True,
+                                   filter_themes=('Brasil',))
+    features = dao.get_random_features(setup)
+
+    items = ItemDAO().get_random_items(RandItemSelectionSetup(n_items=4))
+
+    feature_names_from_theme = [i.text_masc for i in mock_data.features
+                                if 'Brasil' in i.themes and i.is_good]
+
+    assert len(features) == 2  # nosec
+    for feature in features:
+        assert feature['text_masc'] in feature_names_from_theme  # nosec
+
+    assert len(items) == 4  # nosec
+    assert len({i['id'] for i in items}) == 4  # nosec
+
+
+def test_id_range_spread(database: Database,
+                         monkeypatch: MonkeyPatch) -> None:
+    '''Probing must reach every id, not only the lowest ones'''
+    monkeypatch.setattr(settings, 'SAMPLING_STRATEGY', 'id_range')
+    setup = RandItemSelectionSetup(n_items=1)
+
+    ids = {row['id'] for row in database.query('SELECT id FROM item')}
+    picked = {item['id'] for _ in range(300)
+              for item in ItemDAO().get_random_items(setup)}
+
+    # Each of the few mock ids is missed by 300 probes about never
+    assert picked == ids  # nosec
+
+
+def test_multi_theme_no_duplicates(mock_data: LoadedDbItemsJson) -> None:
+    '''Entities tagged with many themes must be candidates only once'''
+    themes = ('Brasil', 'Generico')
 
-    assert name is None  # nosec
+    setup = RandFeatSelectionSetup(n_features=100,
+                                   is_good=True,
+                                   filter_themes=themes)
+    features = FeatureDAO().get_random_features(setup)
+
+    mock_features = {f.text_masc for f in mock_data.features
+                     if f.is_good and set(themes) & set(f.themes)}
+    ids = [f['id'] for f in features]
+
+    assert len(ids) == len(set(ids))  # nosec
+    assert len(features) == len(mock_features)  # nosec
+
+    item_setup = RandItemSelectionSetup(n_items=100, filter_themes=themes)
+    items = ItemDAO().get_random_items(item_setup)
+    ids = [i['id'] for i in items]
+
+    assert len(ids) == len(set(ids))  # nosec
+
+
+def test_candidate_view_selection(database: Database,
+                                  mock_data: LoadedDbItemsJson,
+                                  monkeypatch: MonkeyPatch) -> None:
+    '''Selecting from the candidate view must honor every filter'''
+    links = database.query('''SELECT
+        (SELECT count(*) FROM linknametheme)
+        + (SELECT count(*) FROM linkitemtheme)
+        + (SELECT count(*) FROM linkfeaturetheme) AS total''').as_dict()
+    candidates = database.query(
+        'SELECT count(*) AS total FROM catalogcandidate').as_dict()
+
+    assert candidates == links  # nosec
+
+    monkeypatch.setattr(settings, 'SELECTION_SOURCE', 'view')
+    features = FeatureDAO().get_random_features(RandFeatSelectionSetup(
+        n_features=2, is_good=True, filter_themes=('Brasil',)))
+    name = NameDAO().get_random_name(RandNameSelectionSetup(
+        gender='feminine', filter_themes=('Brasil',)))
+
+    feature_names_from_theme = [i.text_masc for i in mock_data.features
+                                if 'Brasil' in i.themes and i.is_good]
+    name_genders = {n.firstname: n.gender for n in mock_data.names
+                    if 'Brasil' in n.themes}
+
+    assert len(features) == 2  # nosec
+    for feature in features:
+        assert feature['text_masc'] in feature_names_from_theme  # nosec
+
+    assert name is not None  # nosec
+    assert name_genders[name['firstname']] == 'feminine'  # nosec
+
+
+def test_theme_registry(database: Database,
+                        mock_data: LoadedDbItemsJson) -> None:
+    '''The registry must map every theme both ways, and reload on demand'''
+    clear_theme_registry()
+    registry = get_theme_registry()
+
+    assert set(registry.ids) == set(mock_data.themes)  # nosec
+    assert all(registry.names[registry.ids[theme]] == theme  # nosec
+               for theme in mock_data.themes)
+    assert get_theme_registry() is registry  # nosec
+
+    with pytest.raises(UnknownTheme):
+        registry.resolve(['Brasil', 'Pizzaria'])
+
+    clear_theme_registry()
+    assert get_theme_registry() is not registry  # nosec
+
+
+@pytest.mark.parametrize('prepared', [True, False])
+def test_statement_cache(prepared: bool, mock_data: LoadedDbItemsJson,
+                         monkeypatch: MonkeyPatch) -> None:
+    '''Repeated selections must reuse their statement, prepared or not'''
+    monkeypatch.setattr(settings, 'PREPARED_STATEMENTS', prepared)
+    STATEMENTS.clear()
+    hits = STATEMENTS.stats().hits
+    setup = RandFeatSelectionSetup(n_features=2, is_good=True,
+                                   filter_themes=('Brasil',))
+
+    selections = [FeatureDAO().get_random_features(setup)
+                  for _ in range(3)]
+
+    feature_names_from_theme = [i.text_masc for i in mock_data.features
+                                if 'Brasil' in i.themes and i.is_good]
+
+    assert STATEMENTS.stats().hits - hits >= 2  # nosec
+    for features in selections:
+        assert len(features) == 2  # nosec
+        for feature in features:
+            assert feature['text_masc'] in feature_names_from_theme  # nosec
+
+
+def test_statement_names() -> None:
+    '''Statements built again must keep their prepared statement name'''
+    statement = STATEMENTS.get(('test', 1), lambda: 'SELECT 1')
+    STATEMENTS.clear()
+    rebuilt = STATEMENTS.get(('test', 2), lambda: 'SELECT 1')
+    other = STATEMENTS.get(('test', 3), lambda: 'SELECT 2')
+
+    assert rebuilt is not statement  # nosec
+    assert rebuilt.name == statement.name  # nosec
+    assert other.name != statement.name  # nosec
+
+
+def test_candidate_id_cache(mock_data: LoadedDbItemsJson,
+                            monkeypatch: MonkeyPatch) -> None:
+    '''Candidate ids must be read once per filter set, until invalidated'''
+    monkeypatch.setattr(settings, 'SAMPLING_STRATEGY', 'candidate_ids')
+    clear_candidate_ids()
+    before = CANDIDATE_ID_CACHE.stats()
+    setup = RandFeatSelectionSetup(n_features=2, is_good=True,
+                                   filter_themes=('Brasil',))
+
+    selections = [FeatureDAO().get_random_features(setup)
+                  for _ in range(3)]
+    after = CANDIDATE_ID_CACHE.stats()
+
+    clear_candidate_ids()
+    FeatureDAO().get_random_features(setup)
+    cleared = CANDIDATE_ID_CACHE.stats()
+
+    feature_names_from_theme = [i.text_masc for i in mock_data.features
+                                if 'Brasil' in i.themes and i.is_good]
+
+    assert after.misses - before.misses == 1  # nosec
+    assert after.hits - before.hits == 2  # nosec
+    assert cleared.misses - after.misses == 1  # nosec
+    for features in selections:
+        assert len(features) == 2  # nosec
+        assert len({f['id'] for f in features}) == 2  # nosec
+        for feature in features:
+            assert feature['text_masc'] in feature_names_from_theme  # nosec
@@ -0,0 +1,89 @@
+'''Test the in-memory catalog snapshot'''
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+from records import Database
+
+from src.config import settings
+from src.database.dao.exceptions import InvalidGender
+from src.database.models import LoadedDbItemsJson
+from src.database import snapshot as snapshot_module
+from src.database.snapshot import (CatalogSnapshot, refresh_snapshot,
+                                   get_snapshot, clear_snapshot,
+                                   snapshot_loaded)
+
+
+def test_snapshot_swap(database: Database) -> None:
+    '''Refreshing must replace the snapshot in use'''
+    clear_snapshot()
+    assert not snapshot_loaded()  # nosec
+
+    first = get_snapshot()
+    second = refresh_snapshot(database)
+
+    assert snapshot_loaded()  # nosec
+    assert first is not second  # nosec
+    assert get_snapshot() is second  # nosec
+
+
+def test_snapshot_single_load(database: Database,
+                              monkeypatch: MonkeyPatch) -> None:
+    '''Concurrent first uses must load the catalog once'''
+    load_snapshot = snapshot_module.load_snapshot
+    loads: List[CatalogSnapshot] = []
+
+    def counted_load(db: Database) -> CatalogSnapshot:
+        loads.append(load_snapshot(db))
+        return loads[-1]
+
+    monkeypatch.setattr(snapshot_module, 'load_snapshot', counted_load)
+    clear_snapshot()
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        snapshots = list(executor.map(lambda _: get_snapshot(), range(8)))
+
+    assert len(loads) == 1  # nosec
+    assert all(snapshot is loads[0] for snapshot in snapshots)  # nosec
+
+
+def test_snapshot_pools(database: Database,
+                        mock_data: LoadedDbItemsJson) -> None:
+    '''Candidates must match the theme, gender and is_good filters'''
+    snapshot = refresh_snapshot(database)
+
+    pool = snapshot.candidate_pool(('Brasil', 'GOT'), 'masculine')
+
+    mock_names = {n.firstname + n.lastname for n in mock_data.names
+                  if n.gender == 'masculine'
+                  and {'Brasil', 'GOT'} & set(n.themes)}
+    pool_names = [n['firstname'] + n['lastname'] for n in pool.names]
+
+    assert set(pool_names) == mock_names  # nosec
+    assert len(pool_names) == len(set(pool_names))  # nosec
+    assert all(f['is_good'] for f in pool.positive_features)  # nosec
+    assert not any(f['is_good'] for f in pool.negative_features)  # nosec
+
+    pool = snapshot.candidate_pool(None, 'any')
+    assert len(pool.items) == len(mock_data.items)  # nosec
+
+    pool = snapshot.candidate_pool(('Pizzaria',), 'any')
+    assert pool.names == []  # nosec
+
+    with pytest.raises(InvalidGender):
+        snapshot.candidate_pool(None, 'pizzaiolo')
+
+
+def test_snapshot_pool_cache(database: Database,
+                             monkeypatch: MonkeyPatch) -> None:
+    '''Pools must be reused while cached, and the cache kept bounded'''
+    monkeypatch.setattr(settings, 'SNAPSHOT_POOL_CACHE_SIZE', 1)
+    snapshot = refresh_snapshot(database)
+
+    pool = snapshot.candidate_pool(('GOT', 'Brasil'), 'any')
+    assert snapshot.candidate_pool(('Brasil', 'GOT'), 'any') is pool  # nosec
+
+    snapshot.candidate_pool(None, 'any')
+    evicted = snapshot.candidate_pool(('Brasil', 'GOT'), 'any')
+    assert evicted is not pool  # nosec